@@ -1,4 +1,3 @@
-import json
 from openAIAPI import CalendarAIClient
 from googleOAuthAPI import GoogleCalendarExporter
 from GoogleCalendarSync import GoogleCalendarSync
@@ -14,10 +13,7 @@ def main():
 
     # Step 1: Fetch the latest Google Calendar
     print("\nFetching the latest calendar events...")
-    events = exporter.fetch_events()
-    with open("calendar_export.json", "w", encoding="utf-8") as f:
-        json.dump(events, f, indent=2, ensure_ascii=False)
-    print(f"Exported {len(events)} events to calendar_export.json\n")
+    exporter.export()
 
     #Initialize AI client
     ai = CalendarAIClient(
@@ -44,9 +40,6 @@ def main():
                 "\nDescribe the change (e.g. 'remove all terst events next week and add lunch tomorrow at noon'): "
             ).strip()
 
-            # Regenerate the AI instance in case the calendar file changed
-            ai = CalendarAIClient(api_key=api_key)
-
             delta = ai.generate_calendar_delta(user_request)
 
             # Show proposed changes
@@ -75,7 +68,7 @@ def main():
 
             # Step 3: Apply the delta file using GoogleCalendarSync
             confirm_delete = input("Delete events automatically without confirmation? (yes/no): ").strip().lower()
-            syncer.apply_delta(auto_delete=(confirm_delete == "yes"))
+            syncer.apply_delta(auto_delete=(confirm_delete == "yes"), calendar_of=ai.calendar.calendar_of)
 
             print("\nChanges applied successfully!")
 
@@ -1,17 +1,214 @@
 import os
 import json
-from typing import List, Optional
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
 
+import httplib2
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
+BATCH_LIMIT = 50  # Calendar API maximum number of calls in one batch request
+
+# Calendar API default quota is roughly 10 queries per second per user
+DEFAULT_REQUESTS_PER_SECOND = 10.0
+DEFAULT_WORKERS = 4
+
+# Base URL of the Calendar API, e.g. a local stub server for load tests; unset means Google's
+CALENDAR_API_ENDPOINT = os.getenv("GOOGLE_CALENDAR_API_ENDPOINT")
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
 
 # Allow HTTP for local development (required for OAuth)
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
+def new_report() -> dict:
+    """Empty apply report: successful results per operation kind, plus errors"""
+    return {"added": [], "updated": [], "deleted": [], "errors": [], "round_trips": 0, "retries": 0}
+
+
+def record_result(report: dict, kind: str, target: str, response=None, exception=None):
+    """Add the outcome of one add/update/delete operation to a report"""
+    if exception is not None:
+        status = getattr(getattr(exception, "resp", None), "status", None)
+        report["errors"].append({
+            "operation": kind,
+            "target": target,
+            "status": status,
+            "error": str(exception),
+        })
+    elif kind == "add":
+        report["added"].append(response)
+    elif kind == "update":
+        report["updated"].append(response)
+    else:
+        report["deleted"].append(target)
+
+
+def execute_batch(service, operations: list, report: Optional[dict] = None) -> dict:
+    """
+    Run (kind, target, request) operations through the Calendar API batch endpoint,
+    BATCH_LIMIT calls per HTTP round trip. kind is "add", "update" or "delete" and
+    target identifies the event in the report (its id, or summary for new events).
+    """
+    report = report if report is not None else new_report()
+
+    for i in range(0, len(operations), BATCH_LIMIT):
+        chunk = operations[i:i + BATCH_LIMIT]
+
+        def callback(request_id, response, exception, chunk=chunk):
+            kind, target, _ = chunk[int(request_id)]
+            record_result(report, kind, target, response, exception)
+
+        batch = service.new_batch_http_request(callback=callback)
+        for n, (_, _, request) in enumerate(chunk):
+            batch.add(request, request_id=str(n))
+        batch.execute()
+        report["round_trips"] += 1
+
+    return report
+
+
+# ------------------- THROTTLING / RETRY -------------------
+class TokenBucket:
+    """Thread-safe token bucket; take() blocks until another request may be sent"""
+
+    def __init__(self, rate: float = DEFAULT_REQUESTS_PER_SECOND, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter for throttling (429/403 rate limit) and 5xx errors"""
+
+    def __init__(self, max_retries: int = 5, base_delay: float = 0.5, max_delay: float = 32.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def is_retryable(self, e: HttpError) -> bool:
+        status = http_status(e)
+        if status in RETRYABLE_STATUSES:
+            return True
+        if status == 403:
+            details = getattr(e, "error_details", None)
+            reasons = {d.get("reason") for d in details if isinstance(d, dict)} if isinstance(details, list) else set()
+            return bool(reasons & RATE_LIMIT_REASONS) or any(r in str(e) for r in RATE_LIMIT_REASONS)
+        return False
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+def http_status(e: Exception) -> Optional[int]:
+    return getattr(getattr(e, "resp", None), "status", None)
+
+
+def execute_with_retry(
+    request,
+    kind: str,
+    policy: Optional[RetryPolicy] = None,
+    bucket: Optional[TokenBucket] = None,
+    http=None,
+    on_retry: Optional[Callable[[], None]] = None,
+):
+    """
+    Execute one API request, retrying throttling and server errors. Adds carry a
+    client-generated event id, so if a retried insert answers 409 the earlier attempt
+    did go through; likewise a retried delete answering 404/410 already succeeded.
+    """
+    policy = policy or RetryPolicy()
+    attempt = 0
+    while True:
+        if bucket:
+            bucket.take()
+        try:
+            return request.execute(http=http)
+        except HttpError as e:
+            status = http_status(e)
+            if attempt > 0 and kind == "add" and status == 409:
+                return json.loads(request.body) if request.body else None
+            if attempt > 0 and kind == "delete" and status in (404, 410):
+                return None
+            if attempt >= policy.max_retries or not policy.is_retryable(e):
+                raise
+            time.sleep(policy.delay(attempt))
+            attempt += 1
+            if on_retry:
+                on_retry()
+
+
+def thread_http(http):
+    """A private HTTP transport for a worker thread; httplib2 connections can't be shared"""
+    credentials = getattr(http, "credentials", None)
+    if credentials is None:
+        return http
+    return AuthorizedHttp(credentials, http=httplib2.Http())
+
+
+def execute_concurrent(
+    operations: list,
+    workers: int = DEFAULT_WORKERS,
+    bucket: Optional[TokenBucket] = None,
+    policy: Optional[RetryPolicy] = None,
+    report: Optional[dict] = None,
+) -> dict:
+    """
+    Run (kind, target, request) operations on a bounded thread pool, throttled by
+    a token bucket and retried with backoff, for when batching isn't an option.
+    """
+    report = report if report is not None else new_report()
+    bucket = bucket or TokenBucket()
+    lock = threading.Lock()
+    local = threading.local()
+
+    def on_retry():
+        with lock:
+            report["retries"] += 1
+            report["round_trips"] += 1
+
+    def run(operation):
+        kind, target, request = operation
+        if not hasattr(local, "http"):
+            local.http = thread_http(request.http)
+        response, exception = None, None
+        try:
+            response = execute_with_retry(request, kind, policy, bucket, local.http, on_retry)
+        except HttpError as e:
+            exception = e
+        with lock:
+            record_result(report, kind, target, response, exception)
+            report["round_trips"] += 1
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(run, operations))
+    return report
+
+
 class GoogleCalendarSync:
     def __init__(
         self,
@@ -19,6 +216,8 @@ class GoogleCalendarSync:
         token_file: str = "token.json",
         credentials_file: str = "credentials.json",
         sync_file: str = "calendar_delta.json",
+        workers: int = DEFAULT_WORKERS,
+        requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
     ):
         self.scopes = scopes or SCOPES
         self.token_file = token_file
@@ -27,6 +226,11 @@ class GoogleCalendarSync:
         self.creds: Optional[Credentials] = None
         self.service = None
 
+        # Shared by every call so concurrent applies stay within the API quota
+        self.workers = workers
+        self.bucket = TokenBucket(requests_per_second)
+        self.retry_policy = RetryPolicy()
+
     # ------------------- AUTHENTICATION -------------------
     def authenticate(self) -> Credentials:
         """Authenticate with Google and return valid credentials."""
@@ -54,36 +258,46 @@ class GoogleCalendarSync:
     def build_service(self):
         """Build the Google Calendar API service object."""
         if not self.service:
-            self.service = build("calendar", "v3", credentials=self.authenticate())
+            client_options = {"api_endpoint": CALENDAR_API_ENDPOINT} if CALENDAR_API_ENDPOINT else None
+            self.service = build("calendar", "v3", credentials=self.authenticate(), client_options=client_options)
         return self.service
 
     # ------------------- BASIC OPERATIONS -------------------
     def insert_event(self, event: dict, calendar_id="primary") -> dict:
         """Insert a new event into Google Calendar."""
         service = self.build_service()
-        created_event = service.events().insert(calendarId=calendar_id, body=event).execute()
+        # A client-generated id makes retrying the insert safe
+        event = {"id": uuid.uuid4().hex, **event}
+        created_event = execute_with_retry(
+            service.events().insert(calendarId=calendar_id, body=event),
+            "add", self.retry_policy, self.bucket
+        )
         print(f"Inserted event: {created_event.get('summary')}")
         return created_event
 
     def update_event(self, event_id: str, event: dict, calendar_id="primary") -> dict:
         """Update an existing event by ID."""
         service = self.build_service()
-        updated_event = service.events().update(
-            calendarId=calendar_id, eventId=event_id, body=event
-        ).execute()
+        updated_event = execute_with_retry(
+            service.events().update(calendarId=calendar_id, eventId=event_id, body=event),
+            "update", self.retry_policy, self.bucket
+        )
         print(f"Updated event: {updated_event.get('summary')}")
         return updated_event
 
     def delete_event(self, event_id: str, calendar_id="primary") -> None:
         """Delete an event by ID."""
         service = self.build_service()
-        service.events().delete(calendarId=calendar_id, eventId=event_id).execute()
+        execute_with_retry(
+            service.events().delete(calendarId=calendar_id, eventId=event_id),
+            "delete", self.retry_policy, self.bucket
+        )
         print(f"Deleted event ID: {event_id}")
 
     # ------------------- CLEANING -------------------
     def clean_event(self, event: dict) -> dict:
         """Keep only safe fields for Google Calendar insert/update."""
-        safe_fields = ["id", "summary", "start", "end", "description", "location", "attendees"]
+        safe_fields = ["id", "summary", "start", "end", "description", "location", "attendees", "calendarId"]
         cleaned = {k: event[k] for k in safe_fields if k in event}
 
         # 🧹 Remove invalid attendees (no email)
@@ -115,8 +329,67 @@ class GoogleCalendarSync:
         return cleaned
 
     # ------------------- APPLY DELTA JSON -------------------
-    def apply_delta(self, calendar_id="primary", auto_delete=False) -> None:
-        """Apply AI-generated delta JSON (add, update, delete)."""
+    def delta_operations(self, delta: dict, calendar_id="primary", auto_delete=False, calendar_of=None) -> list:
+        """
+        Turn a cleaned delta into (kind, target, request) operations. Each one goes
+        to its event's own calendar: calendar_of(event_id) (the synced calendar)
+        for existing events, else the calendarId in the delta, else calendar_id.
+        """
+        events = self.build_service().events()
+        operations = []
+
+        def target_calendar(event_id, given=None):
+            return (calendar_of(event_id) if calendar_of and event_id else None) or given or calendar_id
+
+        for event in delta.get("add", []):
+            # A client-generated id makes retrying the insert idempotent
+            event = {"id": uuid.uuid4().hex, **event}
+            target = target_calendar(None, event.pop("calendarId", None))
+            operations.append((
+                "add",
+                event["id"],
+                events.insert(calendarId=target, body=event),
+            ))
+
+        for event in delta.get("update", []):
+            event = dict(event)
+            target = target_calendar(event["id"], event.pop("calendarId", None))
+            operations.append((
+                "update",
+                event["id"],
+                events.update(calendarId=target, eventId=event["id"], body=event),
+            ))
+
+        if auto_delete:
+            for event_id in delta.get("delete", []):
+                operations.append((
+                    "delete",
+                    event_id,
+                    events.delete(calendarId=target_calendar(event_id), eventId=event_id),
+                ))
+        return operations
+
+    def execute_operations(self, operations: list, mode: str = "batch", report: Optional[dict] = None) -> dict:
+        """
+        Run (kind, target, request) operations and return the report. mode is
+        "batch" (Calendar batch endpoint), "concurrent" (thread pool with throttling
+        and retries) or "serial" (the same, one worker).
+        """
+        if mode == "batch":
+            return execute_batch(self.build_service(), operations, report)
+        if mode in ("concurrent", "serial"):
+            workers = self.workers if mode == "concurrent" else 1
+            return execute_concurrent(operations, workers, self.bucket, self.retry_policy, report)
+        raise ValueError(f"Unknown apply mode: {mode}")
+
+    def apply_delta(self, calendar_id="primary", auto_delete=False, mode="batch", calendar_of=None) -> dict:
+        """
+        Apply AI-generated delta JSON (add, update, delete) and return a report of
+        what succeeded and what failed. In batch mode all operations go through the
+        batch endpoint, e.g. a 50-event delta costs one HTTP round trip. Pass
+        calendar_of (e.g. Calendar.calendar_of) so updates and deletes of events on
+        secondary or shared calendars reach the calendar they live in.
+        """
         print(f"Applying delta from {self.sync_file}")
 
         if not os.path.exists(self.sync_file):
@@ -125,35 +398,16 @@ class GoogleCalendarSync:
         with open(self.sync_file, "r", encoding="utf-8") as f:
             raw_delta = json.load(f)
 
-        print("Raw delta loaded:", raw_delta)
         delta = self.clean_delta_json(raw_delta)
-        print("Cleaned delta:", delta)
-        
-        # Handle adds
-        for event in delta.get("add", []):
-            print("Final event before insert:", json.dumps(event, indent=2))
-
-            print("Adding:", event.get("summary"))
-            self.insert_event(event, calendar_id)
-
-        # Handle updates
-        for event in delta.get("update", []):
-            print("Updating:", event.get("summary"))
-            if "id" in event:
-                self.update_event(event["id"], event, calendar_id)
-            else:
-                print("Skipped update — missing 'id' field.")
-
-        # Handle deletions
         deletions = delta.get("delete", [])
-        if not deletions:
-            print("No deletions suggested.")
-        else:
-            if auto_delete:
-                for event_id in deletions:
-                    print("➡️ Deleting:", event_id)
-                    self.delete_event(event_id, calendar_id)
-            else:
-                print("Suggested deletions (not executed):", deletions)
+        if deletions and not auto_delete:
+            print("Suggested deletions (not executed):", deletions)
+
+        report = self.execute_operations(self.delta_operations(delta, calendar_id, auto_delete, calendar_of), mode)
 
-        print("Delta sync complete.")
+        print(
+            f"Delta sync complete: {len(report['added'])} added, {len(report['updated'])} updated, "
+            f"{len(report['deleted'])} deleted, {len(report['errors'])} failed "
+            f"({report['round_trips']} round trip(s), {report['retries']} retries)."
+        )
+        return report
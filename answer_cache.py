@@ -0,0 +1,121 @@
+import atexit
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import json_codec
+from concurrency import atomic_write_json
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation, so trivial rewordings share a key"""
+    return re.sub(r"\s+", " ", text.lower()).strip().rstrip("?!. ")
+
+
+def answer_key(model: str, context: str, user_request: str) -> str:
+    """
+    Cache key for an answer: the calendar context that was sent, the normalized
+    question and the model. Any change to the events in the context changes the key.
+    """
+    payload = json.dumps([model, context, normalize_query(user_request)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Bounded LRU of AI answers with a time-to-live, persisted to a JSON file so it
+    survives restarts. Thread-safe. put() only marks the cache dirty: the file is
+    rewritten by a timer thread at most every save_interval seconds, and once
+    more at exit, so a burst of answers costs one write and no caller (e.g. the
+    async event loop) waits on the disk.
+    """
+
+    def __init__(self, filename: Optional[str] = "ai_answer_cache.json", max_entries: int = 256, ttl: float = 900.0,
+                 save_interval: float = 5.0):
+        self.filename = filename
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.save_interval = save_interval
+
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()  # key -> (stored at, answer)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # one write at a time, in snapshot order
+        self._dirty = False
+        self._timer = None
+        self._load()
+        if filename:
+            atexit.register(self.flush)
+
+    def _load(self):
+        if not self.filename:
+            return
+        try:
+            entries = json_codec.load_file(self.filename)
+        except (FileNotFoundError, ValueError):
+            return
+
+        now = time.time()
+        for key, stored_at, answer in entries[-self.max_entries:]:
+            if now - stored_at < self.ttl:
+                self._entries[key] = (stored_at, answer)
+
+    def _schedule_save(self):
+        """Mark the entries changed (under self._lock) and start the save timer if it isn't running"""
+        self._dirty = True
+        if self.filename and self._timer is None:
+            self._timer = threading.Timer(self.save_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Write the entries to the file now if they changed since the last write"""
+        with self._save_lock:
+            with self._lock:
+                self._timer = None
+                if not (self._dirty and self.filename):
+                    return
+                entries = [[key, stored_at, answer] for key, (stored_at, answer) in self._entries.items()]
+                self._dirty = False
+            atomic_write_json(self.filename, entries)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] >= self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, answer: str):
+        with self._lock:
+            self._entries[key] = (time.time(), answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._schedule_save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._schedule_save()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+        }
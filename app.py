@@ -1,10 +1,15 @@
-from flask import Flask, request, jsonify, session, redirect, send_from_directory
-import os, json
-from datetime import datetime, timedelta
+from flask import Flask, Response, request, jsonify, session, redirect, send_from_directory
+from flask.json.provider import DefaultJSONProvider
+import os, json, threading, uuid
+from datetime import datetime, time, timedelta
 from flask_cors import CORS
+import json_codec
 from GoogleCalendarSync import GoogleCalendarSync
 from oop_events import CalendarManager
 from openAIAPI import CalendarAIClient
+from response_cache import ResponseCache
+from sync_engine import IncrementalSyncEngine
+from sync_scheduler import SyncScheduler
 from google_auth_oauthlib.flow import Flow
 
 # Allow HTTP for local development (required for OAuth)
@@ -16,15 +21,39 @@ sync = GoogleCalendarSync(
     credentials_file="credentials.json",
     token_file="token.json"
 )
-calendar_manager = CalendarManager()
-calendar_manager.real_calendar.load_from_file(calendar_manager.real_file)
-calendar_manager.draft_calendar.load_from_file(calendar_manager.draft_file)
+# Events are kept in SQLite (WAL mode), one row per event; CALENDAR_DB="" keeps the JSON files instead
+CALENDAR_DB = os.getenv("CALENDAR_DB", "calendar.db")
+calendar_manager = CalendarManager(database=CALENDAR_DB or None)
+# Comma-separated Google calendar ids to sync; unset means every calendar selected in the user's calendar list
+GOOGLE_CALENDAR_IDS = [c.strip() for c in os.getenv("GOOGLE_CALENDAR_IDS", "").split(",") if c.strip()] or None
+google_sync_engine = IncrementalSyncEngine(
+    export_file=calendar_manager.real_file,
+    calendar_ids=GOOGLE_CALENDAR_IDS,
+    bucket=sync.bucket,  # one request budget for syncs and applies
+    store=calendar_manager.real_store
+)
 
 # Initialize OpenAI client - REPLACE WITH YOUR API KEY
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ai_client = None
+ai_client_lock = threading.Lock()
+
+# Google is synced by a background thread; handlers read the in-memory calendar
+SYNC_INTERVAL_SECONDS = float(os.getenv("SYNC_INTERVAL_SECONDS", 60))
+AI_MAX_STALENESS_SECONDS = float(os.getenv("AI_MAX_STALENESS_SECONDS", 120))
+
+class CodecJSONProvider(DefaultJSONProvider):
+    """jsonify/request.json through json_codec (orjson when installed); compact output"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return json_codec.dumps(obj, pretty=bool(kwargs.get("indent")), default=self.default)
+
+    def loads(self, s, **kwargs):
+        return json_codec.loads(s)
+
 
 app = Flask(__name__)
+app.json = CodecJSONProvider(app)
 CORS(app)
 app.secret_key = "secret"  # change in production
 
@@ -98,68 +127,79 @@ def check_and_refresh_token():
         return False
 
 def sync_google_to_file():
-    """Fetch Google Calendar events and save them to calendar_export.json"""
-    try:
-        # Check and refresh token if needed
-        if not check_and_refresh_token():
-            print("⚠️ Token invalid. Skipping sync. Please authenticate at /auth/google")
-            return
-        
-        service = sync.build_service()
-        
-        # Fetch events from Google Calendar
-        events_result = service.events().list(
-            calendarId="primary",
-            timeMin="2019-01-01T00:00:00Z",  # Fetch all events from 2019 onwards
-            maxResults=2500,
-            singleEvents=True,
-            orderBy="startTime"
-        ).execute()
-        
-        google_events = events_result.get("items", [])
-        
-        # Convert to our format and save to file
-        # IMPORTANT: Keep the Google Calendar event ID for deletion/updates
-        formatted_events = []
-        for e in google_events:
-            start = e["start"].get("dateTime") or e["start"].get("date")
-            end = e["end"].get("dateTime") or e["end"].get("date")
-            
-            formatted_events.append({
-                "id": e.get("id"),  # Keep the actual Google Calendar event ID
-                "summary": e.get("summary", "Untitled"),
-                "start": {"dateTime": start, "timeZone": e["start"].get("timeZone", "Europe/Madrid")},
-                "end": {"dateTime": end, "timeZone": e["end"].get("timeZone", "Europe/Madrid")},
-                "description": e.get("description", ""),
-                "location": e.get("location", ""),
-                "draft": False
-            })
-        
-        # Save to calendar_export.json
-        with open(calendar_manager.real_file, "w", encoding="utf-8") as f:
-            json.dump(formatted_events, f, indent=2, ensure_ascii=False)
-        
-        print(f"✅ Synced {len(formatted_events)} events from Google Calendar to {calendar_manager.real_file}")
-        
-    except Exception as e:
-        print(f"⚠️ Error syncing Google Calendar: {e}")
+    """Fetch Google Calendar events and save them to the real calendar's store; failures raise with their cause"""
+    # Check and refresh token if needed
+    if not check_and_refresh_token():
+        raise RuntimeError("Google token is missing, expired or could not be refreshed. Please authenticate at /auth/google")
 
-def get_ai_client():
-    """Get or create AI client with current calendar data"""
-    global ai_client
-    
-    # First, sync Google Calendar to file
+    service = sync.build_service()
+
+    # Only changed/cancelled events are fetched once a sync token is stored
+    event_count = google_sync_engine.sync(service)
+
+    print(f"✅ Synced {event_count} events from Google Calendar to {calendar_manager.real_store}")
+
+def refresh_real_calendar():
+    """
+    Sync Google to the store and reload the real calendar if the store changed.
+    Run by sync_scheduler, which keeps the original error as /sync/status last_error.
+    """
     sync_google_to_file()
+    calendar_manager.real_calendar.load_if_changed(calendar_manager.real_store)
+
+sync_scheduler = SyncScheduler(refresh_real_calendar, interval=SYNC_INTERVAL_SECONDS)
+
+# Started on the first request rather than at import, so the debug reloader's
+# watcher process doesn't run a second sync thread
+app.before_request(sync_scheduler.start)
+
+def fresh_calendars(max_staleness=None):
+    """With max_staleness (seconds), wait for a sync if the last successful one is older than that"""
+    if max_staleness is not None:
+        sync_scheduler.ensure_fresh(max_staleness)
+    calendar_manager.draft_calendar.load_if_changed(calendar_manager.draft_store)
+
+# Serialized /events and /preview bodies, per calendar version and requested range
+response_cache = ResponseCache()
+
+def cached_json(key, snapshot):
+    """
+    JSON response for key, built by snapshot() -> (calendar version, data) only
+    if this version hasn't been serialized yet. Sent with a strong ETag only
+    (If-None-Match gets a 304) and gzipped for clients that accept it; clients
+    revalidate on every request.
+    """
+    entry = response_cache.get(key, calendar_manager.version)
+    if entry is None:
+        version, data = snapshot()
+        entry = response_cache.put(key, version, data)
+
+    gzipped = entry.compressible and "gzip" in request.accept_encodings
+    response = Response(entry.gzipped() if gzipped else entry.body, mimetype="application/json")
+    if gzipped:
+        response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    response.set_etag(entry.etag + "-gzip" if gzipped else entry.etag)  # each encoding is its own representation
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def get_ai_client(max_staleness=AI_MAX_STALENESS_SECONDS):
+    """Get the long-lived AI client, with calendars no older than max_staleness seconds"""
+    global ai_client
     
-    # Reload calendar data to get latest events
-    calendar_manager.real_calendar.load_from_file(calendar_manager.real_file)
-    calendar_manager.draft_calendar.load_from_file(calendar_manager.draft_file)
+    # Only blocks on Google when the background sync has fallen behind
+    fresh_calendars(max_staleness)
     
-    ai_client = CalendarAIClient(
-        api_key=OPENAI_API_KEY,
-        calendar_file=calendar_manager.real_file,
-        delta_file="calendar_delta.json"
-    )
+    # The client shares the manager's real calendar, so its cached prompt context
+    # is invalidated by the calendar version rather than by rebuilding the client
+    with ai_client_lock:
+        if ai_client is None:
+            ai_client = CalendarAIClient(
+                api_key=OPENAI_API_KEY,
+                calendar_file=calendar_manager.real_file,
+                delta_file="calendar_delta.json",
+                calendar=calendar_manager.real_calendar
+            )
     return ai_client
 
 # -------------------- EXISTING ENDPOINTS --------------------
@@ -190,8 +230,8 @@ def auth_google_callback():
     
     # Reload calendar manager now that we're authenticated
     try:
-        calendar_manager.real_calendar.load_from_file(calendar_manager.real_file)
-        calendar_manager.draft_calendar.load_from_file(calendar_manager.draft_file)
+        calendar_manager.real_calendar.load_from_store(calendar_manager.real_store)
+        calendar_manager.draft_calendar.load_from_store(calendar_manager.draft_store)
     except:
         pass  # Files might not exist yet
     
@@ -315,23 +355,38 @@ def google_events():
 
 @app.get("/events")
 def get_events():
-    """Returns all events (real + draft) and syncs Google Calendar to file"""
-    # First, sync Google Calendar events to the real calendar file
-    sync_google_to_file()
-    
-    # Reload the calendar manager to get updated events
-    calendar_manager.real_calendar.load_from_file(calendar_manager.real_file)
-    
-    real = [ev.to_dict() | {"draft": False} for ev in calendar_manager.real_calendar.events]
-    draft = [ev.to_dict() | {"draft": True} for ev in calendar_manager.draft_calendar.events]
-    
-    return jsonify(real + draft)
+    """
+    Returns events (real + draft) from memory; Google is synced in the background.
+    Optional ?from=...&to=... (ISO date or datetime) limits the result to that range.
+    Optional ?max_staleness=<seconds> waits for a sync if the data is older than that.
+    """
+    try:
+        range_start = datetime.fromisoformat(request.args["from"]) if "from" in request.args else None
+        range_end = datetime.fromisoformat(request.args["to"]) if "to" in request.args else None
+        max_staleness = float(request.args["max_staleness"]) if "max_staleness" in request.args else None
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameter: {e}"}), 400
+
+    fresh_calendars(max_staleness)
+
+    def snapshot():
+        with calendar_manager.lock.read():
+            if range_start or range_end:
+                start, end = range_start or datetime.min, range_end or datetime.max
+                real = calendar_manager.real_calendar.events_between(start, end).to_dicts()
+                draft = calendar_manager.draft_calendar.events_between(start, end).to_dicts()
+            else:
+                real = calendar_manager.real_calendar.api_dicts()
+                draft = calendar_manager.draft_calendar.api_dicts()
+            return calendar_manager.version, real + draft
 
+    response = cached_json(("events", range_start, range_end), snapshot)
+    response.headers["X-Last-Synced-At"] = sync_scheduler.status()["last_synced_at"] or ""
+    return response
 
-@app.post("/draft/add")
-def add_event():
-    """Adds event to draft"""
-    data = request.json
+
+def draft_from_json(data: dict):
+    """Draft Event from {"title", "start", "end"} (ISO datetimes), as sent by the frontend"""
     title = data.get("title", "Untitled")
     start_dt = datetime.fromisoformat(data["start"])
     end_dt = datetime.fromisoformat(data["end"])
@@ -339,14 +394,53 @@ def add_event():
     date = start_dt.strftime("%Y-%m-%d")
     start_time = start_dt.strftime("%H:%M")
 
-    event = calendar_manager.create_event(
+    return calendar_manager.create_event(
         date=date,
         start_time=start_time,
         duration_minutes=duration,
         title=title
     )
-    calendar_manager.save_draft_event(event)
-    return jsonify({"status": "ok"})
+
+
+def conflict_list(conflicts) -> list:
+    return [{"id": ev.id, "summary": ev.title, "source": ev.source} for ev in conflicts]
+
+
+@app.post("/draft/add")
+def add_event():
+    """Adds event to draft"""
+    event = draft_from_json(request.json)
+    # A single point query against the interval indexes, no full rescan; the write
+    # lock makes the check and the insert one step for concurrent requests
+    with calendar_manager.lock.write():
+        conflicts = calendar_manager.conflicts_for(event)
+        calendar_manager.save_draft_event(event)
+    return jsonify({
+        "status": "ok",
+        "conflicts": conflict_list(conflicts)
+    })
+
+
+@app.post("/draft/add-many")
+def add_events():
+    """
+    Adds several events to draft in one request and one store write.
+    Expected JSON: {"events": [{"title", "start", "end"}, ...]}
+    Each event's conflicts include the other events of the batch.
+    """
+    try:
+        events = [draft_from_json(data) for data in request.json["events"]]
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid events: {e}"}), 400
+
+    with calendar_manager.lock.write():
+        calendar_manager.save_draft_events(events)
+        conflicts = [calendar_manager.conflicts_for(event) for event in events]
+    return jsonify({
+        "status": "ok",
+        "added": [{"id": event.id, "summary": event.title, "conflicts": conflict_list(c)}
+                  for event, c in zip(events, conflicts)]
+    })
 
 
 @app.post("/commit")
@@ -354,40 +448,36 @@ def commit():
     """Applies changes"""
     sync = GoogleCalendarSync()
     service = sync.build_service()
-    calendar_manager.apply_changes(service)
+    report = calendar_manager.apply_changes(service)
 
-    with open(calendar_manager.real_file, "w", encoding="utf-8") as f:
-        json.dump([ev.to_dict() for ev in calendar_manager.real_calendar.events], f, indent=2, ensure_ascii=False)
-
-    return jsonify({"status": "committed"})
+    # Pick up the committed events (and their Google ids) without waiting here
+    sync_scheduler.request_sync()
+    return jsonify({"status": "committed" if not report["errors"] else "partial", "report": report})
 
 
 @app.post("/discard")
 def discard():
     """Deletes all drafts"""
-    calendar_manager.draft_calendar.clear()
-    if os.path.exists(calendar_manager.draft_file):
-        os.remove(calendar_manager.draft_file)
+    calendar_manager.discard_drafts()
     return jsonify({"status": "discarded"})
 
 
 @app.get("/preview")
 def preview():
     """Returns preview of events and conflicts"""
-    real = [ev.to_dict() | {"draft": False, "conflict": False} for ev in calendar_manager.real_calendar.events]
-    draft = [ev.to_dict() | {"draft": True, "conflict": False} for ev in calendar_manager.draft_calendar.events]
-
-    overlaps = calendar_manager.find_all_overlaps()
-    for (e1, e2) in overlaps:
-        for ev in real + draft:
-            if (ev["summary"], "real" if not ev["draft"] else "draft") == e1 or \
-               (ev["summary"], "real" if not ev["draft"] else "draft") == e2:
-                ev["conflict"] = True
+    def snapshot():
+        # Overlap results carry event ids, so marking is a single pass of set lookups.
+        # api_dicts lists the same recurring instances the overlap sweep compares.
+        with calendar_manager.lock.read():
+            conflict_ids = calendar_manager.conflicting_ids()
+            real = [ev | {"conflict": ev["id"] in conflict_ids} for ev in calendar_manager.real_calendar.api_dicts()]
+            draft = [ev | {"conflict": ev["id"] in conflict_ids} for ev in calendar_manager.draft_calendar.api_dicts()]
+            return calendar_manager.version, {
+                "real": real,
+                "draft": draft
+            }
 
-    return jsonify({
-        "real": real,
-        "draft": draft
-    })
+    return cached_json(("preview",), snapshot)
 
 
 @app.get("/conflicts")
@@ -397,30 +487,92 @@ def conflicts():
     return jsonify(overlaps)
 
 
+@app.get("/freebusy")
+def freebusy():
+    """
+    Busy periods (real + draft merged) in ?from=...&to=... (ISO date or datetime),
+    default the next 7 days
+    """
+    try:
+        range_start = datetime.fromisoformat(request.args["from"]) if "from" in request.args else datetime.now()
+        range_end = datetime.fromisoformat(request.args["to"]) if "to" in request.args else range_start + timedelta(days=7)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameter: {e}"}), 400
+
+    busy = calendar_manager.free_busy(range_start, range_end)
+    return jsonify({
+        "from": range_start.isoformat(),
+        "to": range_end.isoformat(),
+        "busy": [{"start": s.isoformat(), "end": e.isoformat()} for s, e in busy]
+    })
+
+
+@app.get("/slots")
+def free_slots():
+    """
+    Free slots of ?duration=<minutes> in ?from=...&to=... (default the next 7 days).
+    Optional ?work_start=HH:MM&work_end=HH:MM limits them to working hours,
+    ?buffer=<minutes> keeps that much time clear around events, ?limit=<n> caps the result.
+    """
+    try:
+        duration = timedelta(minutes=float(request.args["duration"]))
+        range_start = datetime.fromisoformat(request.args["from"]) if "from" in request.args else datetime.now()
+        range_end = datetime.fromisoformat(request.args["to"]) if "to" in request.args else range_start + timedelta(days=7)
+        working_hours = None
+        if "work_start" in request.args or "work_end" in request.args:
+            working_hours = (time.fromisoformat(request.args.get("work_start", "08:00")),
+                             time.fromisoformat(request.args.get("work_end", "16:00")))
+        buffer = timedelta(minutes=float(request.args.get("buffer", 0)))
+        limit = int(request.args["limit"]) if "limit" in request.args else None
+
+        if duration <= timedelta(0) or buffer < timedelta(0):
+            raise ValueError("duration must be positive and buffer not negative")
+        slots = calendar_manager.find_free_slots(duration, (range_start, range_end), working_hours, buffer, limit)
+    except KeyError as e:
+        return jsonify({"error": f"Missing parameter: {e}"}), 400
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameter: {e}"}), 400
+
+    return jsonify({
+        "duration_minutes": duration // timedelta(minutes=1),
+        "slots": [{"start": s.isoformat(), "end": e.isoformat()} for s, e in slots]
+    })
+
+
 # -------------------- NEW AI ENDPOINTS --------------------
 
 @app.post("/sync/google")
 def sync_google_calendar():
-    """Manually sync Google Calendar to calendar_export.json"""
+    """Manually sync Google Calendar into the real calendar's store"""
     try:
-        sync_google_to_file()
-        calendar_manager.real_calendar.load_from_file(calendar_manager.real_file)
+        # Joins the background sync if one is already running
+        sync_scheduler.sync_now()
+        if sync_scheduler.last_error:
+            return jsonify({"error": sync_scheduler.last_error, **sync_scheduler.status()}), 502
         return jsonify({
             "status": "success",
-            "message": f"Synced {len(calendar_manager.real_calendar.events)} events",
-            "event_count": len(calendar_manager.real_calendar.events)
+            "message": f"Synced {len(calendar_manager.real_calendar)} events",
+            "event_count": len(calendar_manager.real_calendar),
+            "last_synced_at": sync_scheduler.status()["last_synced_at"]
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.get("/sync/status")
+def sync_status():
+    """When Google was last synced and whether a sync is running"""
+    return jsonify(sync_scheduler.status())
+
+
 @app.post("/ai/chat")
 def ai_chat():
     """
     Handle AI chat requests
     Expected JSON: {
         "message": "user query",
-        "mode": "natural" or "json"
+        "mode": "natural" or "json",
+        "max_staleness": seconds (optional, default AI_MAX_STALENESS_SECONDS)
     }
     """
     try:
@@ -431,14 +583,16 @@ def ai_chat():
         if not user_message:
             return jsonify({"error": "No message provided"}), 400
         
-        ai = get_ai_client()
+        ai = get_ai_client(float(data.get("max_staleness", AI_MAX_STALENESS_SECONDS)))
         
         if mode == "natural":
             # Get natural language response
             response = ai.summarize_calendar(user_message)
             return jsonify({
                 "type": "natural",
-                "response": response
+                "response": response,
+                "served_by": ai.last_route,
+                "last_synced_at": sync_scheduler.status()["last_synced_at"]
             })
         
         elif mode == "json":
@@ -447,11 +601,8 @@ def ai_chat():
             return jsonify({
                 "type": "json",
                 "response": delta,
-                "preview": {
-                    "add_count": len(delta.get("add", [])),
-                    "update_count": len(delta.get("update", [])),
-                    "delete_count": len(delta.get("delete", []))
-                }
+                "preview": delta_preview(delta),
+                "last_synced_at": sync_scheduler.status()["last_synced_at"]
             })
         
         else:
@@ -461,6 +612,145 @@ def ai_chat():
         return jsonify({"error": str(e)}), 500
 
 
+def delta_preview(delta: dict) -> dict:
+    return {
+        "add_count": len(delta.get("add", [])),
+        "update_count": len(delta.get("update", [])),
+        "delete_count": len(delta.get("delete", []))
+    }
+
+
+# Stop proxies (and the browser) from buffering the stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def sse_event(event: str, data, event_id: str = None) -> str:
+    """One Server-Sent Events message with a JSON payload (and an id, which EventSource resends on reconnect)"""
+    message = f"event: {event}\ndata: {json_codec.dumps(data)}\n\n"
+    return f"id: {event_id}\n{message}" if event_id else message
+
+def chat_stream_events(ai, user_message: str, mode: str):
+    """
+    SSE messages for /ai/chat/stream: "token" events with answer text (natural mode)
+    or "item" events with each add/update/delete item (json mode), then a "done"
+    event carrying the same JSON /ai/chat returns, or an "error" event.
+    """
+    try:
+        if mode == "natural":
+            pieces = []
+            for text in ai.summarize_calendar(user_message, stream=True):
+                pieces.append(text)
+                yield sse_event("token", {"text": text})
+            yield sse_event("done", {
+                "type": "natural",
+                "response": "".join(pieces).strip(),
+                "served_by": ai.last_route,
+                "last_synced_at": sync_scheduler.status()["last_synced_at"]
+            })
+        else:
+            for section, item in ai.generate_calendar_delta(user_message, stream=True):
+                if section != "delta":
+                    yield sse_event("item", {"section": section, "item": item})
+                    continue
+                yield sse_event("done", {
+                    "type": "json",
+                    "response": item,
+                    "preview": delta_preview(item),
+                    "last_synced_at": sync_scheduler.status()["last_synced_at"]
+                })
+    except Exception as e:
+        yield sse_event("error", {"error": str(e)})
+
+
+@app.route("/ai/chat/stream", methods=["GET", "POST"])
+def ai_chat_stream():
+    """
+    Streaming version of /ai/chat over Server-Sent Events. Takes the same JSON body,
+    or the same fields as query parameters (GET, for EventSource).
+    """
+    data = request.get_json(silent=True) or request.args
+    user_message = data.get("message", "")
+    mode = data.get("mode", "natural")
+
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+    if mode not in ("natural", "json"):
+        return jsonify({"error": "Invalid mode. Use 'natural' or 'json'"}), 400
+
+    try:
+        ai = get_ai_client(float(data.get("max_staleness", AI_MAX_STALENESS_SECONDS)))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    return Response(chat_stream_events(ai, user_message, mode), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+
+# -------------------- CHANGE FEED --------------------
+# Feed versions are "<run>.<real version>.<draft version>"; the run id tells a
+# version from before a restart, when the calendars' change logs start over
+FEED_RUN = uuid.uuid4().hex[:8]
+FEED_KEEPALIVE_SECONDS = 15
+
+def feed_token(version) -> str:
+    return f"{FEED_RUN}.{version[0]}.{version[1]}"
+
+def parse_feed_token(token: str):
+    """Calendar version of a feed token, or None if it's malformed or from another run"""
+    try:
+        run, real, draft = token.split(".")
+        return (int(real), int(draft)) if run == FEED_RUN else None
+    except (AttributeError, ValueError):
+        return None
+
+def feed_message(version):
+    """
+    The next change feed message for a client at version: "changes" with the
+    events added/updated and removed since then, or "reset" (reload /events) if
+    they can't be listed. Returns (the version it brings the client to, message
+    or None if nothing changed).
+    """
+    changes = calendar_manager.changes_since(version) if version else None
+    if changes is None:
+        version = calendar_manager.version
+        return version, sse_event("reset", {"version": feed_token(version)}, feed_token(version))
+    version = changes["version"]
+    if not changes["upserted"] and not changes["removed"]:
+        return version, None
+    return version, sse_event("changes", changes | {"version": feed_token(version)}, feed_token(version))
+
+def change_feed_events(version):
+    """Push every change as it happens, starting with whatever changed since version"""
+    while True:
+        version, message = feed_message(version)
+        if message:
+            yield message
+        if not calendar_manager.wait_for_change(version, FEED_KEEPALIVE_SECONDS):
+            yield ": keepalive\n\n"
+
+
+@app.get("/events/stream")
+def events_stream():
+    """
+    Server-Sent Events feed of calendar changes, so clients patch what they show
+    instead of refetching /events. Starts with "reset" unless resuming: EventSource
+    sends the last message id as Last-Event-ID when it reconnects (or pass ?since=).
+    """
+    token = request.headers.get("Last-Event-ID") or request.args.get("since")
+    return Response(change_feed_events(parse_feed_token(token)), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+
+@app.get("/ai/cache/stats")
+def ai_cache_stats():
+    """Hit/miss counters of the AI answer cache"""
+    return jsonify(get_ai_client(max_staleness=None).answer_cache.stats())
+
+
+@app.get("/ai/stats")
+def ai_stats():
+    """Which path (local router, answer cache or LLM) served summaries, with average latency"""
+    ai = get_ai_client(max_staleness=None)
+    return jsonify({"routes": ai.route_report(), "cache": ai.answer_cache.stats()})
+
+
 @app.post("/ai/apply-delta")
 def apply_ai_delta():
     """
@@ -489,23 +779,22 @@ def apply_ai_delta():
         sync_client = GoogleCalendarSync()
         service = sync_client.build_service()
         
-        # Apply the delta with auto_delete enabled
-        sync_client.apply_delta(auto_delete=True)
-        
-        # Reload calendars
-        calendar_manager.real_calendar.load_from_file(calendar_manager.real_file)
+        # Apply the delta with auto_delete enabled (batched: one round trip per 50 operations)
+        report = sync_client.apply_delta(auto_delete=True, calendar_of=calendar_manager.real_calendar.calendar_of)
         
-        # Re-sync from Google to ensure consistency
-        sync_google_to_file()
+        # Re-sync from Google (and reload) so the next read sees the applied changes
+        sync_scheduler.sync_now()
         
         return jsonify({
-            "status": "success",
-            "message": "AI changes applied successfully",
+            "status": "success" if not report["errors"] else "partial",
+            "message": "AI changes applied successfully" if not report["errors"]
+                       else f"{len(report['errors'])} change(s) failed",
             "changes": {
-                "added": len(delta.get("add", [])),
-                "updated": len(delta.get("update", [])),
-                "deleted": len(delta.get("delete", []))
-            }
+                "added": len(report["added"]),
+                "updated": len(report["updated"]),
+                "deleted": len(report["deleted"])
+            },
+            "report": report
         })
         
     except Exception as e:
@@ -0,0 +1,204 @@
+"""
+asyncio (ASGI) serving mode for the calendar backend.
+
+/ai/chat, /ai/chat/stream, /sync/google and /events/stream are served natively
+by Quart: the OpenAI call uses the async client and Google syncs run on a worker
+thread, so a chat request holds no thread while it waits for the model, and
+change feed clients hold none while they wait for a change. Every other route is the Flask
+app from app.py, run on the executor through Hypercorn's WSGI adapter, so
+both modes expose exactly the same routes and share one CalendarManager.
+
+Run with:  hypercorn async_app:asgi_app --bind localhost:8000
+"""
+import asyncio
+import os
+
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart, Response, jsonify, request
+from quart_cors import cors
+
+from app import (AI_MAX_STALENESS_SECONDS, FEED_KEEPALIVE_SECONDS, SSE_HEADERS, app as flask_app, calendar_manager,
+                 delta_preview, feed_message, get_ai_client, parse_feed_token, sse_event, sync_scheduler)
+
+quart_app = cors(Quart(__name__))
+
+# Paths served natively; everything else goes to the Flask app
+ASYNC_ROUTES = {"/ai/chat", "/ai/chat/stream", "/sync/google", "/sync/status", "/events/stream"}
+
+FEED_POLL_SECONDS = 0.25  # how often change feeds compare calendar_manager.version
+
+_sync_task = None
+
+
+async def sync_google():
+    """Run (or join) a Google sync without blocking the event loop; at most one thread is used"""
+    global _sync_task
+    if _sync_task is None or _sync_task.done():
+        _sync_task = asyncio.ensure_future(asyncio.to_thread(sync_scheduler.sync_now))
+    await asyncio.shield(_sync_task)
+
+
+async def ensure_fresh(max_staleness: float):
+    if sync_scheduler.staleness() > max_staleness:
+        await sync_google()
+
+
+@quart_app.before_serving
+async def start_sync_scheduler():
+    sync_scheduler.start()
+
+
+@quart_app.post("/ai/chat")
+async def ai_chat():
+    """Async version of app.ai_chat (same request and response JSON)"""
+    try:
+        data = await request.get_json()
+        user_message = data.get("message", "")
+        mode = data.get("mode", "natural")  # "natural" or "json"
+
+        if not user_message:
+            return jsonify({"error": "No message provided"}), 400
+        if mode not in ("natural", "json"):
+            return jsonify({"error": "Invalid mode. Use 'natural' or 'json'"}), 400
+
+        await ensure_fresh(float(data.get("max_staleness", AI_MAX_STALENESS_SECONDS)))
+        ai = await asyncio.to_thread(get_ai_client, max_staleness=None)  # may reload drafts; off the event loop
+
+        if mode == "natural":
+            response = await ai.asummarize_calendar(user_message)
+            return jsonify({
+                "type": "natural",
+                "response": response,
+                "served_by": ai.last_route,
+                "last_synced_at": sync_scheduler.status()["last_synced_at"]
+            })
+
+        delta = await ai.agenerate_calendar_delta(user_message)
+        return jsonify({
+            "type": "json",
+            "response": delta,
+            "preview": delta_preview(delta),
+            "last_synced_at": sync_scheduler.status()["last_synced_at"]
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+async def chat_stream_events(ai, user_message: str, mode: str):
+    """Async version of app.chat_stream_events"""
+    try:
+        if mode == "natural":
+            pieces = []
+            async for text in await ai.asummarize_calendar(user_message, stream=True):
+                pieces.append(text)
+                yield sse_event("token", {"text": text})
+            yield sse_event("done", {
+                "type": "natural",
+                "response": "".join(pieces).strip(),
+                "served_by": ai.last_route,
+                "last_synced_at": sync_scheduler.status()["last_synced_at"]
+            })
+        else:
+            async for section, item in await ai.agenerate_calendar_delta(user_message, stream=True):
+                if section != "delta":
+                    yield sse_event("item", {"section": section, "item": item})
+                    continue
+                yield sse_event("done", {
+                    "type": "json",
+                    "response": item,
+                    "preview": delta_preview(item),
+                    "last_synced_at": sync_scheduler.status()["last_synced_at"]
+                })
+    except Exception as e:
+        yield sse_event("error", {"error": str(e)})
+
+
+@quart_app.route("/ai/chat/stream", methods=["GET", "POST"])
+async def ai_chat_stream():
+    """Async version of app.ai_chat_stream"""
+    data = await request.get_json(silent=True) or request.args
+    user_message = data.get("message", "")
+    mode = data.get("mode", "natural")
+
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+    if mode not in ("natural", "json"):
+        return jsonify({"error": "Invalid mode. Use 'natural' or 'json'"}), 400
+
+    try:
+        await ensure_fresh(float(data.get("max_staleness", AI_MAX_STALENESS_SECONDS)))
+        ai = await asyncio.to_thread(get_ai_client, max_staleness=None)  # may reload drafts; off the event loop
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    response = Response(chat_stream_events(ai, user_message, mode), mimetype="text/event-stream", headers=SSE_HEADERS)
+    response.timeout = None  # the stream lasts as long as the model keeps talking
+    return response
+
+
+@quart_app.post("/sync/google")
+async def sync_google_calendar():
+    """Async version of app.sync_google_calendar"""
+    try:
+        await sync_google()
+        if sync_scheduler.last_error:
+            return jsonify({"error": sync_scheduler.last_error, **sync_scheduler.status()}), 502
+        return jsonify({
+            "status": "success",
+            "message": f"Synced {len(calendar_manager.real_calendar)} events",
+            "event_count": len(calendar_manager.real_calendar),
+            "last_synced_at": sync_scheduler.status()["last_synced_at"]
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+async def change_feed_events(version):
+    """Async version of app.change_feed_events; polls the version instead of blocking a thread on it"""
+    while True:
+        version, message = feed_message(version)
+        if message:
+            yield message
+        waited = 0.0
+        while calendar_manager.version == version:
+            await asyncio.sleep(FEED_POLL_SECONDS)
+            waited += FEED_POLL_SECONDS
+            if waited >= FEED_KEEPALIVE_SECONDS:
+                yield ": keepalive\n\n"
+                waited = 0.0
+
+
+@quart_app.get("/events/stream")
+async def events_stream():
+    """Async version of app.events_stream"""
+    token = request.headers.get("Last-Event-ID") or request.args.get("since")
+    response = Response(change_feed_events(parse_feed_token(token)), mimetype="text/event-stream", headers=SSE_HEADERS)
+    response.timeout = None  # the feed stays open until the client goes away
+    return response
+
+
+@quart_app.get("/sync/status")
+async def sync_status():
+    return jsonify(sync_scheduler.status())
+
+
+flask_asgi = AsyncioWSGIMiddleware(flask_app)
+
+
+async def asgi_app(scope, receive, send):
+    """Dispatch between the native async routes and the Flask app"""
+    if scope["type"] == "lifespan" or scope.get("path") in ASYNC_ROUTES:
+        await quart_app(scope, receive, send)
+    else:
+        await flask_asgi(scope, receive, send)
+
+
+# -------------------- RUN --------------------
+if __name__ == "__main__":
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [f"localhost:{os.getenv('PORT', 8000)}"]
+    asyncio.run(serve(asgi_app, config))
@@ -0,0 +1,203 @@
+"""
+Load/save, index and commit microbenchmarks for Calendar and the JSON codec.
+
+Builds a synthetic calendar_export.json-style history (timed events in a few
+UTC offsets, all-day events and some weekly series, six titles repeated
+throughout) and times every path a calendar takes on and off disk, once per
+JSON backend. Then the hash indexes: id and (title, start) lookups and
+/preview conflict marking on a few thousand events, and a commit of --drafts
+drafts (a tenth of them already synced) against the full calendar, each next
+to the scan it replaced:
+
+    python calendar_benchmark.py --events 50000 --drafts 1000 --repeat 3
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import json_codec
+from event_store import SQLiteStore
+from oop_events import Calendar, CalendarManager, Event, iso_epoch, to_epoch, utc_offset_minutes
+
+OFFSETS = ["Z", "+01:00", "+02:00", "-05:00", ""]
+
+
+def make_events(count: int, seed: int = 212) -> list[dict]:
+    """Google Calendar API dicts spread over the two years before today"""
+    rng = random.Random(seed)
+    first = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=730)
+    events = []
+    for i in range(count):
+        start = first + timedelta(days=rng.randrange(730), minutes=30 * rng.randrange(16, 40))
+        event = {
+            "id": f"e{i:07d}",
+            "calendarId": rng.choice(["primary", "work@example.com", "family@example.com"]),
+            "summary": rng.choice(["Standup", "Lunch", "1:1", "Gym", "Møte", "Focus time"]),
+        }
+        if i % 10 == 0:
+            event["start"] = {"date": f"{start:%Y-%m-%d}"}
+            event["end"] = {"date": f"{start + timedelta(days=1):%Y-%m-%d}"}
+        else:
+            suffix = rng.choice(OFFSETS)
+            end = start + timedelta(minutes=30 * rng.randrange(1, 5))
+            event["start"] = {"dateTime": f"{start:%Y-%m-%dT%H:%M:%S}{suffix}"}
+            event["end"] = {"dateTime": f"{end:%Y-%m-%dT%H:%M:%S}{suffix}"}
+        if i % 500 == 0:
+            event["recurrence"] = ["RRULE:FREQ=WEEKLY;COUNT=20"]
+        events.append(event)
+    return events
+
+
+def best_of(repeat: int, fn) -> float:
+    """Fastest of `repeat` runs, in milliseconds"""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times) * 1000
+
+
+def report(name: str, ms: float, extra: str = ""):
+    print(f"  {name:<34} {ms:>10.1f} ms  {extra}")
+
+
+def run(count: int, repeat: int, directory: str):
+    events = make_events(count)
+    values = [e[side].get("dateTime") or e[side].get("date") for e in events for side in ("start", "end")]
+    json_file = os.path.join(directory, "calendar_export.json")
+
+    print(f"📊 {count} events, best of {repeat}")
+    print("ISO parsing")
+    report("datetime.fromisoformat", best_of(repeat, lambda: [
+        (to_epoch(dt), utc_offset_minutes(dt)) for dt in map(datetime.fromisoformat, values)]))
+    report("iso_epoch", best_of(repeat, lambda: [iso_epoch(v) for v in values]))
+
+    backends = ["json", "orjson"] if json_codec.orjson else ["json"]
+    for backend in backends:
+        json_codec.set_backend(backend)
+        calendar = Calendar("Benchmark", "real")
+        print(f"JSON backend: {backend}")
+
+        compact = json_codec.dump_bytes(events)
+        pretty = json_codec.dump_bytes(events, pretty=True)
+        report("dumps (compact)", best_of(repeat, lambda: json_codec.dump_bytes(events)), f"{len(compact) // 1024} KiB")
+        report("dumps (pretty)", best_of(repeat, lambda: json_codec.dump_bytes(events, pretty=True)),
+               f"{len(pretty) // 1024} KiB")
+        report("loads", best_of(repeat, lambda: json_codec.loads(compact)))
+
+        with open(json_file, "wb") as f:
+            f.write(compact)
+        report("Calendar.load_from_file", best_of(repeat, lambda: calendar.load_from_file(json_file)),
+               f"{len(calendar)} rows")
+        report("Calendar.to_dicts", best_of(repeat, calendar.to_dicts))
+        report("Calendar.save_to_file (compact)", best_of(repeat, lambda: calendar.save_to_file(json_file)))
+        report("Calendar.save_to_file (pretty)", best_of(repeat, lambda: calendar.save_to_file(json_file, pretty=True)))
+
+        store = SQLiteStore(os.path.join(directory, f"{backend}.db"), "real")
+        report("Calendar.save_to_store (SQLite)", best_of(repeat, lambda: calendar.save_to_store(store)))
+        report("Calendar.load_from_store (SQLite)", best_of(repeat, lambda: calendar.load_from_store(store)))
+
+
+def make_drafts(events: list[dict], count: int, seed: int = 11) -> list[Event]:
+    """count drafts; every tenth copies a timed event's title and start, the rest land anywhere in the same span"""
+    rng = random.Random(seed)
+    timed = [e for e in events if "dateTime" in e["start"]]
+    drafts = []
+    for i in range(count):
+        if i % 10 == 0:
+            e = rng.choice(timed)
+            start = datetime.fromisoformat(e["start"]["dateTime"])
+            title = e["summary"]
+        else:
+            start = datetime.fromisoformat(rng.choice(timed)["start"]["dateTime"]).replace(tzinfo=None)
+            start += timedelta(minutes=15 * rng.randrange(-8, 8))
+            title = f"Draft {i}"
+        drafts.append(Event(title, start, start + timedelta(minutes=45), source="draft"))
+    return drafts
+
+
+def write_events(events: list[dict], filename: str):
+    with open(filename, "wb") as f:
+        f.write(json_codec.dump_bytes(events))
+
+
+def run_lookups(events: list[dict], repeat: int, directory: str):
+    """id and (title, start) lookups and /preview conflict marking, next to the scans they replaced"""
+    sample_file = os.path.join(directory, "lookups.json")
+    write_events(events, sample_file)
+    real = Calendar("Real", "real")
+    real.load_from_file(sample_file)
+    draft = Calendar("Draft", "draft")
+    for ev in make_drafts(events, len(events) // 10):
+        draft.add_event(ev)
+    rows = list(real.events)
+
+    print(f"Hash indexes: {len(rows)} events, {len({ev.title for ev in rows})} distinct titles")
+    report("get(id)", best_of(repeat, lambda: [real.get(ev.id) for ev in rows]), f"{len(rows)} lookups")
+    report("contains(title, start)", best_of(repeat, lambda: [real.contains(ev.title, ev.start) for ev in rows]),
+           f"{len(rows)} lookups")
+    sample = rows[::max(1, len(rows) // 100)]
+    ms = best_of(repeat, lambda: [next(e for e in real.events if e.id == ev.id) for ev in sample])
+    report("id scan (old)", ms * len(rows) / len(sample), f"extrapolated from {len(sample)} lookups")
+
+    dicts = [("real", e) for e in real.to_dicts()] + [("draft", e) for e in draft.to_dicts()]
+    overlaps = Calendar.find_overlaps_between(real, draft)
+
+    def mark_by_id():
+        ids = {ref[2] for pair in overlaps for ref in pair}
+        return [ev["id"] in ids for _, ev in dicts]
+
+    def mark_by_title():
+        flags = [False] * len(dicts)
+        for e1, e2 in overlaps:
+            for i, (source, ev) in enumerate(dicts):
+                if (ev["summary"], source) in (e1[:2], e2[:2]):
+                    flags[i] = True
+        return flags
+
+    report("/preview marking by id", best_of(repeat, mark_by_id),
+           f"{len(overlaps)} overlaps, {sum(mark_by_id())}/{len(dicts)} flagged")
+    report("/preview marking by title (old)", best_of(1, mark_by_title), f"{sum(mark_by_title())}/{len(dicts)} flagged")
+
+
+def run_commit(events: list[dict], drafts: int, repeat: int, directory: str):
+    """Dedup of drafts against a large real calendar on commit, next to the any() scan it replaced"""
+    from calendar_stress import FakeGoogle  # in-process Calendar API stand-in
+
+    real_file = os.path.join(directory, "commit_export.json")
+    write_events(events, real_file)
+    manager = CalendarManager(os.path.join(directory, "draft_calendar.json"), real_file,
+                              database=os.path.join(directory, "commit.db"))
+    calendar = manager.real_calendar
+    pending = make_drafts(events, drafts)
+
+    print(f"Commit: {drafts} drafts against {len(calendar)} events")
+    report("contains() per draft", best_of(repeat, lambda: [calendar.contains(ev.title, ev.start) for ev in pending]),
+           f"{sum(calendar.contains(ev.title, ev.start) for ev in pending)} already synced")
+    scanned = pending[:10]
+    ms = best_of(1, lambda: [any(e.title == ev.title and e.start == ev.start for e in calendar.events) for ev in scanned])
+    report("any() scan per draft (old)", ms * drafts / len(scanned), f"extrapolated from {len(scanned)} drafts")
+
+    manager.save_draft_events(pending)
+    t0 = time.perf_counter()
+    result = manager.apply_changes(FakeGoogle(latency=0))
+    report("apply_changes (no network)", (time.perf_counter() - t0) * 1000,
+           f"{len(result['added'])} inserted, {len(manager.draft_calendar)} drafts left")
+
+
+# -------------------- RUN --------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=50000, help="number of events (default: 50000)")
+    parser.add_argument("--drafts", type=int, default=1000, help="drafts in the commit case (default: 1000)")
+    parser.add_argument("--lookup-events", type=int, default=3000, help="events in the index lookup case (default: 3000)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case; the fastest is reported (default: 3)")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        run(args.events, args.repeat, directory)
+        run_lookups(make_events(args.lookup_events), args.repeat, directory)
+        run_commit(make_events(args.events), args.drafts, args.repeat, directory)
@@ -0,0 +1,253 @@
+"""
+Concurrency stress test for the Flask app's calendar endpoints.
+
+Seeds a synthetic real calendar, then runs threads in parallel against the
+app's test client for a fixed time: readers on /events, /preview, /conflicts
+and /freebusy, writers on /draft/add and /draft/add-many, committers on
+/commit (against an in-process stand-in for the Google Calendar API) and the
+app's SyncScheduler, which keeps replacing the real calendar with an export of
+a different size. Afterwards it checks what the calendar locks promise:
+
+    - no request failed (HTTP 5xx or an exception)
+    - no read saw a half-loaded real calendar (fewer events than either export)
+    - every added draft is still a draft or was inserted into Google exactly once
+    - the stores on disk hold the same events as memory
+
+    python calendar_stress.py --seconds 10 --events 5000
+
+Runs in a temporary directory, so the repo's calendar.db and draft files are
+left alone. CALENDAR_DB= (empty) runs it against the JSON file stores instead.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from calendar_benchmark import make_events
+from oop_events import Calendar
+
+EXTRA_EVENTS = 2000  # the second export is this much larger
+
+
+class FakeRequest:
+    def __init__(self, google, body):
+        self.google = google
+        self.body = body
+
+    def execute(self, http=None):
+        time.sleep(self.google.latency)
+        return self.google.record(self.body)
+
+
+class FakeBatch:
+    def __init__(self, google, callback):
+        self.google = google
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        time.sleep(self.google.latency)  # one round trip per batch
+        for request_id, request in self.requests:
+            self.callback(request_id, self.google.record(request.body), None)
+
+
+class FakeEvents:
+    def __init__(self, google):
+        self.google = google
+
+    def insert(self, calendarId, body):
+        return FakeRequest(self.google, body)
+
+
+class FakeGoogle:
+    """Just enough of the Calendar API service for CalendarManager.apply_changes; counts inserts per event id"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.inserted = Counter()
+        self.lock = threading.Lock()
+
+    def record(self, body: dict) -> dict:
+        with self.lock:
+            self.inserted[body["id"]] += 1
+        return body
+
+    def events(self):
+        return FakeEvents(self)
+
+    def new_batch_http_request(self, callback):
+        return FakeBatch(self, callback)
+
+
+def draft_json(rng: random.Random) -> dict:
+    """A /draft/add body somewhere in the next two weeks"""
+    start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=rng.randrange(24 * 14))
+    return {"title": "Stress", "start": start.isoformat(),
+            "end": (start + timedelta(minutes=30 * rng.randrange(1, 4))).isoformat()}
+
+
+def run(seconds: float, events: int, readers: int, drafters: int, committers: int, latency: float):
+    # The app builds its stores in the working directory at import time
+    os.environ["SYNC_INTERVAL_SECONDS"] = "0.05"
+    import app as server
+
+    manager = server.calendar_manager
+    google = FakeGoogle(latency)
+    server.GoogleCalendarSync.build_service = lambda self: google
+
+    seed = make_events(events + EXTRA_EVENTS)
+    exports = [seed[:events], seed]
+
+    syncs = 0
+
+    def sync_once():
+        """Stands in for a Google sync: the other export into the store, then the usual reload"""
+        nonlocal syncs
+        syncs += 1
+        exports.reverse()
+        with manager.real_store.rewrite() as add:
+            for event in exports[0]:
+                add(event)
+        manager.real_calendar.load_if_changed(manager.real_store)
+
+    sync_once()
+    server.sync_scheduler.sync_fn = sync_once  # run by the app's scheduler thread every 50 ms
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    latencies = defaultdict(list)
+    failures = []
+    half_loaded = Counter()
+    drafted, committed = [], []
+
+    def request(client, method, path, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            response = getattr(client, method)(path, **kwargs)
+        except Exception as e:
+            with lock:
+                failures.append(f"{method.upper()} {path}: {e!r}")
+            return None
+        elapsed = time.perf_counter() - t0
+        with lock:
+            latencies[path].append(elapsed)
+            if response.status_code >= 500:
+                failures.append(f"{method.upper()} {path}: HTTP {response.status_code}")
+        return response if response.status_code < 400 else None
+
+    def reader(n):
+        client = server.app.test_client()
+        paths = ["/events", "/preview", "/conflicts", "/freebusy"]
+        while not stop.is_set():
+            path = paths[n % len(paths)]
+            n += 1
+            response = request(client, "get", path)
+            if response is None or path not in ("/events", "/preview"):
+                continue
+            data = response.get_json()
+            real = data["real"] if path == "/preview" else [e for e in data if not e.get("draft")]
+            if len(real) < events:
+                with lock:
+                    half_loaded[path] += 1
+
+    def drafter(n):
+        client = server.app.test_client()
+        rng = random.Random(n)
+        while not stop.is_set():
+            # Titles are unique, so each draft can be followed through commits
+            batch = [draft_json(rng) | {"title": f"Stress {n}-{rng.getrandbits(48):x}"}
+                     for _ in range(1 if rng.random() < 0.8 else rng.randrange(2, 10))]
+            if len(batch) == 1:
+                response = request(client, "post", "/draft/add", json=batch[0])
+            else:
+                response = request(client, "post", "/draft/add-many", json={"events": batch})
+            if response is not None:
+                with lock:
+                    drafted.extend(d["title"] for d in batch)
+
+    def committer(n):
+        client = server.app.test_client()
+        while not stop.is_set():
+            response = request(client, "post", "/commit")
+            if response is not None:
+                with lock:
+                    committed.extend(e["summary"] for e in response.get_json()["report"]["added"])
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True)
+               for worker, count in ((reader, readers), (drafter, drafters), (committer, committers))
+               for n in range(count)]
+    print(f"🏋️ {len(threads)} threads for {seconds:g} s: {readers} readers, {drafters} drafters, "
+          f"{committers} committers, plus the sync thread ({events}/{events + EXTRA_EVENTS} real events)")
+    server.sync_scheduler.start()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    server.sync_scheduler.stop()
+
+    # Anything left is committed once more, so every draft has a definite outcome
+    report = manager.apply_changes(google)
+    committed.extend(e["summary"] for e in report["added"])
+
+    print(f"{'endpoint':<18} {'requests':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for path, times in sorted(latencies.items()):
+        times.sort()
+        print(f"{path:<18} {len(times):>8} {times[len(times) // 2] * 1000:>8.1f} {times[len(times) * 99 // 100] * 1000:>8.1f}")
+    print(f"syncs: {syncs}, drafts added: {len(drafted)}, drafts committed: {len(committed)}")
+
+    duplicates = [event_id for event_id, count in google.inserted.items() if count > 1]
+    with manager.lock.read():
+        draft_titles = {e.title for e in manager.draft_calendar.events}
+    lost = set(drafted) - draft_titles - set(committed)
+
+    def stored_ids(store, source):
+        calendar = Calendar("Check", source)
+        calendar.load_from_store(store)
+        return {e["id"] for e in calendar.to_dicts()}
+
+    with manager.lock.read():
+        memory = {e["id"] for e in manager.real_calendar.to_dicts()}, {e["id"] for e in manager.draft_calendar.to_dicts()}
+    on_disk = stored_ids(manager.real_store, "real"), stored_ids(manager.draft_store, "draft")
+
+    checks = [
+        ("failed requests", len(failures)),
+        ("half-loaded reads", sum(half_loaded.values())),
+        ("drafts lost", len(lost)),
+        ("drafts inserted twice", len(duplicates)),
+        ("store/memory mismatches", len(memory[0] ^ on_disk[0]) + len(memory[1] ^ on_disk[1])),
+    ]
+    for name, count in checks:
+        print(f"{'✅' if count == 0 else '❌'} {name}: {count}")
+    for failure in failures[:10]:
+        print(f"   {failure}")
+    return all(count == 0 for _, count in checks)
+
+
+# -------------------- RUN --------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10, help="how long to run (default: 10)")
+    parser.add_argument("--events", type=int, default=5000, help="real events in the smaller export (default: 5000)")
+    parser.add_argument("--readers", type=int, default=8, help="threads on /events, /preview, /conflicts, /freebusy")
+    parser.add_argument("--drafters", type=int, default=4, help="threads on /draft/add and /draft/add-many")
+    parser.add_argument("--committers", type=int, default=2, help="threads on /commit")
+    parser.add_argument("--latency", type=float, default=0.02, help="simulated Google round trip in seconds")
+    args = parser.parse_args()
+
+    here = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        ok = run(args.seconds, args.events, args.readers, args.drafters, args.committers, args.latency)
+        os.chdir(here)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from json_codec import dump_bytes
+
+
+class ReadWriteLock:
+    """
+    Many readers or one writer.
+
+    Both sides are re-entrant and the thread holding the write lock may also
+    read. Waiting writers block new readers, so a reload is never starved by a
+    stream of requests. Upgrading a held read lock to a write lock would
+    deadlock and raises RuntimeError instead.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = None  # thread ident
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def read(self):
+        me = threading.get_ident()
+        depth = getattr(self._local, "reads", 0)
+        with self._cond:
+            # A thread that already reads (or writes) must not queue behind a waiting writer
+            if depth == 0 and self._writer != me:
+                while self._writer is not None or self._waiting_writers:
+                    self._cond.wait()
+            self._readers += 1
+        self._local.reads = depth + 1
+        try:
+            yield
+        finally:
+            self._local.reads = depth
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+            else:
+                if getattr(self._local, "reads", 0):
+                    raise RuntimeError("Cannot take the write lock while holding the read lock")
+                self._waiting_writers += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._cond.wait()
+                finally:
+                    self._waiting_writers -= 1
+                self._writer = me
+                self._writer_depth = 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer_depth -= 1
+                if not self._writer_depth:
+                    self._writer = None
+                    self._cond.notify_all()
+
+
+def atomic_write_json(filename: str, data, pretty: bool = False):
+    """
+    Write JSON (compact unless pretty) to a temp file next to filename and rename
+    it into place, so readers see either the old file or the new one, never a
+    partial write.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_file = tempfile.mkstemp(dir=directory, prefix=os.path.basename(filename) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(dump_bytes(data, pretty))
+        os.replace(tmp_file, filename)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
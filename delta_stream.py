@@ -0,0 +1,76 @@
+import json
+import re
+
+DELTA_SECTIONS = ("add", "update", "delete")
+
+# The only characters that change the scanner state
+SPECIAL_CHARS = re.compile(r'[\\"{}\[\]]')
+
+
+class DeltaStreamParser:
+    """
+    Incremental scanner for a streamed calendar delta ({"add": [...], "update": [...],
+    "delete": [...]}). Feed it text as it arrives; every add/update/delete item is
+    returned as soon as its closing brace or quote has been received.
+
+    The scanner only tracks nesting depth and string state, jumping between quote,
+    bracket and backslash characters, and each item is parsed with json.loads once.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._string_start = None
+        self._section = None  # key of the array being read
+        self._item_start = None
+
+    def feed(self, text: str) -> list[tuple[str, object]]:
+        """Add streamed text and return the (section, item) pairs it completed"""
+        self.buffer += text
+        buf = self.buffer
+        completed = []
+
+        i = self._pos
+        while True:
+            m = SPECIAL_CHARS.search(buf, i)
+            if m is None:
+                i = len(buf)
+                break
+            i = m.start()
+            ch = buf[i]
+
+            if self._in_string:
+                if ch == "\\":
+                    if i + 1 == len(buf):
+                        break  # the escaped character hasn't arrived yet
+                    i += 2
+                    continue
+                if ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        # Strings directly in the top-level object are its keys
+                        self._section = json.loads(buf[self._string_start:i + 1])
+                    elif self._depth == 2 and self._section in DELTA_SECTIONS:
+                        completed.append((self._section, json.loads(buf[self._string_start:i + 1])))
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 3:
+                    self._item_start = i
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 2 and self._item_start is not None and self._section in DELTA_SECTIONS:
+                    completed.append((self._section, json.loads(buf[self._item_start:i + 1])))
+                    self._item_start = None
+            i += 1
+
+        self._pos = i
+        return completed
+
+    def result(self) -> dict:
+        """The whole delta, once the stream has finished"""
+        return json.loads(self.buffer)
@@ -0,0 +1,598 @@
+"""
+Storage backends for calendars and the Google sync export.
+
+Both keep events in the Google Calendar API format of calendar_export.json and
+expose the same interface, so Calendar, CalendarManager and IncrementalSyncEngine
+don't care which one they are given:
+
+    read()          ([plain event rows], [other event dicts]) for Calendar loads
+    signature()     changes whenever the stored events change
+    transaction()   put / pop / delete / drop_* calls, applied together
+    rewrite()       replace everything by streaming events in (full syncs)
+
+JsonFileStore is the original whole-file format. SQLiteStore keeps one row per
+event in a WAL-mode database, so a change costs a row write instead of a rewrite
+of the whole history. DraftJournal is the file-based draft store: an append-only
+JSON-lines journal (no rewrite()).
+
+    python event_store.py import calendar.db real calendar_export.json
+    python event_store.py export calendar.db real calendar_export.json [--pretty]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
+
+import json_codec
+from concurrency import atomic_write_json
+from oop_events import DEFAULT_CALENDAR_ID, file_signature, iso_epoch
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    calendar TEXT NOT NULL,       -- local calendar: "real", "draft"
+    calendar_id TEXT NOT NULL,    -- Google calendar
+    id TEXT NOT NULL,
+    summary TEXT,
+    start_ts INTEGER,             -- epoch seconds and UTC offset columns, as in Calendar
+    end_ts INTEGER,
+    start_offset INTEGER,
+    end_offset INTEGER,
+    recurring INTEGER NOT NULL,   -- masters, exceptions and cancelled instances; loaded from data
+    data TEXT NOT NULL,           -- the whole event, as in calendar_export.json
+    PRIMARY KEY (calendar, calendar_id, id)
+);
+CREATE INDEX IF NOT EXISTS events_start ON events (calendar, start_ts);
+CREATE INDEX IF NOT EXISTS events_end ON events (calendar, end_ts);
+CREATE INDEX IF NOT EXISTS events_id ON events (id);
+CREATE TABLE IF NOT EXISTS versions (
+    calendar TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+UPSERT = """
+INSERT OR REPLACE INTO events
+    (calendar, calendar_id, id, summary, start_ts, end_ts, start_offset, end_offset, recurring, data)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Full syncs are staged under this suffix in short transactions and swapped in at the end
+STAGING = "~staging"
+STAGING_BATCH = 500
+
+
+def event_key(e: dict) -> tuple:
+    """(Google calendar id, event id), the key events are stored under"""
+    return (e.get("calendarId") or DEFAULT_CALENDAR_ID, e.get("id"))
+
+
+def is_plain(e: dict) -> bool:
+    """A single, timed event, fully described by the Calendar row columns"""
+    return not (e.get("recurrence") or e.get("recurringEventId") or e.get("status") == "cancelled")
+
+
+def _row(calendar: str, e: dict) -> tuple:
+    start = e.get("start") or {}
+    end = e.get("end") or {}
+    start = start.get("dateTime") or start.get("date")
+    end = end.get("dateTime") or end.get("date")
+    start, start_offset = iso_epoch(start) if start else (None, None)
+    end, end_offset = iso_epoch(end) if end else (None, None)
+    return (
+        calendar, *event_key(e), e.get("summary", "Untitled"), start, end, start_offset, end_offset,
+        int(not is_plain(e)), json_codec.dumps(e),
+    )
+
+
+class JsonFileStore:
+    """
+    One JSON array per calendar (the original calendar_export.json format). Every
+    transaction rewrites the whole file; the parsed file is kept in memory between
+    transactions and re-read only when the file changes. The file is written
+    compact unless pretty=True.
+    """
+
+    def __init__(self, filename: str, pretty: bool = False):
+        self.filename = filename
+        self.pretty = pretty
+        self.key = filename  # what Calendar.load_if_changed compares, same as for a bare filename
+        self._events: Optional[dict] = None
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return self.filename
+
+    def signature(self):
+        return file_signature(self.filename)
+
+    def _load(self) -> dict:
+        signature = self.signature()
+        if self._events is None or self._signature != signature:
+            try:
+                events = json_codec.load_file(self.filename)
+            except FileNotFoundError:
+                events = []
+            # Events without an id are kept under their position so none are lost
+            self._events = {event_key(e) if e.get("id") else ("", i): e for i, e in enumerate(events)}
+            self._signature = signature
+        return self._events
+
+    def read(self) -> tuple[list, list[dict]]:
+        return [], list(self._load().values())
+
+    def events(self) -> Iterator[dict]:
+        return iter(list(self._load().values()))
+
+    def count(self) -> int:
+        return len(self._load())
+
+    def mergeable(self) -> bool:
+        """Whether changes from Google can be merged in (every event has an id and a calendarId)"""
+        try:
+            events = self._load()
+        except ValueError:
+            return False
+        return os.path.exists(self.filename) and all(e.get("id") and e.get("calendarId") for e in events.values())
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            txn = _DictTransaction(dict(self._load()))  # a failed transaction leaves the cache as it was
+            yield txn
+            if txn.changed:
+                atomic_write_json(self.filename, list(txn.events.values()), self.pretty)
+                self._events = txn.events
+                self._signature = self.signature()
+            txn.signature = self.signature()
+
+    @contextmanager
+    def rewrite(self):
+        """Stream events into a temp file with add(event) and rename it into place on success"""
+        tmp_file = self.filename + ".tmp"
+        count = 0
+        completed = False
+        with self._lock:
+            try:
+                with open(tmp_file, "w", encoding="utf-8") as f:
+                    f.write("[")
+
+                    def add(event: dict):
+                        nonlocal count
+                        f.write(",\n" if count else "\n")
+                        if self.pretty:
+                            f.write(textwrap.indent(json_codec.dumps(event, pretty=True), "  "))
+                        else:
+                            f.write(json_codec.dumps(event))  # one event per line
+                        count += 1
+
+                    yield add
+                    f.write("\n]" if count else "]")
+                os.replace(tmp_file, self.filename)
+                completed = True
+            finally:
+                if not completed and os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+                # Nothing is kept in memory; the next read parses the new file
+                self._events = None
+
+
+class _DictTransaction:
+    """Changes to an in-memory {key: event} copy of a JsonFileStore"""
+
+    def __init__(self, events: dict):
+        self.events = events
+        self.changed = False
+        self.signature = None  # the store's signature once the transaction is done
+
+    def put(self, event: dict):
+        self.events[event_key(event)] = event
+        self.changed = True
+
+    def _remove(self, key: tuple) -> Optional[dict]:
+        removed = self.events.pop(key, None)
+        self.changed |= removed is not None
+        return removed
+
+    def pop(self, calendar_id: str, event_id: str) -> Optional[dict]:
+        return self._remove((calendar_id, event_id))
+
+    def _drop(self, matches):
+        for key in [key for key, e in self.events.items() if matches(key, e)]:
+            self._remove(key)
+
+    def delete(self, event_id: str):
+        """Remove the event with this id, whichever Google calendar it is in"""
+        self._drop(lambda key, e: e.get("id") == event_id)
+
+    def drop_series(self, calendar_id: str, series_id: str):
+        """Remove the exceptions of a recurring series"""
+        self._drop(lambda key, e: key[0] == calendar_id and e.get("recurringEventId") == series_id)
+
+    def drop_calendar(self, calendar_id: str):
+        self._drop(lambda key, e: key[0] == calendar_id)
+
+    def keep_calendars(self, calendar_ids: Iterable[str]):
+        """Remove every event that isn't in one of these Google calendars"""
+        keep = set(calendar_ids)
+        self._drop(lambda key, e: key[0] not in keep)
+
+    def clear(self):
+        self.changed |= bool(self.events)
+        self.events.clear()
+
+
+class DraftJournal:
+    """
+    Drafts as an append-only JSON-lines journal of {"put": event} and {"delete":
+    [calendar id, event id]} records, replayed on read. A transaction is appended
+    with one write however many drafts it adds, and fsynced at most every
+    fsync_interval seconds (the write itself reaches the OS at once, so only an
+    OS crash can lose that last interval). Clearing the journal, or compacting it
+    once it holds COMPACT_RATIO times more records than drafts, writes the live
+    drafts to a temp file and renames it over the journal, so /discard and /commit
+    truncate it atomically.
+    """
+
+    COMPACT_RATIO = 4
+    COMPACT_MIN_RECORDS = 256
+
+    def __init__(self, filename: str, fsync_interval: float = 1.0):
+        self.filename = filename
+        self.key = filename
+        self.fsync_interval = fsync_interval
+        self._events: Optional[dict] = None
+        self._records = 0  # records in the file, live or not
+        self._signature = None
+        self._file = None
+        self._dirty = False  # written but not fsynced yet
+        self._last_fsync = 0.0
+        self._timer = None
+        self._lock = threading.RLock()
+
+    def __str__(self):
+        return self.filename
+
+    def signature(self):
+        return file_signature(self.filename)
+
+    def _replay(self) -> dict:
+        signature = self.signature()
+        if self._events is not None and self._signature == signature:
+            return self._events
+
+        if self._file is not None:  # the file was replaced; append to the new one
+            self._file.close()
+            self._file = None
+        events, records, torn = {}, 0, False
+        try:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json_codec.loads(line)
+                    except ValueError:
+                        torn = True  # cut short by a crash; later records can't have been written after it
+                        continue
+                    records += 1
+                    if "put" in record:
+                        events[event_key(record["put"])] = record["put"]
+                    else:
+                        events.pop(tuple(record["delete"]), None)
+        except FileNotFoundError:
+            pass
+        self._events, self._records, self._signature = events, records, signature
+        if torn:
+            self._compact(events)  # so the next append doesn't land on the torn line
+        return self._events
+
+    def read(self) -> tuple[list, list[dict]]:
+        with self._lock:
+            return [], list(self._replay().values())
+
+    def events(self) -> Iterator[dict]:
+        with self._lock:
+            return iter(list(self._replay().values()))
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._replay())
+
+    def mergeable(self) -> bool:
+        return os.path.exists(self.filename)
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            txn = _JournalTransaction(dict(self._replay()))
+            yield txn
+            if txn.cleared or (txn.records and not txn.events) or self._records + len(txn.records) > max(
+                    self.COMPACT_MIN_RECORDS, self.COMPACT_RATIO * len(txn.events)):
+                self._compact(txn.events)  # also truncates it once the last draft is committed
+            elif txn.records:
+                self._append(txn.records)
+            self._events = txn.events
+            txn.signature = self.signature()
+
+    def _append(self, records: list[dict]):
+        if self._file is None:
+            self._file = open(self.filename, "a", encoding="utf-8")
+        self._file.write("".join(json_codec.dumps(r) + "\n" for r in records))
+        self._file.flush()
+        self._records += len(records)
+        self._signature = self.signature()
+        self._dirty = True
+        if time.monotonic() - self._last_fsync >= self.fsync_interval:
+            self._fsync()
+        elif self._timer is None:
+            self._timer = threading.Timer(self.fsync_interval, self._fsync)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _fsync(self):
+        with self._lock:
+            self._timer = None
+            if self._dirty and self._file is not None:
+                os.fsync(self._file.fileno())
+            self._dirty = False
+            self._last_fsync = time.monotonic()
+
+    def _compact(self, events: dict):
+        """Atomically replace the journal with one put per live draft (none: truncate it)"""
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        fd, tmp_file = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.filename) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.writelines(json_codec.dumps({"put": e}) + "\n" for e in events.values())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.filename)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._records = len(events)
+        self._signature = self.signature()
+        self._dirty = False
+
+    def import_json(self, filename: str) -> int:
+        """Replace the drafts with the events of a draft_calendar.json-style file"""
+        events = json_codec.load_file(filename)
+        with self.transaction() as txn:
+            txn.clear()
+            for e in events:
+                txn.put(e if e.get("id") else e | {"id": uuid.uuid4().hex})
+        return len(events)
+
+
+class _JournalTransaction(_DictTransaction):
+    """A _DictTransaction that also records the journal lines its changes need"""
+
+    def __init__(self, events: dict):
+        super().__init__(events)
+        self.records = []
+        self.cleared = False
+
+    def put(self, event: dict):
+        super().put(event)
+        self.records.append({"put": event})
+
+    def _remove(self, key: tuple) -> Optional[dict]:
+        removed = super()._remove(key)
+        if removed is not None:
+            self.records.append({"delete": list(key)})
+        return removed
+
+    def clear(self):
+        super().clear()
+        self.records.clear()
+        self.cleared = True
+
+
+class SQLiteStore:
+    """
+    One calendar ("real", "draft", ...) in an SQLite database in WAL mode, so
+    readers never block the writer. Every event is a row keyed by (calendar,
+    Google calendar id, event id) with the whole event as JSON next to the epoch
+    and offset columns Calendar keeps in memory; plain events load straight from
+    those columns. Each thread gets its own connection.
+    """
+
+    _local = threading.local()  # database path -> connection, per thread
+
+    def __init__(self, path: str, calendar: str):
+        self.path = path
+        self.calendar = calendar
+        self.key = (os.path.abspath(path), calendar)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def __str__(self):
+        return f"{self.path} ({self.calendar})"
+
+    def _connect(self) -> sqlite3.Connection:
+        connections = self._local.__dict__.setdefault("connections", {})
+        conn = connections.get(self.key[0])
+        if conn is None:
+            # Autocommit mode; transaction() issues BEGIN IMMEDIATE itself
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints; WAL keeps the file consistent
+            connections[self.key[0]] = conn
+        return conn
+
+    def signature(self) -> int:
+        """Version counter of this calendar, bumped by every transaction that changed it (0: never written)"""
+        row = self._connect().execute("SELECT version FROM versions WHERE calendar = ?", (self.calendar,)).fetchone()
+        return row[0] if row else 0
+
+    def read(self) -> tuple[list, list[dict]]:
+        """
+        ([(id, calendar_id, summary, start, end, start_offset, end_offset)] of plain
+        events in start order, [dicts of recurring masters, exceptions and cancelled
+        instances]), read in one snapshot
+        """
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            rows = conn.execute(
+                "SELECT id, calendar_id, summary, start_ts, end_ts, start_offset, end_offset FROM events"
+                " WHERE calendar = ? AND recurring = 0 ORDER BY start_ts", (self.calendar,)
+            ).fetchall()
+            records = [json_codec.loads(data) for data, in conn.execute(
+                "SELECT data FROM events WHERE calendar = ? AND recurring = 1", (self.calendar,))]
+        finally:
+            conn.execute("COMMIT")
+        return rows, records
+
+    def events(self) -> Iterator[dict]:
+        for data, in self._connect().execute("SELECT data FROM events WHERE calendar = ?", (self.calendar,)):
+            yield json_codec.loads(data)
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT count(*) FROM events WHERE calendar = ?", (self.calendar,)).fetchone()[0]
+
+    def mergeable(self) -> bool:
+        """Whether changes from Google can be merged in (the calendar has been written before)"""
+        return self.signature() > 0
+
+    @contextmanager
+    def _write(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _bump(self, conn: sqlite3.Connection):
+        conn.execute("INSERT INTO versions VALUES (?, 1) ON CONFLICT (calendar) DO UPDATE SET version = version + 1",
+                     (self.calendar,))
+
+    @contextmanager
+    def transaction(self):
+        with self._write() as conn:
+            changes = conn.total_changes
+            txn = _SQLiteTransaction(conn, self.calendar)
+            yield txn
+            if conn.total_changes != changes:
+                self._bump(conn)
+            txn.signature = self.signature()
+
+    @contextmanager
+    def rewrite(self):
+        """
+        Replace the calendar with the events add(event) is called with. They are
+        staged in short transactions, so other writers aren't held up while Google
+        is paged through, and swapped in at the end in one.
+        """
+        staging = self.calendar + STAGING
+        batch = []
+
+        def flush():
+            if batch:
+                with self._write() as conn:
+                    conn.executemany(UPSERT, batch)
+                batch.clear()
+
+        def add(event: dict):
+            batch.append(_row(staging, event))
+            if len(batch) >= STAGING_BATCH:
+                flush()
+
+        with self._write() as conn:
+            conn.execute("DELETE FROM events WHERE calendar = ?", (staging,))
+        try:
+            yield add
+            flush()
+            with self._write() as conn:
+                conn.execute("DELETE FROM events WHERE calendar = ?", (self.calendar,))
+                conn.execute("UPDATE events SET calendar = ? WHERE calendar = ?", (self.calendar, staging))
+                self._bump(conn)
+        except BaseException:
+            with self._write() as conn:
+                conn.execute("DELETE FROM events WHERE calendar = ?", (staging,))
+            raise
+
+    # ------------------- JSON IMPORT / EXPORT -------------------
+    def import_json(self, filename: str) -> int:
+        """Replace the calendar with the events of a calendar_export.json-style file"""
+        events = json_codec.load_file(filename)
+        with self.rewrite() as add:
+            for e in events:
+                add(e if e.get("id") else e | {"id": uuid.uuid4().hex})
+        return len(events)
+
+    def export_json(self, filename: str, pretty: bool = False) -> int:
+        """Write the calendar as a calendar_export.json-style file (compact unless pretty)"""
+        events = list(self.events())
+        atomic_write_json(filename, events, pretty)
+        return len(events)
+
+
+class _SQLiteTransaction:
+    """Row-level changes to one calendar of an SQLiteStore, inside one transaction"""
+
+    def __init__(self, conn: sqlite3.Connection, calendar: str):
+        self.conn = conn
+        self.calendar = calendar
+        self.signature = None  # the store's signature once the transaction is done
+
+    def put(self, event: dict):
+        self.conn.execute(UPSERT, _row(self.calendar, event))
+
+    def pop(self, calendar_id: str, event_id: str) -> Optional[dict]:
+        row = self.conn.execute(
+            "DELETE FROM events WHERE calendar = ? AND calendar_id = ? AND id = ? RETURNING data",
+            (self.calendar, calendar_id, event_id)
+        ).fetchone()
+        return json_codec.loads(row[0]) if row else None
+
+    def delete(self, event_id: str):
+        """Remove the event with this id, whichever Google calendar it is in"""
+        self.conn.execute("DELETE FROM events WHERE calendar = ? AND id = ?", (self.calendar, event_id))
+
+    def drop_series(self, calendar_id: str, series_id: str):
+        """Remove the exceptions of a recurring series"""
+        self.conn.execute(
+            "DELETE FROM events WHERE calendar = ? AND calendar_id = ? AND recurring = 1"
+            " AND json_extract(data, '$.recurringEventId') = ?", (self.calendar, calendar_id, series_id)
+        )
+
+    def drop_calendar(self, calendar_id: str):
+        self.conn.execute("DELETE FROM events WHERE calendar = ? AND calendar_id = ?", (self.calendar, calendar_id))
+
+    def keep_calendars(self, calendar_ids: Iterable[str]):
+        """Remove every event that isn't in one of these Google calendars"""
+        calendar_ids = list(calendar_ids)
+        self.conn.execute(
+            f"DELETE FROM events WHERE calendar = ? AND calendar_id NOT IN ({','.join('?' * len(calendar_ids))})",
+            (self.calendar, *calendar_ids)
+        )
+
+    def clear(self):
+        self.conn.execute("DELETE FROM events WHERE calendar = ?", (self.calendar,))
+
+
+# -------------------- RUN --------------------
+if __name__ == "__main__":
+    pretty = "--pretty" in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != "--pretty"]
+    if len(args) != 4 or args[0] not in ("import", "export"):
+        sys.exit("usage: python event_store.py import|export <database> <calendar> <json file> [--pretty]")
+    command, database, calendar, filename = args
+    store = SQLiteStore(database, calendar)
+    if command == "import":
+        print(f"✅ Imported {store.import_json(filename)} events from {filename} into {store}")
+    else:
+        print(f"✅ Exported {store.export_json(filename, pretty)} events from {store} to {filename}")
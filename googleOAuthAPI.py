@@ -1,14 +1,15 @@
 from __future__ import print_function
 import datetime
-import json
 import os.path
-from typing import List, Optional
+from typing import Iterator, List, Optional
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 
+from sync_engine import DEFAULT_TIME_MIN, IncrementalSyncEngine
+
 # If modifying these scopes, delete token.json and re-run.
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 
@@ -29,6 +30,7 @@ class GoogleCalendarExporter:
         self.export_file = export_file
         self.creds: Optional[Credentials] = None
         self.service = None
+        self.sync_engine: Optional[IncrementalSyncEngine] = None
 
     def authenticate(self) -> Credentials:
         """Return valid credentials, refreshing or prompting as needed."""
@@ -61,38 +63,47 @@ class GoogleCalendarExporter:
 
     def fetch_events(
         self,
-        calendar_id: str = "primary",
-        time_min: Optional[str] = "2019-01-01T00:00:00Z",
+        calendar_ids: Optional[List[str]] = None,
+        time_min: Optional[str] = DEFAULT_TIME_MIN,
         max_results: int = 2500,
-    ) -> List[dict]:
+    ) -> Iterator[dict]:
+        """
+        Yield events page by page, following nextPageToken, while the sync engine
+        writes them to export_file. calendar_ids defaults to every calendar selected
+        in the user's calendar list; max_results is the page size.
+        """
         service = self.build_service()
         effective_time_min = time_min or datetime.datetime.utcnow().isoformat() + "Z"
 
-        print("Fetching events from Google Calendar...")
-        events_result = (
-            service.events()
-            .list(
-                calendarId=calendar_id,
-                timeMin=effective_time_min,
-                maxResults=max_results,
-                singleEvents=True,
-                orderBy="startTime",
+        # Reuse the engine between calls so its request budget (token bucket) carries over;
+        # events stream into export_file and sync tokens live in its .sync.json either way
+        engine = self.sync_engine
+        if (
+            engine is None
+            or engine.calendar_ids != calendar_ids
+            or engine.time_min != effective_time_min
+        ):
+            engine = IncrementalSyncEngine(
+                export_file=self.export_file,
+                calendar_ids=calendar_ids,
+                time_min=effective_time_min,
+                page_size=max_results,
             )
-            .execute()
-        )
-        return events_result.get("items", [])
+            self.sync_engine = engine
+
+        print("Fetching events from Google Calendar...")
+        yield from engine.iter_sync(service)
 
     def export(
         self,
-        calendar_id: str = "primary",
-        time_min: Optional[str] = "2019-01-01T00:00:00Z",
+        calendar_ids: Optional[List[str]] = None,
+        time_min: Optional[str] = DEFAULT_TIME_MIN,
         max_results: int = 2500,
-    ) -> List[dict]:
-        events = self.fetch_events(calendar_id, time_min, max_results)
-        with open(self.export_file, "w", encoding="utf-8") as export_target:
-            json.dump(events, export_target, indent=2, ensure_ascii=False)
-        print(f"Exported {len(events)} events to {self.export_file}")
-        return events
+    ) -> int:
+        # The sync engine writes export_file as events stream in
+        count = sum(1 for _ in self.fetch_events(calendar_ids, time_min, max_results))
+        print(f"Exported {count} events to {self.export_file}")
+        return count
 
     def run(self) -> None:
         """Kick off authentication and export using default settings."""
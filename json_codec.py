@@ -0,0 +1,60 @@
+"""
+JSON encoding for the calendar files, stores and API responses.
+
+orjson is used when it is installed and the standard library json module
+otherwise; both produce the same documents. Output is compact unless
+pretty=True, which indents by two spaces like the files used to be written.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # optional: pip install orjson
+    orjson = None
+
+_backend = "orjson" if orjson else "json"
+
+
+def backend() -> str:
+    return _backend
+
+
+def set_backend(name: str):
+    """Switch between "orjson" and "json" (e.g. to compare them)"""
+    global _backend
+    if name not in ("orjson", "json"):
+        raise ValueError(f"Unknown JSON backend: {name}")
+    if name == "orjson" and orjson is None:
+        raise ValueError("orjson is not installed")
+    _backend = name
+
+
+def loads(data):
+    """Parse a JSON document from str or UTF-8 bytes"""
+    if _backend == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dump_bytes(obj, pretty: bool = False, default=None) -> bytes:
+    """UTF-8 JSON document (non-ASCII characters are written as is)"""
+    if _backend == "orjson":
+        # Like json: non-str dict keys are converted and datetimes are left to default
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        if default is not None:
+            option |= orjson.OPT_PASSTHROUGH_DATETIME
+        return orjson.dumps(obj, default=default, option=option)
+    return dumps(obj, pretty, default).encode("utf-8")
+
+
+def dumps(obj, pretty: bool = False, default=None) -> str:
+    if _backend == "orjson":
+        return dump_bytes(obj, pretty, default).decode("utf-8")
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False, default=default)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=default)
+
+
+def load_file(filename: str):
+    with open(filename, "rb") as f:
+        return loads(f.read())
@@ -0,0 +1,250 @@
+"""
+Load test: thread-per-request Flask (app.py) against asyncio serving (async_app.py).
+
+Starts stub OpenAI and Google Calendar API servers that answer after a fixed
+latency, then for each serving mode starts the backend in a subprocess (in a
+temporary directory, pointed at the stubs through OPENAI_BASE_URL and
+GOOGLE_CALENDAR_API_ENDPOINT) and fires batches of concurrent POST /ai/chat
+requests at it. Every question is different, so none is answered from the
+answer cache or the local query router and each one waits on the model.
+
+    python load_test.py --concurrency 10 50 200 --llm-latency 1.0
+
+Modes:
+    flask  app.py on Werkzeug with threaded=True (one thread per request)
+    wsgi   every route through Hypercorn's WSGI adapter (a small thread pool)
+    async  async_app.py on Hypercorn (AI and sync routes on the event loop)
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from calendar_benchmark import make_events
+
+MODES = ["flask", "wsgi", "async"]
+
+
+# -------------------- STUB SERVERS --------------------
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 2048
+
+    def __init__(self, handler, latency: float, events: list = None):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.latency = latency
+        self.events = events or []
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class OpenAIStub(StubHandler):
+    """POST /v1/chat/completions: a fixed answer (an empty delta for JSON mode) after the latency"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with self.server.lock:
+            self.server.requests += 1
+        time.sleep(self.server.latency)
+        if "response_format" in body:
+            content = json.dumps({"add": [], "update": [], "delete": []})
+        else:
+            content = "You have a few meetings this week and two free afternoons."
+        self.send_json({
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+
+class GoogleStub(StubHandler):
+    """calendarList.list and events.list: every event on a full listing, nothing new on an incremental one"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        with self.server.lock:
+            self.server.requests += 1
+        time.sleep(self.server.latency)
+        if url.path.endswith("/users/me/calendarList"):
+            self.send_json({"items": [{"id": "primary", "primary": True, "selected": True}]})
+        elif url.path.endswith("/events"):
+            items = [] if "syncToken" in query else self.server.events
+            self.send_json({"items": items, "nextSyncToken": "stub-sync-token"})
+        else:
+            self.send_json({"error": {"code": 404, "message": url.path}}, 404)
+
+
+# -------------------- BACKEND UNDER TEST --------------------
+def serve(mode: str, port: int):
+    """Run the backend in this process (the child started by start_backend)"""
+    if mode == "flask":
+        import app
+        app.app.run(port=port, threaded=True)
+        return
+
+    import asyncio
+    from hypercorn.asyncio import serve as hypercorn_serve
+    from hypercorn.config import Config
+    import async_app
+
+    config = Config()
+    config.bind = [f"127.0.0.1:{port}"]
+    config.accesslog = None
+    config.backlog = 2048
+    if mode == "wsgi":
+        asyncio.run(hypercorn_serve(async_app.flask_asgi, config))
+    else:
+        asyncio.run(hypercorn_serve(async_app.asgi_app, config))
+
+
+def free_port() -> int:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), BaseHTTPRequestHandler)
+    port = server.server_port
+    server.server_close()
+    return port
+
+
+def start_backend(mode: str, directory: str, openai_url: str, google_url: str) -> tuple[subprocess.Popen, str]:
+    port = free_port()
+    env = os.environ | {
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "GOOGLE_CALENDAR_API_ENDPOINT": f"{google_url}/",
+        "SYNC_INTERVAL_SECONDS": "3600",
+        "PYTHONPATH": os.path.dirname(os.path.abspath(__file__)),
+    }
+    log = open(os.path.join(directory, f"{mode}.log"), "w")
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", mode, "--port", str(port)],
+                               cwd=directory, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            urllib.request.urlopen(f"{base_url}/sync/status", timeout=1).read()
+            return process, base_url
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{mode} backend didn't start, see {log.name}")
+
+
+def write_token(directory: str):
+    """A token.json that stays valid, so nothing tries to refresh it against Google"""
+    expiry = (datetime.now(timezone.utc) + timedelta(days=365)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    with open(os.path.join(directory, "token.json"), "w") as f:
+        json.dump({"token": "stub", "refresh_token": "stub", "token_uri": "http://127.0.0.1/token",
+                   "client_id": "stub", "client_secret": "stub", "expiry": expiry}, f)
+
+
+# -------------------- LOAD --------------------
+def chat(base_url: str, n: int) -> float:
+    """One POST /ai/chat; latency in seconds"""
+    body = json.dumps({"message": f"Summarize my week and say where I could fit in training session #{n}",
+                       "mode": "natural"}).encode()
+    request = urllib.request.Request(f"{base_url}/ai/chat", data=body, headers={"Content-Type": "application/json"})
+    t0 = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=600) as response:
+        response.read()
+    return time.perf_counter() - t0
+
+
+def burst(base_url: str, concurrency: int, offset: int) -> dict:
+    """concurrency simultaneous chats"""
+    errors = []
+
+    def one(n):
+        try:
+            return chat(base_url, offset + n)
+        except (OSError, urllib.error.HTTPError) as e:
+            errors.append(e)
+            return None
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(t for t in pool.map(one, range(concurrency)) if t is not None)
+    elapsed = time.perf_counter() - t0
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50": latencies[len(latencies) // 2] if latencies else 0,
+        "p99": latencies[len(latencies) * 99 // 100] if latencies else 0,
+        "errors": len(errors),
+    }
+
+
+def run(modes: list, levels: list, llm_latency: float, google_latency: float, events: int):
+    openai_stub = StubServer(OpenAIStub, llm_latency).start()
+    google_stub = StubServer(GoogleStub, google_latency, make_events(events)).start()
+    print(f"🧪 stub OpenAI {llm_latency:g} s, stub Google {google_latency:g} s, {events} events, {os.cpu_count()} CPU(s)")
+    print(f"{'mode':<6} {'concurrent':>10} {'req/s':>8} {'p50 s':>7} {'p99 s':>7} {'errors':>7} {'LLM calls':>10}")
+
+    for mode in modes:
+        with tempfile.TemporaryDirectory() as directory:
+            write_token(directory)
+            process, base_url = start_backend(mode, directory, openai_stub.url, google_stub.url)
+            try:
+                chat(base_url, 0)  # first sync and AI client
+                offset = 1
+                for level in levels:
+                    llm_calls = openai_stub.requests
+                    result = burst(base_url, level, offset)
+                    offset += level
+                    print(f"{mode:<6} {level:>10} {result['throughput']:>8.1f} {result['p50']:>7.2f} "
+                          f"{result['p99']:>7.2f} {result['errors']:>7} {openai_stub.requests - llm_calls:>10}")
+            finally:
+                process.terminate()
+                process.wait()
+    print(f"Google stub: {google_stub.requests} requests")
+
+
+# -------------------- RUN --------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES, help="serving modes to compare (default: all)")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[10, 50, 200],
+                        help="simultaneous requests per burst (default: 10 50 200)")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="stub OpenAI response time in seconds")
+    parser.add_argument("--google-latency", type=float, default=0.5, help="stub Google response time in seconds")
+    parser.add_argument("--events", type=int, default=2000, help="events the stub Google calendar holds")
+    parser.add_argument("--serve", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+    else:
+        run(args.modes, args.concurrency, args.llm_latency, args.google_latency, args.events)
@@ -1,16 +1,288 @@
-from datetime import datetime, timedelta
-import json
+from array import array
+from collections import deque
+from collections.abc import Sequence
+from datetime import date, datetime, time, timedelta, timezone
+from operator import itemgetter
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import bisect
+import heapq
 import os
+import re
+import sys
+import threading
+import uuid
+
+from dateutil.relativedelta import relativedelta
+from dateutil.rrule import rruleset, rrulestr
+
+from concurrency import ReadWriteLock, atomic_write_json
+import json_codec
+from GoogleCalendarSync import DEFAULT_WORKERS, execute_batch, execute_concurrent, new_report
+
+EPOCH = datetime(1970, 1, 1)
+SECOND = timedelta(seconds=1)
+
+# Small-int codes for the source column
+SOURCES = ("draft", "real")
+SOURCE_CODES = {name: code for code, name in enumerate(SOURCES)}
+DEFAULT_CALENDAR_ID = "primary"
+
+NAIVE = -32768  # offset column value for datetimes without a timezone
+LOCAL_TIMEZONE = ZoneInfo("Europe/Madrid")  # where naive (draft) times are, as they are sent to Google
+MAX_OFFSET = 14 * 3600  # widest UTC offset in use, in seconds
+
+# Open-ended recurring series are expanded at most this far past today (or past the
+# start of a query that begins later), so "every Monday, forever" stays finite
+RECURRENCE_HORIZON = timedelta(days=730)
+# A series' expanded window grows to take in the queries outside it, up to this span,
+# so point queries scattered over the calendar don't each expand the rule again
+MAX_EXPANDED_SPAN = 2 * RECURRENCE_HORIZON
+UNTIL = re.compile(r"UNTIL=([0-9TZ]+)")
+
+CHANGE_LOG_LENGTH = 1024  # versions whose changed event ids are kept for change feeds
+
+
+def to_epoch(dt: datetime) -> int:
+    """Whole seconds since the epoch; naive datetimes are taken at face value (as UTC wall time)"""
+    if dt.tzinfo is None:
+        return (dt - EPOCH) // SECOND
+    return int(dt.timestamp())
+
+
+def utc_offset_minutes(dt: datetime) -> int:
+    """UTC offset of a datetime in minutes, or NAIVE if it has no timezone"""
+    offset = dt.utcoffset()
+    return NAIVE if offset is None else int(offset.total_seconds()) // 60
+
+
+# Caches for iso_epoch; calendars reuse a small set of days, clock times and offsets
+_DAYS: dict[str, int] = {}
+_CLOCKS: dict[str, int] = {}
+_OFFSETS: dict[str, int] = {"": NAIVE}
+
+
+def iso_epoch(value: str) -> tuple[int, int]:
+    """
+    (to_epoch, utc_offset_minutes) of an ISO date or datetime string without
+    building a datetime. The common "YYYY-MM-DD" and "YYYY-MM-DDTHH:MM:SS[Z|±HH:MM]"
+    shapes are sliced and each part is parsed once and cached; anything else
+    goes through datetime.fromisoformat.
+    """
+    day = value[:10]
+    days = _DAYS.get(day)
+    if days is None:
+        try:
+            days = _DAYS[day] = date.fromisoformat(day).toordinal() - EPOCH.toordinal()
+        except ValueError:
+            days = None
+    if days is not None:
+        if len(value) == 10:
+            return days * 86400, NAIVE
+        if len(value) >= 19 and value[10] in "T ":
+            clock, suffix = value[11:19], value[19:]
+            seconds, offset = _CLOCKS.get(clock), _OFFSETS.get(suffix)
+            if seconds is None:
+                try:
+                    t = time.fromisoformat(clock)
+                    if t.tzinfo is None:
+                        seconds = _CLOCKS[clock] = t.hour * 3600 + t.minute * 60 + t.second
+                except ValueError:
+                    pass
+            if offset is None and suffix[:1] in ("Z", "+", "-"):
+                try:
+                    offset = _OFFSETS[suffix] = utc_offset_minutes(datetime.fromisoformat("2000-01-01T00:00:00" + suffix))
+                except ValueError:
+                    pass
+            if seconds is not None and offset is not None:
+                wall = days * 86400 + seconds
+                return (wall, NAIVE) if offset == NAIVE else (wall - offset * 60, offset)
+    dt = datetime.fromisoformat(value)
+    return to_epoch(dt), utc_offset_minutes(dt)
+
+
+_LOCAL_SHIFTS: dict[int, int] = {}  # local hour (epoch hours) -> LOCAL_TIMEZONE UTC offset in seconds
+
+
+def instant(ts: int, offset: int) -> int:
+    """
+    Absolute epoch seconds of a stored time. Naive times are wall-clock times in
+    LOCAL_TIMEZONE, so a naive 10:00 draft and a real 10:00+01:00 event coincide
+    in winter.
+    """
+    if offset != NAIVE:
+        return ts
+    hour = ts // 3600
+    shift = _LOCAL_SHIFTS.get(hour)
+    if shift is None:
+        local = (EPOCH + timedelta(hours=hour)).replace(tzinfo=LOCAL_TIMEZONE)
+        shift = _LOCAL_SHIFTS[hour] = int(local.utcoffset().total_seconds())
+    return ts - shift
+
+
+def to_instant(dt: datetime) -> int:
+    """instant() of a datetime"""
+    return instant(to_epoch(dt), utc_offset_minutes(dt))
+
+
+_TIMEZONES: dict[int, timezone] = {}
+
+
+def from_epoch(ts: int, offset: int) -> datetime:
+    """Inverse of to_epoch/utc_offset_minutes"""
+    if offset == NAIVE:
+        return EPOCH + timedelta(seconds=ts)
+    tz = _TIMEZONES.get(offset)
+    if tz is None:
+        tz = _TIMEZONES[offset] = timezone(timedelta(minutes=offset))
+    return datetime.fromtimestamp(ts, tz)
+
+
+def _at(ts: int, like: datetime) -> datetime:
+    """Epoch seconds back to a datetime in the same clock as `like` (naive or aware)"""
+    if like.tzinfo is None:
+        return EPOCH + timedelta(seconds=ts)
+    return datetime.fromtimestamp(ts, like.tzinfo)
+
+
+def file_signature(filename: str):
+    """(mtime_ns, size) of a file, or None if it doesn't exist; changes whenever the file is rewritten"""
+    try:
+        st = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def wall_clock(ts: int, offset: int) -> int:
+    """Epoch seconds shifted to the event's own local (wall-clock) time"""
+    return ts if offset == NAIVE else ts + offset * 60
+
+
+def sweep_overlaps(intervals) -> list[tuple]:
+    """
+    Sweep over (start, end, calendar, row) tuples sorted by start and return every
+    overlapping pair as identities. Only events that are still running are kept in
+    the active heap, so this costs O(n log n + k) for k overlaps instead of
+    comparing every pair.
+    """
+    overlaps = []
+    active = []  # heap of (end, seq, calendar, row)
+    for seq, (start, end, cal, row) in enumerate(intervals):
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        if active:
+            ref = cal.identity_at(row)
+            for _, _, other_cal, other_row in active:
+                overlaps.append((other_cal.identity_at(other_row), ref))
+        heapq.heappush(active, (end, seq, cal, row))
+    return overlaps
+
+
+def merge_intervals(intervals) -> list[list[int]]:
+    """Sort (start, end) pairs and merge the ones that overlap or touch"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def free_gaps(busy: list, windows: list, min_length: int) -> list[tuple[int, int]]:
+    """
+    Gaps of at least min_length inside the sorted, disjoint windows that no merged
+    busy interval covers. A single forward sweep over both lists.
+    """
+    gaps = []
+    i, n = 0, len(busy)
+    for w0, w1 in windows:
+        while i < n and busy[i][1] <= w0:
+            i += 1
+        cursor = w0
+        j = i
+        while j < n and busy[j][0] < w1:
+            if busy[j][0] - cursor >= min_length:
+                gaps.append((cursor, busy[j][0]))
+            cursor = max(cursor, busy[j][1])
+            j += 1
+        if w1 - cursor >= min_length:
+            gaps.append((cursor, w1))
+    return gaps
+
+
+def _zone(name: str):
+    """ZoneInfo for an IANA name, or None if it is missing or unknown"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        return None
+
+
+def _ical_local(value: str, tzid: str, tz) -> datetime:
+    """An iCalendar DATE or DATE-TIME value as naive wall-clock time in tz (a series' timezone)"""
+    if len(value) == 8:
+        return datetime.strptime(value, "%Y%m%d")
+    if value.endswith("Z"):
+        dt = datetime.strptime(value, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+    else:
+        dt = datetime.strptime(value, "%Y%m%dT%H%M%S")
+        if not (tzid and tz):
+            return dt
+        dt = dt.replace(tzinfo=_zone(tzid) or tz)
+    return dt.astimezone(tz).replace(tzinfo=None) if tz else dt.replace(tzinfo=None)
+
+
+def _now_epoch() -> int:
+    return int(datetime.now(timezone.utc).timestamp())
+
+
+def _rebase_rule(value: str, dtstart: datetime, local_from: datetime) -> tuple[str, datetime]:
+    """
+    An equivalent (RRULE value, DTSTART) whose DTSTART is dtstart moved forward by
+    whole rule periods to at most local_from, so expanding it skips every earlier
+    period. Defaults that RRULE takes from DTSTART are made explicit first. Rules
+    with a COUNT, or sub-daily ones, keep their DTSTART.
+    """
+    parts = dict(part.split("=", 1) for part in value.upper().split(";") if "=" in part)
+    freq, interval = parts.get("FREQ"), int(parts.get("INTERVAL", 1))
+    if "COUNT" in parts or local_from <= dtstart or freq not in ("DAILY", "WEEKLY", "MONTHLY", "YEARLY"):
+        return value, dtstart
+
+    if freq in ("DAILY", "WEEKLY"):
+        step = interval * (7 if freq == "WEEKLY" else 1)
+        return value, dtstart + timedelta(days=(local_from - dtstart).days // step * step)
+
+    if not any(key in parts for key in ("BYDAY", "BYMONTHDAY", "BYYEARDAY", "BYWEEKNO")):
+        value += f";BYMONTHDAY={dtstart.day}"
+        if freq == "YEARLY" and "BYMONTH" not in parts:
+            value += f";BYMONTH={dtstart.month}"
+    months = (local_from.year - dtstart.year) * 12 + local_from.month - dtstart.month
+    step = interval * (12 if freq == "YEARLY" else 1)
+    periods = max(months // step - 1, 0)  # one period early, as day-of-month clamps vary
+    return value, dtstart + relativedelta(months=periods * step)
 
 
 class Event:
     """Represents a calendar event"""
 
-    def __init__(self, title: str, start: datetime, end: datetime, source: str = "draft"):
+    __slots__ = ("title", "start", "end", "source", "id", "calendar_id")
+
+    def __init__(self, title: str, start: datetime, end: datetime, source: str = "draft", id: str = None,
+                 calendar_id: str = DEFAULT_CALENDAR_ID):
         self.title = title
         self.start = start
         self.end = end
         self.source = source
+        # Google Calendar event id, or a generated one for drafts. uuid4 hex is valid
+        # base32hex, so a draft keeps the same id once it is inserted into Google.
+        self.id = id or uuid.uuid4().hex
+        self.calendar_id = calendar_id  # Google calendar the event lives in (drafts go to primary)
+
+    def identity(self) -> tuple:
+        """Stable (title, source, id) reference used in overlap results"""
+        return (self.title, self.source, self.id)
 
     @staticmethod
     def from_dict(data: dict, source: str = "draft"):
@@ -22,11 +294,15 @@ class Event:
             start=datetime.fromisoformat(start),
             end=datetime.fromisoformat(end),
             source=source,
+            id=data.get("id"),
+            calendar_id=data.get("calendarId", DEFAULT_CALENDAR_ID),
         )
 
     def to_dict(self) -> dict:
         """Convert event to Google Calendar API format"""
         return {
+            "id": self.id,
+            "calendarId": self.calendar_id,
             "summary": self.title,
             "start": {"dateTime": self.start.isoformat(), "timeZone": "Europe/Madrid"},
             "end": {"dateTime": self.end.isoformat(), "timeZone": "Europe/Madrid"},
@@ -34,83 +310,919 @@ class Event:
         }
 
 
+class RecurringSeries:
+    """
+    A recurring event kept as its master (RRULE/EXRULE/RDATE/EXDATE lines) instead of
+    one stored row per instance.
+
+    Instances are generated in wall-clock time in the master's timezone, so a 10:00
+    meeting stays at 10:00 across DST changes, and only for the window a query asks
+    for: each rule's DTSTART is moved forward by whole periods to just before the
+    window (unless it has a COUNT). The last window is kept as epoch columns like
+    Calendar's. Instances replaced or cancelled by exceptions are listed in skip.
+    """
+
+    def __init__(self, data: dict):
+        self.data = data
+        self.id = data["id"]
+        self.title = sys.intern(data.get("summary", "Untitled"))
+        self.calendar_id = sys.intern(data.get("calendarId", DEFAULT_CALENDAR_ID))
+
+        start = datetime.fromisoformat(data["start"].get("dateTime") or data["start"].get("date"))
+        end = datetime.fromisoformat(data["end"].get("dateTime") or data["end"].get("date"))
+        self.tz = None  # None for floating / all-day series
+        if start.tzinfo is not None:
+            self.tz = _zone(data["start"].get("timeZone")) or start.tzinfo
+            start, end = start.astimezone(self.tz), end.astimezone(self.tz)
+        self.local_start = start.replace(tzinfo=None)
+        self.wall_duration = end.replace(tzinfo=None) - self.local_start
+        self.max_duration = self.wall_duration // SECOND + 3600  # a DST change can add an hour
+
+        self.lines = [line.strip() for line in data.get("recurrence", [])]
+        self.skip: set[int] = set()
+        self._window = None  # (first, last) epochs fully covered, then the instance columns
+        self._rules(self.local_start)  # raises ValueError for rules dateutil can't parse
+
+    def _rules(self, local_from: datetime) -> rruleset:
+        """The recurrence lines as one rule set over naive local times, complete from local_from on"""
+        dtstart = self.local_start
+        rules = rruleset()
+        rules.rdate(dtstart)  # the master's own start is always the first instance
+        for line in self.lines:
+            head, _, value = line.partition(":")
+            name, *params = head.upper().split(";")
+            params = dict(param.split("=", 1) for param in params if "=" in param)
+            if name in ("RRULE", "EXRULE"):
+                # UNTIL is usually UTC; the rule runs on local times, so convert it
+                value = UNTIL.sub(lambda m: "UNTIL=" + _ical_local(m.group(1), None, self.tz).strftime("%Y%m%dT%H%M%S"), value)
+                value, rule_start = _rebase_rule(value, dtstart, local_from)
+                rule = rrulestr(value, dtstart=rule_start)
+                rules.rrule(rule) if name == "RRULE" else rules.exrule(rule)
+            elif name in ("RDATE", "EXDATE"):
+                for v in value.split(","):
+                    dt = _ical_local(v.strip(), params.get("TZID"), self.tz)
+                    if len(v.strip()) == 8:
+                        dt = datetime.combine(dt.date(), dtstart.time())
+                    rules.rdate(dt) if name == "RDATE" else rules.exdate(dt)
+        return rules
+
+    def _expand(self, t0: int, t1: int) -> tuple:
+        """Generate the instances around [t0, t1), widened to whole months so nearby queries reuse them"""
+        series_first = to_epoch(self.local_start) - MAX_OFFSET
+        first = max(t0 - self.max_duration - MAX_OFFSET, series_first)
+        local0 = (EPOCH + timedelta(seconds=first)).replace(day=1, hour=0, minute=0, second=0)
+        local1 = EPOCH + timedelta(seconds=t1 + MAX_OFFSET)
+        local1 = (local1.replace(day=28) + timedelta(days=4)).replace(day=1, hour=0, minute=0, second=0)
+
+        starts, ends = array("q"), array("q")
+        start_offsets, end_offsets = array("h"), array("h")
+        tz, duration = self.tz, self.wall_duration
+        for local in self._rules(local0):
+            if local >= local1:
+                break
+            if local < local0:
+                continue
+            end = local + duration
+            if tz is None:
+                starts.append((local - EPOCH) // SECOND)
+                ends.append((end - EPOCH) // SECOND)
+                start_offsets.append(NAIVE)
+                end_offsets.append(NAIVE)
+            else:
+                start_offset, end_offset = tz.utcoffset(local) // SECOND, tz.utcoffset(end) // SECOND
+                starts.append((local - EPOCH) // SECOND - start_offset)
+                ends.append((end - EPOCH) // SECOND - end_offset)
+                start_offsets.append(start_offset // 60)
+                end_offsets.append(end_offset // 60)
+
+        # Nothing starts before the series does, so expanding from its start covers every earlier query
+        covered_from = -sys.maxsize if first == series_first else to_epoch(local0) + MAX_OFFSET + self.max_duration
+        covered = (covered_from, to_epoch(local1) - MAX_OFFSET)
+        return covered, starts, ends, start_offsets, end_offsets
+
+    def between(self, t0: int, t1: int) -> tuple[tuple, list[int]]:
+        """The instance columns around [t0, t1) and the indexes of the (not skipped) ones overlapping it"""
+        window = self._window
+        if window is None or not (window[0][0] <= t0 and t1 <= window[0][1]):
+            lo, hi = t0, t1
+            if window is not None:
+                union = min(t0, window[0][0]), max(t1, window[0][1])
+                if union[1] - max(union[0], to_epoch(self.local_start)) <= MAX_EXPANDED_SPAN // SECOND:
+                    lo, hi = union
+            window = self._window = self._expand(lo, hi)
+        _, starts, ends, _, _ = window
+        skip = self.skip
+        lo = bisect.bisect_left(starts, t0 - self.max_duration)
+        hi = bisect.bisect_left(starts, t1)
+        return window, [k for k in range(lo, hi) if ends[k] > t0 and starts[k] not in skip]
+
+    def instance_id(self, start: int) -> str:
+        """Google's id for an instance: master id plus its original start (UTC, or the date for all-day)"""
+        if self.tz is None:
+            return f"{self.id}_{EPOCH + timedelta(seconds=start):%Y%m%d}"
+        return f"{self.id}_{EPOCH + timedelta(seconds=start):%Y%m%dT%H%M%SZ}"
+
+
+class EventList(Sequence):
+    """
+    Read-only sequence over a calendar's rows, materializing Event views on access.
+    Besides row numbers it may hold (series, start, end, start offset, end offset)
+    refs to recurring instances.
+    """
+
+    def __init__(self, calendar: "Calendar", rows=None):
+        self._calendar = calendar
+        self._rows = rows
+
+    def __len__(self):
+        return len(self._calendar._ids) if self._rows is None else len(self._rows)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            rows = range(len(self._calendar._ids)) if self._rows is None else self._rows
+            return EventList(self._calendar, rows[i])
+        row = i if self._rows is None else self._rows[i]
+        return self._calendar.event_at(row)
+
+    def __iter__(self):
+        rows = range(len(self._calendar._ids)) if self._rows is None else self._rows
+        event_at = self._calendar.event_at
+        for row in rows:
+            yield event_at(row)
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def to_dicts(self) -> list[dict]:
+        """Google Calendar API dicts built straight from the columns, without Event objects"""
+        rows = range(len(self._calendar._ids)) if self._rows is None else self._rows
+        return [self._calendar.dict_at(row) for row in rows]
+
+
 class Calendar:
-    """A calendar containing a collection of events"""
-    def __init__(self, name: str, source: str = "draft"):
+    """
+    A calendar containing a collection of events.
+
+    Events are stored column-wise rather than as a list of objects: int64 epoch
+    seconds for start/end, int16 UTC offsets, interned titles and Google calendar
+    ids, and a small-int source code. Event objects are only built on access.
+
+    Recurring events are kept as RecurringSeries (one master each, not one row per
+    instance); range and overlap queries expand them for the window they cover.
+    Exceptions that move an instance are ordinary rows; cancelled ones only skip
+    the instance.
+
+    Mutations take self.lock for writing. Query results (EventList) are views
+    over the rows, so hold self.lock.read() while using them from a thread
+    that shares the calendar. Every mutation bumps self.version, logs the ids
+    it touched (see changes_since) and notifies self.changed.
+    """
+    COLUMNS = ("_ids", "_titles", "_calendar_ids", "_starts", "_ends", "_start_offsets", "_end_offsets", "_sources",
+               "_sorted_starts", "_sorted_rows", "_max_duration", "_by_id", "_by_key",
+               "_series", "_overrides", "_cancelled")
+
+    def __init__(self, name: str, source: str = "draft", lock: ReadWriteLock = None,
+                 changed: threading.Condition = None):
         self.name = name
         self.source = source
-        self.events: list[Event] = []
+        self.lock = lock or ReadWriteLock()
+        self.changed = changed or threading.Condition()
+        self.version = 0  # bumped on every change, used to invalidate cached results
+        self._changes = deque(maxlen=CHANGE_LOG_LENGTH)  # (version, ids changed by it, or None)
+        self._overlaps_cache = None
+        self._busy_cache = {}  # wall-clock flag -> (version, merged starts, merged ends)
+        self._loaded_from = (None, None)  # (filename, file_signature) the columns match
+        self._reset_columns()
+
+    def _reset_columns(self):
+        self._ids: list[str] = []
+        self._titles: list[str] = []
+        self._calendar_ids: list[str] = []
+        self._starts = array("q")
+        self._ends = array("q")
+        self._start_offsets = array("h")
+        self._end_offsets = array("h")
+        self._sources = array("b")
+
+        # Interval index: rows sorted by start time, next to their start keys for
+        # bisect. Together with the longest duration seen this bounds every interval
+        # query to the events that could possibly overlap it.
+        self._sorted_starts = array("q")
+        self._sorted_rows = array("l")
+        self._max_duration = 0
+
+        # Hash indexes: event id -> row, and (title, start, naive) -> row for dedup
+        self._by_id: dict[str, int] = {}
+        self._by_key: dict[tuple, int] = {}
+
+        # Recurring series by master id; exception rows' (recurringEventId, originalStartTime)
+        # by event id, and cancelled instances as stored, so files round-trip
+        self._series: dict[str, RecurringSeries] = {}
+        self._overrides: dict[str, tuple] = {}
+        self._cancelled: dict[str, dict] = {}
 
+    def __len__(self):
+        """Stored events: single events and exceptions, plus one per recurring series"""
+        return len(self._ids) + len(self._series)
+
+    @property
+    def events(self) -> EventList:
+        """All single events (and exceptions), in insertion order; recurring series are expanded by range queries"""
+        return EventList(self)
+
+    # ------------------- ROW ACCESS -------------------
+    def event_at(self, row) -> Event:
+        if type(row) is tuple:
+            series, start, end, start_offset, end_offset = row
+            return Event(
+                series.title,
+                from_epoch(start, start_offset),
+                from_epoch(end, end_offset),
+                source=self.source,
+                id=series.instance_id(start),
+                calendar_id=series.calendar_id,
+            )
+        return Event(
+            self._titles[row],
+            from_epoch(self._starts[row], self._start_offsets[row]),
+            from_epoch(self._ends[row], self._end_offsets[row]),
+            source=SOURCES[self._sources[row]],
+            id=self._ids[row],
+            calendar_id=self._calendar_ids[row],
+        )
+
+    def identity_at(self, row) -> tuple:
+        if type(row) is tuple:
+            return (row[0].title, self.source, row[0].instance_id(row[1]))
+        return (self._titles[row], SOURCES[self._sources[row]], self._ids[row])
+
+    def dict_at(self, row) -> dict:
+        """Same output as event_at(row).to_dict(), plus the series an instance or exception belongs to"""
+        if type(row) is tuple:
+            series, start, end, start_offset, end_offset = row
+            start_iso = from_epoch(start, start_offset).isoformat()
+            return {
+                "id": series.instance_id(start),
+                "calendarId": series.calendar_id,
+                "summary": series.title,
+                "start": {"dateTime": start_iso, "timeZone": "Europe/Madrid"},
+                "end": {"dateTime": from_epoch(end, end_offset).isoformat(), "timeZone": "Europe/Madrid"},
+                "draft": self.source == "draft",
+                "recurringEventId": series.id,
+                "originalStartTime": {"dateTime": start_iso},
+            }
+        override = self._overrides.get(self._ids[row])
+        if override is not None:
+            return self._dict_at(row) | {"recurringEventId": override[0], "originalStartTime": override[1]}
+        return self._dict_at(row)
+
+    def _dict_at(self, row: int) -> dict:
+        return {
+            "id": self._ids[row],
+            "calendarId": self._calendar_ids[row],
+            "summary": self._titles[row],
+            "start": {"dateTime": from_epoch(self._starts[row], self._start_offsets[row]).isoformat(), "timeZone": "Europe/Madrid"},
+            "end": {"dateTime": from_epoch(self._ends[row], self._end_offsets[row]).isoformat(), "timeZone": "Europe/Madrid"},
+            "draft": self._sources[row] == SOURCE_CODES["draft"]
+        }
+
+    def calendar_of(self, event_id: str) -> str | None:
+        """Google calendar an event, series or series instance (master id + '_' + start) lives in"""
+        with self.lock.read():
+            row = self._by_id.get(event_id)
+            if row is not None:
+                return self._calendar_ids[row]
+            series = self._series.get(event_id) or self._series.get(event_id.rpartition("_")[0])
+            return series.calendar_id if series is not None else None
+
+    def to_dicts(self) -> list[dict]:
+        """
+        All stored events as Google Calendar API dicts, built straight from the
+        columns: single events, recurring masters and cancelled instances
+        """
+        return self.events.to_dicts() + [series.data for series in self._series.values()] + list(self._cancelled.values())
+
+    def api_dicts(self) -> list[dict]:
+        """
+        Every event as clients draw it, in start order: single events and exceptions,
+        plus recurring instances within RECURRENCE_HORIZON of today (the ones
+        find_overlaps sees). No recurring masters or cancelled instances, unlike to_dicts.
+        """
+        return EventList(self, self._merge_instances(list(self._sorted_rows), self._recent_instances())).to_dicts()
+
+    def _append_row(self, event_id: str, title: str, start: datetime, end: datetime,
+                    calendar_id: str = DEFAULT_CALENDAR_ID) -> int:
+        row = len(self._ids)
+        self._ids.append(event_id)
+        self._titles.append(sys.intern(title))
+        self._calendar_ids.append(sys.intern(calendar_id))
+        self._starts.append(to_epoch(start))
+        self._ends.append(to_epoch(end))
+        self._start_offsets.append(utc_offset_minutes(start))
+        self._end_offsets.append(utc_offset_minutes(end))
+        self._sources.append(SOURCE_CODES[self.source])
+
+        self._by_id[event_id] = row
+        self._by_key.setdefault(self._key_at(row), row)
+        return row
+
+    def _append_rows(self, rows: list):
+        """Bulk _append_row of (id, calendar id, title, start, end, start offset, end offset) column tuples"""
+        if not rows:
+            return
+        first = len(self._ids)
+        ids, calendar_ids, titles, starts, ends, start_offsets, end_offsets = zip(*rows)
+        self._ids.extend(ids)
+        self._titles.extend(map(sys.intern, titles))
+        self._calendar_ids.extend(map(sys.intern, calendar_ids))
+        self._starts.extend(starts)
+        self._ends.extend(ends)
+        self._start_offsets.extend(start_offsets)
+        self._end_offsets.extend(end_offsets)
+        self._sources.extend([SOURCE_CODES[self.source]] * len(rows))
+
+        rows = range(first, len(self._ids))
+        self._by_id.update(zip(ids, rows))
+        by_key = self._by_key
+        for key, row in zip(zip(self._titles[first:], starts, [o == NAIVE for o in start_offsets]), rows):
+            by_key.setdefault(key, row)  # same keys as _key_at
+
+    def _remove_row(self, row: int):
+        """
+        Remove a row by moving the last row into its place, so every column stays
+        dense. The sorted and hash indexes are patched for both rows.
+        """
+        self._unindex_row(row)
+        if self._by_id.get(self._ids[row]) == row:
+            del self._by_id[self._ids[row]]
+        self._drop_key(row)
+
+        last = len(self._ids) - 1
+        if row != last:
+            self._unindex_row(last)
+            self._drop_key(last)
+            for column in (self._ids, self._titles, self._calendar_ids, self._starts, self._ends,
+                           self._start_offsets, self._end_offsets, self._sources):
+                column[row] = column[last]
+            if self._by_id.get(self._ids[row]) == last:
+                self._by_id[self._ids[row]] = row
+            self._by_key.setdefault(self._key_at(row), row)
+            self._index_row(row)
+
+        for column in (self._ids, self._titles, self._calendar_ids, self._starts, self._ends,
+                       self._start_offsets, self._end_offsets, self._sources):
+            column.pop()
+
+    # ------------------- HASH INDEXES -------------------
+    def _key_at(self, row: int) -> tuple:
+        """Dedup key: same title and same start instant (naive and aware never match, like datetime ==)"""
+        return (self._titles[row], self._starts[row], self._start_offsets[row] == NAIVE)
+
+    def _drop_key(self, row: int):
+        """Remove a row from the dedup index, handing the key to another row with the same key if any"""
+        key = self._key_at(row)
+        if self._by_key.get(key) != row:
+            return
+        del self._by_key[key]
+        lo = bisect.bisect_left(self._sorted_starts, self._starts[row])
+        hi = bisect.bisect_right(self._sorted_starts, self._starts[row])
+        for other in self._sorted_rows[lo:hi]:
+            if other != row and self._key_at(other) == key:
+                self._by_key[key] = other
+                return
+
+    def get(self, event_id: str):
+        """Event with this id, or None (constant time)"""
+        row = self._by_id.get(event_id)
+        return None if row is None else self.event_at(row)
+
+    def contains(self, title: str, start: datetime) -> bool:
+        """Whether an event with this title starts at this time (constant time)"""
+        return (title, to_epoch(start), start.tzinfo is None) in self._by_key
+
+    # ------------------- INTERVAL INDEX -------------------
+    def _unindex_row(self, row: int):
+        start = self._starts[row]
+        pos = bisect.bisect_left(self._sorted_starts, start)
+        while self._sorted_rows[pos] != row:
+            pos += 1
+        del self._sorted_starts[pos]
+        del self._sorted_rows[pos]
+
+    def _index_row(self, row: int):
+        start = self._starts[row]
+        pos = bisect.bisect_right(self._sorted_starts, start)
+        self._sorted_starts.insert(pos, start)
+        self._sorted_rows.insert(pos, row)
+        self._max_duration = max(self._max_duration, self._ends[row] - start)
+
+    def _rebuild_index(self):
+        """Sort every row at once (used after bulk loads instead of n inserts)"""
+        starts = self._starts
+        rows = sorted(range(len(starts)), key=starts.__getitem__)
+        self._sorted_rows = array("l", rows)
+        self._sorted_starts = array("q", (starts[r] for r in rows))
+        ends = self._ends
+        self._max_duration = max((ends[r] - starts[r] for r in rows), default=0)
+
+    def _span(self, start: int, end: int) -> tuple[int, int]:
+        """Positions in the sorted index of rows that start early enough to overlap [start, end)"""
+        lo = bisect.bisect_left(self._sorted_starts, start - self._max_duration)
+        hi = bisect.bisect_left(self._sorted_starts, end)
+        return lo, hi
+
+    def _intervals(self):
+        """
+        (start, end, calendar, row) tuples in start order, as consumed by sweep_overlaps,
+        with instant() bounds so naive and timezone-aware events are compared correctly.
+        Recurring instances are merged in for RECURRENCE_HORIZON either side of today.
+        """
+        rows, ends = self._sorted_rows, self._ends
+        starts = self._sorted_starts
+        start_offsets, end_offsets = self._start_offsets, self._end_offsets
+        if NAIVE in start_offsets or NAIVE in end_offsets:
+            # Localizing naive rows can reorder them, so these are sorted again
+            intervals = sorted(((instant(starts[i], start_offsets[row]), instant(ends[row], end_offsets[row]), self, row)
+                                for i, row in enumerate(rows)), key=itemgetter(0))
+        else:
+            intervals = ((starts[i], ends[row], self, row) for i, row in enumerate(rows))
+        if not self._series:
+            return intervals
+        instances = sorted(((instant(ref[1], ref[3]), instant(ref[2], ref[4]), self, ref)
+                            for ref in self._recent_instances()), key=itemgetter(0))
+        return heapq.merge(intervals, instances, key=itemgetter(0))
+
+    def _bounds(self, row) -> tuple[int, int]:
+        """(start, end) epoch seconds of a row or recurring instance ref"""
+        if type(row) is tuple:
+            return row[1], row[2]
+        return self._starts[row], self._ends[row]
+
+    def _instant_bounds(self, row) -> tuple[int, int]:
+        """(start, end) instant() seconds of a row or recurring instance ref"""
+        if type(row) is tuple:
+            return instant(row[1], row[3]), instant(row[2], row[4])
+        return instant(self._starts[row], self._start_offsets[row]), instant(self._ends[row], self._end_offsets[row])
+
+    def _overlapping_instants(self, t0: int, t1: int) -> list:
+        """Rows and recurring instances overlapping [t0, t1) in instant() seconds, in instant start order"""
+        # Stored naive times are within MAX_OFFSET of their instants
+        refs = []
+        for row in self._overlapping_refs(t0 - MAX_OFFSET, t1 + MAX_OFFSET):
+            start, end = self._instant_bounds(row)
+            if start < t1 and end > t0:
+                refs.append((start, end, row))
+        refs.sort(key=itemgetter(0))
+        return refs
+
+    def _instances_between(self, t0: int, t1: int) -> list[tuple]:
+        """Refs of the recurring instances overlapping [t0, t1), sorted by start"""
+        t1 = min(t1, max(t0, _now_epoch()) + RECURRENCE_HORIZON // SECOND)
+        refs = []
+        for series in self._series.values():
+            (_, starts, ends, start_offsets, end_offsets), found = series.between(t0, t1)
+            refs += [(series, starts[k], ends[k], start_offsets[k], end_offsets[k]) for k in found]
+        refs.sort(key=itemgetter(1))
+        return refs
+
+    def _recent_instances(self) -> list[tuple]:
+        """Recurring instances within RECURRENCE_HORIZON of today, for whole-calendar overlaps and busy time"""
+        now, horizon = _now_epoch(), RECURRENCE_HORIZON // SECOND
+        return self._instances_between(now - horizon, now + horizon)
+
+    def _merge_instances(self, rows: list[int], refs: list[tuple]) -> list:
+        """Rows and instance refs (both in start order) as one list in start order"""
+        if not refs:
+            return rows
+        return list(heapq.merge(rows, refs, key=lambda row: self._bounds(row)[0]))
+
+    def _overlapping_rows(self, start: int, end: int) -> list[int]:
+        lo, hi = self._span(start, end)
+        ends = self._ends
+        return [row for row in self._sorted_rows[lo:hi] if ends[row] > start]
+
+    def _overlapping_refs(self, start: int, end: int) -> list:
+        """Rows and recurring instances overlapping [start, end), in start order"""
+        rows = self._overlapping_rows(start, end)
+        if not self._series:
+            return rows
+        return self._merge_instances(rows, self._instances_between(start, end))
+
+    def _rows_between(self, start: datetime, end: datetime, recurring: bool = True) -> list:
+        """
+        Rows (and recurring instance refs, unless recurring is False) overlapping
+        [start, end), in start order. Naive bounds are compared with each event's
+        local wall-clock time, so a date query matches what a user sees in that
+        event's own timezone.
+        """
+        t0, t1 = to_epoch(start), to_epoch(end)
+        if start.tzinfo is not None:
+            return self._overlapping_refs(t0, t1) if recurring else self._overlapping_rows(t0, t1)
+
+        lo, hi = self._span(t0 - MAX_OFFSET, t1 + MAX_OFFSET)
+        starts, ends = self._starts, self._ends
+        start_offsets, end_offsets = self._start_offsets, self._end_offsets
+        rows = []
+        for row in self._sorted_rows[lo:hi]:
+            wall_start = wall_clock(starts[row], start_offsets[row])
+            wall_end = wall_clock(ends[row], end_offsets[row])
+            if wall_start < t1 and (wall_end > t0 or wall_start >= t0):
+                rows.append(row)
+        if not (recurring and self._series):
+            return rows
+
+        refs = []
+        for ref in self._instances_between(t0 - MAX_OFFSET, t1 + MAX_OFFSET):
+            wall_start = wall_clock(ref[1], ref[3])
+            wall_end = wall_clock(ref[2], ref[4])
+            if wall_start < t1 and (wall_end > t0 or wall_start >= t0):
+                refs.append(ref)
+        return self._merge_instances(rows, refs)
+
+    def _busy_index(self, wall: bool) -> tuple[array, array]:
+        """
+        Every event merged into sorted, disjoint busy intervals (start and end columns),
+        in wall-clock seconds or instant() seconds (naive events in LOCAL_TIMEZONE).
+        Built once per calendar version.
+        """
+        cached = self._busy_cache.get(wall)
+        if cached is not None and cached[0] == self.version:
+            return cached[1], cached[2]
+
+        clock = wall_clock if wall else instant
+        spans = [(clock(s, so), clock(e, eo)) for s, e, so, eo
+                 in zip(self._starts, self._ends, self._start_offsets, self._end_offsets)]
+        spans += [(clock(ref[1], ref[3]), clock(ref[2], ref[4])) for ref in self._recent_instances()]
+        merged = merge_intervals((s, e) for s, e in spans if e > s)
+        starts, ends = array("q", [s for s, _ in merged]), array("q", [e for _, e in merged])
+        self._busy_cache[wall] = (self.version, starts, ends)
+        return starts, ends
+
+    def _busy_between(self, t0: int, t1: int, wall: bool) -> list[tuple[int, int]]:
+        """Merged busy intervals overlapping [t0, t1): two bisects into the busy index"""
+        starts, ends = self._busy_index(wall)
+        lo = bisect.bisect_right(ends, t0)
+        hi = bisect.bisect_left(starts, t1)
+        return list(zip(starts[lo:hi], ends[lo:hi]))
+
+    def events_between(self, start: datetime, end: datetime, recurring: bool = True) -> EventList:
+        """
+        Events overlapping [start, end), sorted by start time. recurring=False leaves
+        out the instances of recurring series (see series_between).
+        """
+        return EventList(self, self._rows_between(start, end, recurring))
+
+    def series_between(self, start: datetime, end: datetime) -> list[dict]:
+        """
+        Every recurring series with instances in [start, end), once: master id, summary
+        and recurrence lines, its first instance there, how many instances fall there,
+        and the original starts in range that exceptions moved or cancelled.
+        """
+        found = {}  # series id -> [series, first instance ref, count]
+        for ref in self._rows_between(start, end):
+            if type(ref) is tuple:
+                entry = found.setdefault(ref[0].id, [ref[0], ref, 0])
+                entry[2] += 1
+
+        t0, t1 = to_epoch(start), to_epoch(end)
+        series_list = []
+        for series, first, count in found.values():
+            skipped = sorted(s for s in series.skip if t0 - MAX_OFFSET <= s < t1 + MAX_OFFSET)
+            series_list.append({
+                "id": series.id,
+                "summary": series.title,
+                "recurrence": series.lines,
+                "start": from_epoch(first[1], first[3]).isoformat(),
+                "end": from_epoch(first[2], first[4]).isoformat(),
+                "count": count,
+                "skipped": [(datetime.fromtimestamp(s, series.tz) if series.tz else EPOCH + timedelta(seconds=s)).isoformat()
+                            for s in skipped],
+                "calendarId": series.calendar_id,
+            })
+        return series_list
+
+    def events_on(self, day: date) -> EventList:
+        """Events on a single (local) calendar day, sorted by start time"""
+        midnight = datetime(day.year, day.month, day.day)
+        return self.events_between(midnight, midnight + timedelta(days=1))
+
+    def sorted_events(self) -> EventList:
+        """All events sorted by start time"""
+        return EventList(self, self._sorted_rows)
+
+    def overlapping(self, start: datetime, end: datetime) -> EventList:
+        """Events that overlap the interval [start, end)"""
+        return EventList(self, self._overlapping_refs(to_epoch(start), to_epoch(end)))
+
+    # ------------------- EVENTS -------------------
     def add_event(self, event: Event):
-        event.source = self.source
-        self.events.append(event)
+        with self.lock.write():
+            event.source = self.source
+            row = self._append_row(event.id, event.title, event.start, event.end, event.calendar_id)
+            self._index_row(row)
+            self._loaded_from = (None, None)
+            self._bump((event.id,))
+
+    def remove_event(self, event_id: str) -> bool:
+        """Remove the event with this id; returns False if there is none"""
+        with self.lock.write():
+            row = self._by_id.get(event_id)
+            if row is None:
+                return False
+            self._remove_row(row)
+            # A removed exception changes how its series expands, which can't be listed by id
+            self._bump(None if self._overrides.pop(event_id, None) else (event_id,))
+            self._loaded_from = (None, None)
+            return True
+
+    def upsert_event(self, event: Event):
+        """Add an event, replacing any existing event with the same id"""
+        with self.lock.write():
+            if event.id in self._by_id:
+                self._remove_row(self._by_id[event.id])
+            self.add_event(event)
 
     def load_from_file(self, filename: str):
-        """Load events from a JSON file"""
-        self.events = []
+        """
+        Load events from a JSON file. The file is parsed into a separate calendar
+        and its columns are swapped in under the write lock, so readers see either
+        the old events or the new ones, never a half-loaded calendar.
+        """
+        signature = file_signature(filename)
         try:
-            with open(filename, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                for e in data:
-                    ev = Event.from_dict(e, source=self.source)
-                    if ev:
-                        self.add_event(ev)
+            data = json_codec.load_file(filename)
         except FileNotFoundError:
-            pass
+            data = []
+        self._load([], data, (filename, signature))
+
+    def load_from_store(self, store):
+        """
+        Load events from an event_store backend, the same way as load_from_file. The
+        store is read under the read lock, so no save is halfway (columns changed,
+        store not yet), and read again if the calendar changed before the swap.
+        """
+        while True:
+            with self.lock.read():
+                version = self.version
+                signature = store.signature()
+                rows, data = store.read()
+            if self._load(rows, data, (store.key, signature), version):
+                return
+
+    def _load(self, rows: list, data: list[dict], loaded_from: tuple, version: int = None) -> bool:
+        """
+        Swap in a calendar built from plain (id, calendar id, title, start, end,
+        start offset, end offset) rows, which need no parsing, and event dicts.
+        With version, nothing is swapped in (False) if the calendar has changed since.
+        """
+        staged = Calendar(self.name, self.source)
+        rows = list(rows)
+
+        skips = []  # (master id, original start) of every exception
+        for e in data:
+            if e.get("recurrence"):
+                try:
+                    staged._series[e["id"]] = RecurringSeries(e)
+                    continue
+                except ValueError as err:
+                    print(f"⚠️ Can't expand recurrence of {e.get('summary')!r} ({err}); keeping its first instance only")
+            original = e.get("originalStartTime")
+            if e.get("recurringEventId") and original:
+                skips.append((e["recurringEventId"], original.get("dateTime") or original.get("date")))
+                if e.get("status") == "cancelled":
+                    staged._cancelled[e["id"]] = e
+                    continue
+                staged._overrides[e["id"]] = (e["recurringEventId"], original)
+            elif e.get("status") == "cancelled":
+                continue
+
+            # Straight to epoch/offset columns; no datetime objects are built
+            start, start_offset = iso_epoch(e["start"].get("dateTime") or e["start"].get("date"))
+            end, end_offset = iso_epoch(e["end"].get("dateTime") or e["end"].get("date"))
+            rows.append((e.get("id") or uuid.uuid4().hex, e.get("calendarId", DEFAULT_CALENDAR_ID),
+                         e.get("summary", "Untitled"), start, end, start_offset, end_offset))
+        staged._append_rows(rows)
+        staged._rebuild_index()
+        for master_id, original in skips:
+            series = staged._series.get(master_id)
+            if series is not None:
+                series.skip.add(to_epoch(datetime.fromisoformat(original)))
+
+        with self.lock.write():
+            if version is not None and self.version != version:
+                return False
+            changed = self._changed_ids(staged)
+            for column in self.COLUMNS:
+                setattr(self, column, getattr(staged, column))
+            self._loaded_from = loaded_from
+            self._bump(changed)
+        return True
 
-    def save_to_file(self, filename: str):
-        """Save current events to a JSON file"""
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump([ev.to_dict() for ev in self.events], f, indent=2, ensure_ascii=False)
+    def _changed_ids(self, other: "Calendar"):
+        """Ids of the rows that differ from other's, or None if its recurring series or exceptions differ"""
+        if (self._overrides != other._overrides or self._cancelled != other._cancelled
+                or {k: s.data for k, s in self._series.items()} != {k: s.data for k, s in other._series.items()}):
+            return None
+        return {event_id for event_id, _ in self._row_items() ^ other._row_items()}
+
+    def _row_items(self):
+        columns = (self._titles, self._calendar_ids, self._starts, self._ends, self._start_offsets, self._end_offsets)
+        return dict(zip(self._ids, zip(*columns))).items()
+
+    def save_to_file(self, filename: str, pretty: bool = False):
+        """Save current events to a JSON file (temp file + rename); compact unless pretty"""
+        with self.lock.read():
+            events = self.to_dicts()
+            version = self.version
+        atomic_write_json(filename, events, pretty)
+        if self.version == version:  # otherwise the file is already behind the columns
+            self._loaded_from = (filename, file_signature(filename))
+
+    def save_to_store(self, store, event_ids=None):
+        """
+        Write events to an event_store backend: all of them, replacing what it holds,
+        or only the events with these ids (upserted, or deleted if no longer here)
+        """
+        with self.lock.read():
+            version = self.version
+            if event_ids is None:
+                events = self.to_dicts()
+            else:
+                changes = [(event_id, self.dict_at(self._by_id[event_id]) if event_id in self._by_id else None)
+                           for event_id in event_ids]
+        with store.transaction() as txn:
+            # After a partial write the store matches the columns only if nobody else
+            # (e.g. a Google sync) wrote it since it was last loaded or saved
+            in_sync = event_ids is None or self._loaded_from == (store.key, store.signature())
+            if event_ids is None:
+                txn.clear()
+                for e in events:
+                    txn.put(e)
+            else:
+                for event_id, e in changes:
+                    if e is None:
+                        txn.delete(event_id)
+                    else:
+                        txn.put(e)
+        if in_sync and self.version == version:  # otherwise the store is already behind the columns
+            self._loaded_from = (store.key, txn.signature)
+
+    def load_if_changed(self, source) -> bool:
+        """Reload from a JSON file or event_store backend only if it changed since it was last loaded or saved"""
+        if isinstance(source, str):
+            if self._loaded_from == (source, file_signature(source)):
+                return False
+            self.load_from_file(source)
+        else:
+            if self._loaded_from == (source.key, source.signature()):
+                return False
+            self.load_from_store(source)
+        return True
 
     def clear(self):
-        self.events = []
+        with self.lock.write():
+            changed = None if self._series or self._overrides else set(self._ids)
+            self._reset_columns()
+            self._loaded_from = (None, None)
+            self._bump(changed)
 
-    def find_overlaps(self) -> list[tuple]:
-        """Find overlapping events inside this calendar"""
-        parsed = [(e.title, e.start, e.end, e.source) for e in self.events]
-        parsed.sort(key=lambda x: x[1])  # sort by start time
+    # ------------------- CHANGE LOG -------------------
+    def _bump(self, changed_ids):
+        """New version (under the write lock); changed_ids is None when the change can't be listed by event"""
+        self.version += 1
+        self._changes.append((self.version, changed_ids))
+        with self.changed:
+            self.changed.notify_all()
 
-        overlaps = []
-        for i in range(len(parsed)):
-            for j in range(i + 1, len(parsed)):
-                t1, s1, e1, src1 = parsed[i]
-                t2, s2, e2, src2 = parsed[j]
-                if s2 < e1:
-                    overlaps.append(((t1, src1), (t2, src2)))
-                else:
+    def changes_since(self, version: int) -> tuple[list[dict], list[str]] | None:
+        """
+        (dicts of the events added or changed, ids of the events removed) since an
+        earlier self.version. None if the log doesn't reach back that far or a change
+        in between can't be listed by event (recurring series, clear, reload of
+        exceptions): reload everything instead.
+        """
+        with self.lock.read():
+            if version == self.version:
+                return [], []
+            if version > self.version or not self._changes or self._changes[0][0] > version + 1:
+                return None
+            ids = set()
+            for logged, changed in reversed(self._changes):
+                if logged <= version:
                     break
-        return overlaps
+                if changed is None:
+                    return None
+                ids.update(changed)
+            upserted = [self.dict_at(self._by_id[event_id]) for event_id in ids if event_id in self._by_id]
+            return upserted, [event_id for event_id in ids if event_id not in self._by_id]
 
+    # ------------------- CONFLICTS -------------------
+    def find_overlaps(self) -> list[tuple]:
+        """Find overlapping events inside this calendar (cached until the calendar changes)"""
+        with self.lock.read():
+            cache = self._overlaps_cache
+            if cache is None or cache[0] != self.version:
+                cache = self._overlaps_cache = (self.version, sweep_overlaps(self._intervals()))
+            return cache[1]
 
-    def find_overlaps_between(cal1, cal2) -> list[tuple]:
-        """Find overlaps between two calendars"""
-        parsed = [(e.title, e.start, e.end, e.source) for e in cal1.events + cal2.events]
-        parsed.sort(key=lambda x: x[1])
+    def conflicts_for(self, event: Event) -> EventList:
+        """Events in this calendar (recurring instances included) that overlap a single (possibly new) event"""
+        ids = self._ids
+        refs = self._overlapping_instants(to_instant(event.start), to_instant(event.end))
+        return EventList(self, [row for _, _, row in refs if type(row) is tuple or ids[row] != event.id])
 
+    def find_overlaps_in(self, start: datetime, end: datetime) -> list[tuple]:
+        """Overlapping pairs whose shared time falls inside [start, end)"""
+        t0, t1 = to_instant(start), to_instant(end)
         overlaps = []
-        for i in range(len(parsed)):
-            for j in range(i + 1, len(parsed)):
-                t1, s1, e1, src1 = parsed[i]
-                t2, s2, e2, src2 = parsed[j]
-                if s2 < e1:
-                    overlaps.append(((t1, src1), (t2, src2)))
-                else:
-                    break
+        active = []  # heap of (end, seq, row)
+        for seq, (row_start, row_end, row) in enumerate(self._overlapping_instants(t0, t1)):
+            while active and active[0][0] <= max(row_start, t0):
+                heapq.heappop(active)
+            if active:
+                ref = self.identity_at(row)
+                for _, _, other in active:
+                    overlaps.append((self.identity_at(other), ref))
+            heapq.heappush(active, (row_end, seq, row))
         return overlaps
 
+    def find_overlaps_between(*calendars) -> list[tuple]:
+        """Find overlaps across any number of calendars"""
+        # Every index is already sorted, so one k-way merge feeds a single sweep
+        merged = heapq.merge(*(cal._intervals() for cal in calendars), key=lambda iv: iv[0])
+        return sweep_overlaps(merged)
+
 
 class CalendarManager:
-    """Manages a real calendar and a draft calendar"""
+    """
+    Manages a real calendar and a draft calendar.
+
+    Both calendars share self.lock, so a read sees them in a consistent state and
+    a write (e.g. moving drafts into the real calendar) is atomic across both.
+    They also share self.changed, which is notified on every change to either.
+
+    With a database, both are kept in it (event_store.SQLiteStore) and every change
+    writes only the rows it touches; the JSON files are imported on its first use.
+    Without one, the real calendar is the JSON file real_file and drafts are an
+    append-only journal next to draft_file (draft_calendar.jsonl), which imports
+    draft_file once if it exists. Either way draft_file is not written again.
+    """
+
+    def __init__(self, draft_file="draft_calendar.json", real_file="calendar_export.json", database: str = None):
+        from event_store import DraftJournal, JsonFileStore, SQLiteStore  # event_store builds on this module
 
-    def __init__(self, draft_file="draft_calendar.json", real_file="calendar_export.json"):
         self.draft_file = draft_file
         self.real_file = real_file
-        self.draft_calendar = Calendar("Draft", source="draft")
-        self.real_calendar = Calendar("Real", source="real")
+        if database:
+            self.draft_store = SQLiteStore(database, "draft")
+            self.real_store = SQLiteStore(database, "real")
+            for store, filename in ((self.draft_store, draft_file), (self.real_store, real_file)):
+                if not store.signature() and os.path.exists(filename):
+                    print(f"📥 Importing {filename} into {store} ({store.import_json(filename)} events)")
+        else:
+            self.draft_store = DraftJournal(os.path.splitext(draft_file)[0] + ".jsonl")
+            self.real_store = JsonFileStore(real_file)
+            if not os.path.exists(self.draft_store.filename) and os.path.exists(draft_file):
+                print(f"📥 Importing {draft_file} into {self.draft_store} ({self.draft_store.import_json(draft_file)} drafts)")
+
+        self.lock = ReadWriteLock()
+        self.changed = threading.Condition()
+        self.draft_calendar = Calendar("Draft", source="draft", lock=self.lock, changed=self.changed)
+        self.real_calendar = Calendar("Real", source="real", lock=self.lock, changed=self.changed)
+        self._overlaps_cache = None
+        self._pushing: set[str] = set()  # ids of drafts an apply_changes call is sending to Google
+
+        self.draft_calendar.load_from_store(self.draft_store)
+        self.real_calendar.load_from_store(self.real_store)
 
-        self.draft_calendar.load_from_file(self.draft_file)
-        self.real_calendar.load_from_file(self.real_file)
+    @property
+    def version(self) -> tuple[int, int]:
+        """(real, draft) calendar versions; changes whenever either calendar changes"""
+        return self.real_calendar.version, self.draft_calendar.version
+
+    def changes_since(self, version: tuple[int, int], max_changes: int = 500) -> dict | None:
+        """
+        What changed in both calendars since an earlier self.version:
+        {"version", "upserted": [event dicts], "removed": [{"id", "draft"}]}. None
+        if either calendar can't list its changes (see Calendar.changes_since) or
+        there are more than max_changes, when reloading is cheaper.
+        """
+        with self.lock.read():
+            changes = {"version": self.version, "upserted": [], "removed": []}
+            for calendar, since in zip((self.real_calendar, self.draft_calendar), version):
+                listed = calendar.changes_since(since)
+                if listed is None:
+                    return None
+                changes["upserted"] += listed[0]
+                changes["removed"] += [{"id": event_id, "draft": calendar.source == "draft"} for event_id in listed[1]]
+        if len(changes["upserted"]) + len(changes["removed"]) > max_changes:
+            return None
+        return changes
+
+    def wait_for_change(self, version: tuple[int, int], timeout: float = None) -> bool:
+        """Block until self.version differs from version; False on timeout"""
+        with self.changed:
+            return self.changed.wait_for(lambda: self.version != version, timeout)
 
     def create_event(self, date: str, start_time: str, duration_minutes: int, title: str) -> Event:
         start = datetime.strptime(f"{date} {start_time}", "%Y-%m-%d %H:%M")
@@ -123,35 +1235,154 @@ class CalendarManager:
         return Event(f"[TASK] {title}", start, end, source="draft")
 
     def save_draft_event(self, event: Event):
-        self.draft_calendar.add_event(event)
-        self.draft_calendar.save_to_file(self.draft_file)
-
-    def apply_changes(self, service):
-        """Push draft events into Google Calendar API"""
-        for ev in self.draft_calendar.events:
-            # check if event already exists in real_calendar by title+start
-            exists = any(
-                e.title == ev.title and e.start == ev.start for e in self.real_calendar.events
-            )
-            if not exists and service:
+        self.save_draft_events([event])
+
+    def save_draft_events(self, events: list[Event]):
+        """Add drafts and persist them with one store write, however many there are"""
+        with self.lock.write():
+            for event in events:
+                self.draft_calendar.add_event(event)
+            self.draft_calendar.save_to_store(self.draft_store, [event.id for event in events])
+
+    def discard_drafts(self):
+        """Delete all drafts, in memory and in the draft store"""
+        with self.lock.write():
+            self.draft_calendar.clear()
+            self.draft_calendar.save_to_store(self.draft_store)
+
+    def apply_changes(self, service, mode: str = "batch", workers: int = DEFAULT_WORKERS) -> dict:
+        """
+        Push draft events into Google Calendar API and return the report. mode is
+        "batch" (batch endpoint) or "concurrent" (throttled thread pool with retries;
+        safe to retry because every draft carries its own event id). Drafts that
+        failed to insert stay in the draft calendar, as do drafts added while the
+        push was running. No lock is held during the Google round trips; drafts a
+        concurrent call is already pushing are left to it.
+        """
+        pending = []
+        with self.lock.write():
+            drafts = [ev for ev in self.draft_calendar.events if ev.id not in self._pushing]
+            self._pushing.update(ev.id for ev in drafts)
+            for ev in drafts:
+                # check if event already exists in real_calendar by title+start (hash lookup)
+                if not self.real_calendar.contains(ev.title, ev.start):
+                    pending.append(ev)
+        try:
+            return self._push_drafts(service, drafts, pending, mode, workers)
+        finally:
+            with self.lock.write():
+                self._pushing.difference_update(ev.id for ev in drafts)
+
+    def _push_drafts(self, service, drafts: list, pending: list, mode: str, workers: int) -> dict:
+        """Insert pending into Google, then move the drafts that made it into the real calendar"""
+        report = new_report()
+        if service and pending:
+            events = service.events()
+            operations = []
+            for ev in pending:
                 event_body = {
+                    "id": ev.id,
                     "summary": ev.title,
                     "start": {"dateTime": ev.start.isoformat(), "timeZone": "Europe/Madrid"},
                     "end": {"dateTime": ev.end.isoformat(), "timeZone": "Europe/Madrid"},
                 }
-                service.events().insert(calendarId="primary", body=event_body).execute() 
+                operations.append(("add", ev.id, events.insert(calendarId=ev.calendar_id, body=event_body)))
+            if mode == "concurrent":
+                execute_concurrent(operations, workers, report=report)
+            else:
+                execute_batch(service, operations, report)
 
-                ev.source = "real"
-                self.real_calendar.add_event(ev)
+            failed = {err["target"] for err in report["errors"]}
+        else:
+            failed = set()
 
-        # clear draft after pushing
-        self.draft_calendar.clear()
-        if os.path.exists(self.draft_file):
-            os.remove(self.draft_file)
+        with self.lock.write():
+            added = [ev.id for ev in pending if ev.id not in failed]
+            for ev in pending:
+                if ev.id not in failed:
+                    self.real_calendar.add_event(ev)
 
-        # save calendar
-        self.real_calendar.save_to_file(self.real_file)
+            # clear pushed drafts, keeping the ones Google rejected so they can be retried
+            removed = [ev.id for ev in drafts if ev.id not in failed]
+            for event_id in removed:
+                self.draft_calendar.remove_event(event_id)
+
+            # save only the events that moved
+            self.draft_calendar.save_to_store(self.draft_store, removed)
+            self.real_calendar.save_to_store(self.real_store, added)
+        return report
 
     def find_all_overlaps(self) -> list[tuple]:
-        """Find overlaps between real and draft calendars"""
-        return Calendar.find_overlaps_between(self.real_calendar, self.draft_calendar)
\ No newline at end of file
+        """Find overlaps between real and draft calendars (cached until either changes)"""
+        with self.lock.read():
+            key = (id(self.real_calendar), self.real_calendar.version,
+                   id(self.draft_calendar), self.draft_calendar.version)
+            cache = self._overlaps_cache
+            if cache is None or cache[0] != key:
+                cache = self._overlaps_cache = (key, Calendar.find_overlaps_between(self.real_calendar, self.draft_calendar))
+            return cache[1]
+
+    def conflicts_for(self, event: Event) -> list[Event]:
+        """Real and draft events that overlap a single event, via one point query per calendar"""
+        with self.lock.read():
+            return list(self.real_calendar.conflicts_for(event)) + list(self.draft_calendar.conflicts_for(event))
+
+    # ------------------- FREE / BUSY -------------------
+    def busy_intervals(self, start: datetime, end: datetime, buffer: timedelta = timedelta(0)) -> list[list[int]]:
+        """
+        Merged busy [start, end) epoch-second intervals of the real and draft calendars
+        around [start, end), each widened by buffer on both sides. Naive bounds work
+        in each event's wall-clock time, aware ones in absolute time (naive drafts
+        taken in LOCAL_TIMEZONE, as in conflicts_for).
+        """
+        pad = buffer // SECOND
+        wall = start.tzinfo is None  # naive bounds work in wall-clock time, as in events_between
+        t0, t1 = to_epoch(start) - pad, to_epoch(end) + pad
+        with self.lock.read():
+            real = self.real_calendar._busy_between(t0, t1, wall)
+            draft = self.draft_calendar._busy_between(t0, t1, wall)
+        if not pad and not (real and draft):
+            return [list(span) for span in real or draft]  # already merged
+        return merge_intervals((s - pad, e + pad) for s, e in heapq.merge(real, draft))
+
+    def free_busy(self, start: datetime, end: datetime) -> list[tuple[datetime, datetime]]:
+        """Busy periods of the real and draft calendars inside [start, end)"""
+        t0, t1 = to_epoch(start), to_epoch(end)
+        return [(_at(max(s, t0), start), _at(min(e, t1), start)) for s, e in self.busy_intervals(start, end)]
+
+    def find_free_slots(
+        self,
+        duration: timedelta,
+        window: tuple[datetime, datetime],
+        working_hours: tuple[time, time] = None,
+        buffer: timedelta = timedelta(0),
+        limit: int = None,
+    ) -> list[tuple[datetime, datetime]]:
+        """
+        Free periods of at least duration inside window, and inside working_hours on
+        each day if given, that keep buffer clear of every real and draft event.
+        Returned (start, end) datetimes use the window's clock (naive or aware).
+        """
+        start, end = window
+        t0, t1 = to_epoch(start), to_epoch(end)
+        if working_hours:
+            day_start, day_end = working_hours
+            if day_end <= day_start:
+                raise ValueError("working_hours must end after they start")
+            windows = []
+            day = start.date()
+            while day <= end.date():
+                w0 = to_epoch(datetime.combine(day, day_start, tzinfo=start.tzinfo))
+                w1 = to_epoch(datetime.combine(day, day_end, tzinfo=start.tzinfo))
+                if w1 > t0 and w0 < t1:
+                    windows.append((max(w0, t0), min(w1, t1)))
+                day += timedelta(days=1)
+        else:
+            windows = [(t0, t1)]
+
+        gaps = free_gaps(self.busy_intervals(start, end, buffer), windows, duration // SECOND)
+        return [(_at(s, start), _at(e, start)) for s, e in gaps[:limit]]
+
+    def conflicting_ids(self) -> set:
+        """Ids of every real or draft event involved in at least one overlap"""
+        return {ref[2] for pair in self.find_all_overlaps() for ref in pair}
\ No newline at end of file
@@ -1,7 +1,45 @@
+import asyncio
+import contextvars
 import json
 import datetime
 import os
-from openai import OpenAI
+import threading
+import time
+from openai import AsyncOpenAI, OpenAI
+
+from answer_cache import AnswerCache, answer_key
+from concurrency import atomic_write_json
+import json_codec
+from delta_stream import DeltaStreamParser
+from oop_events import Calendar
+from prompt_context import CalendarContextBuilder
+from query_router import QueryRouter
+
+MODEL = "gpt-5-mini"
+
+# How the context lists recurring events (see CalendarContextBuilder)
+SERIES_HINT = (
+    "Recurring events are listed once each in 'series' (values in the order of 'series_columns'): "
+    "the RRULE, the first occurrence inside the windows and how many occur there; "
+    "occurrences whose original start is in 'skipped' were moved (they appear in 'rows') or cancelled. "
+)
+
+
+def stream_text(stream):
+    """Text pieces from a streamed chat completion"""
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def astream_text(stream):
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def _aiter_one(value):
+    yield value
 
 
 class CalendarAIClient:
@@ -9,59 +47,275 @@ class CalendarAIClient:
     Handles AI-based calendar editing and analysis using OpenAI.
     """
 
-    def __init__(self, api_key: str, calendar_file: str = "calendar_export.json", delta_file: str = "calendar_delta.json"):
+    def __init__(
+        self,
+        api_key: str,
+        calendar_file: str = "calendar_export.json",
+        delta_file: str = "calendar_delta.json",
+        days_back: int = 7,
+        days_ahead: int = 30,
+        calendar: Calendar = None,
+        model: str = MODEL,
+        answer_cache_file: str = "ai_answer_cache.json",
+    ):
+        # One long-lived OpenAI client, so its HTTP connection pool is reused across requests.
+        # The async twin serves the asyncio app (async_app.py) without holding a thread per call.
         self.client = OpenAI(api_key=api_key)
+        self.async_client = AsyncOpenAI(api_key=api_key)
         self.calendar_file = calendar_file
         self.delta_file = delta_file
+        self.model = model
+
+        # Summaries keyed on (context sent, normalized question, model), so a repeated
+        # question is answered from disk/memory until the events it saw change
+        self.answer_cache = AnswerCache(answer_cache_file)
+
+        # Use an indexed Calendar so prompts only carry a time window of it. A caller
+        # can share one it already keeps up to date; otherwise it is loaded from
+        # calendar_file and reloaded only when that file changes.
+        self._owns_calendar = calendar is None
+        if calendar is None:
+            calendar = Calendar("Real", source="real")
+            calendar.load_from_file(self.calendar_file)
+        self.calendar = calendar
+        self.context_builder = CalendarContextBuilder(self.calendar, days_back=days_back, days_ahead=days_ahead)
+        self.last_context_stats: dict = {}
+        self._full_calendar_tokens = (None, 0)  # (calendar version, tokens)
 
-        # Load calendar JSON file
-        with open(self.calendar_file, "r", encoding="utf-8") as f:
-            self.calendar_json = json.load(f)
+        # Questions the router can answer from the calendar indexes never reach the model.
+        # Every summary records which path served it ("local:<intent>", "cache" or "llm").
+        self.router = QueryRouter(self.calendar)
+        self.route_stats: dict[str, dict] = {}
+        self._route_lock = threading.Lock()
+        # Per thread and per asyncio task, so concurrent async requests don't see each other's route
+        self._last_route = contextvars.ContextVar(f"last_route_{id(self)}", default=None)
 
-        # Convert to string for model input
-        self.json_str = json.dumps(self.calendar_json, indent=2)
+    def refresh(self) -> bool:
+        """Reload the calendar if calendar_file changed; cached contexts follow the calendar version"""
+        if not self._owns_calendar:
+            return False
+        return self.calendar.load_if_changed(self.calendar_file)
+
+    @property
+    def full_calendar_tokens(self) -> int:
+        """
+        What sending the whole calendar pretty-printed used to cost, for the savings
+        report (about 4 bytes per token). Measured from the calendar the prompts are
+        built from, whatever store it was loaded from, once per calendar version.
+        """
+        with self.calendar.lock.read():
+            version = self.calendar.version
+            if self._full_calendar_tokens[0] != version:
+                size = len(json_codec.dump_bytes(self.calendar.to_dicts(), pretty=True))
+                self._full_calendar_tokens = (version, size // 4)
+            return self._full_calendar_tokens[1]
+
+    # ------------------- ROUTING -------------------
+    @property
+    def last_route(self) -> dict:
+        """Path and latency of the last summary answered in this thread or asyncio task"""
+        return self._last_route.get()
+
+    def _record_route(self, path: str, started: float):
+        latency_ms = (time.perf_counter() - started) * 1000
+        with self._route_lock:
+            stats = self.route_stats.setdefault(path, {"requests": 0, "total_ms": 0.0})
+            stats["requests"] += 1
+            stats["total_ms"] += latency_ms
+        self._last_route.set({"path": path, "latency_ms": round(latency_ms, 2)})
+        print(f"🧭 Answered via {path} in {latency_ms:.1f} ms")
+
+    def route_report(self) -> dict:
+        """Requests and average latency per path"""
+        with self._route_lock:
+            return {
+                path: {"requests": s["requests"], "avg_ms": round(s["total_ms"] / s["requests"], 2)}
+                for path, s in self.route_stats.items()
+            }
+
+    def _fast_answer(self, user_request: str, started: float) -> tuple:
+        """
+        (context, cache key, answer) for a summary request. answer is set when the
+        router or the answer cache served it; otherwise the caller asks the model.
+        """
+        context, key, answer, path = self._lookup_answer(user_request)
+        if path is not None:
+            self._record_route(path, started)
+        return context, key, answer
+
+    def _lookup_answer(self, user_request: str) -> tuple:
+        """
+        _fast_answer without recording the route: (context, cache key, answer, route
+        path or None). Blocking (refresh, calendar locks, the answer cache), so async
+        callers run it in a thread and record the route in their own task.
+        """
+        self.refresh()
+        routed = self.router.answer(user_request)
+        if routed is not None:
+            intent, answer = routed
+            return None, None, answer, f"local:{intent}"
+
+        context, key, cached = self._cached_answer(user_request)
+        return context, key, cached, None if cached is None else "cache"
+
+    # ------------------- PROMPT CONTEXT -------------------
+    def build_context(self, user_request: str) -> str:
+        """Return the calendar context for a request and record how many tokens it saved"""
+        self.refresh()
+        context, stats = self.context_builder.build(user_request)
+        stats = dict(stats)
+        stats["full_calendar_tokens"] = self.full_calendar_tokens
+        stats["tokens_saved"] = stats["full_calendar_tokens"] - stats["context_tokens"]
+        self.last_context_stats = stats
+
+        print(
+            f"🧮 Context: {stats['events_sent']}/{stats['events_total']} events, "
+            f"~{stats['context_tokens']} tokens (saved ~{stats['tokens_saved']} vs full calendar)"
+        )
+        return context
 
     # ------------------- SUMMARIZE / INSIGHT PROMPT -------------------
-    def summarize_calendar(self, user_request: str) -> str:
+    def summarize_calendar(self, user_request: str, stream: bool = False):
         """
         Ask the AI to analyze or summarize the calendar and optionally respond to a user query.
-        Returns a natural language text answer.
+        Returns a natural language text answer, or with stream=True an iterator over
+        the pieces of the answer as the model produces them. Questions the QueryRouter
+        recognizes are answered locally, and repeated questions over unchanged events
+        come from self.answer_cache.
         """
+        started = time.perf_counter()
+        context, key, answer = self._fast_answer(user_request, started)
+        if answer is not None:
+            return iter([answer]) if stream else answer
+
+        if stream:
+            return self._stream_summary(user_request, context, key, started)
+        response = self.client.chat.completions.create(**self._summary_request(user_request, context))
+        answer = self._summary_answer(response.choices[0].message.content, key)
+        self._record_route("llm", started)
+        return answer
+
+    async def asummarize_calendar(self, user_request: str, stream: bool = False):
+        """
+        Async version of summarize_calendar (stream=True gives an async iterator). The
+        blocking parts (calendar reads, context, answer cache) run in a worker thread,
+        so the event loop keeps serving other requests meanwhile.
+        """
+        started = time.perf_counter()
+        context, key, answer, path = await asyncio.to_thread(self._lookup_answer, user_request)
+        if answer is not None:
+            self._record_route(path, started)
+            return _aiter_one(answer) if stream else answer
+
+        if stream:
+            return self._astream_summary(user_request, context, key, started)
+        response = await self.async_client.chat.completions.create(**self._summary_request(user_request, context))
+        answer = await asyncio.to_thread(self._summary_answer, response.choices[0].message.content, key)
+        self._record_route("llm", started)
+        return answer
+
+    def _cached_answer(self, user_request: str) -> tuple:
+        """(context, cache key, cached answer or None) for a summary request"""
+        context = self.build_context(user_request)
+        key = answer_key(self.model, context, user_request)
+        cached = self.answer_cache.get(key)
+        if cached is not None:
+            print(f"⚡ Cached answer (hit rate {self.answer_cache.stats()['hit_rate']:.0%})")
+        return context, key, cached
+
+    def _stream_summary(self, user_request: str, context: str, key: str, started: float):
+        pieces = []
+        request = self._summary_request(user_request, context)
+        for text in stream_text(self.client.chat.completions.create(**request, stream=True)):
+            pieces.append(text)
+            yield text
+        self._summary_answer("".join(pieces), key)
+        self._record_route("llm", started)
+
+    async def _astream_summary(self, user_request: str, context: str, key: str, started: float):
+        pieces = []
+        request = self._summary_request(user_request, context)
+        async for text in astream_text(await self.async_client.chat.completions.create(**request, stream=True)):
+            pieces.append(text)
+            yield text
+        await asyncio.to_thread(self._summary_answer, "".join(pieces), key)
+        self._record_route("llm", started)
+
+    def _summary_request(self, user_request: str, context: str) -> dict:
         now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-        response = self.client.chat.completions.create(
-            model="gpt-5-mini",
+        return dict(
+            model=self.model,
             messages=[
                 {
                     "role": "system",
                     "content": (
                         "You are a calendar assistant. You read the calendar JSON and respond "
                         "to user questions or summarize insights about upcoming events. "
+                        "The calendar JSON only lists events inside its 'windows' date ranges, "
+                        "as 'rows' of values in the order given by 'columns'. "
+                        f"{SERIES_HINT}"
                         "Be concise and helpful. "
                         f"The current local date and time is {now}."
                     ),
                 },
                 {
                     "role": "user",
-                    "content": f"Here is my calendar JSON:\n```json\n{self.json_str}\n```\n\n{user_request}",
+                    "content": f"Here is my calendar JSON:\n```json\n{context}\n```\n\n{user_request}",
                 },
             ],
         )
 
-        answer = response.choices[0].message.content.strip()
+    def _summary_answer(self, content: str, key: str) -> str:
+        answer = content.strip()
         print("Summary / Answer:")
         print(answer)
+        self.answer_cache.put(key, answer)
         return answer
 
     # ------------------- JSON DELTA PROMPT -------------------
-    def generate_calendar_delta(self, user_request: str) -> dict:
+    def generate_calendar_delta(self, user_request: str, stream: bool = False):
         """
         Ask the AI to generate a JSON delta (add/update/delete).
         Returns the parsed JSON dict and saves it to delta_file.
+
+        With stream=True, returns an iterator of (section, item) pairs, one for each
+        add/update/delete item as soon as it has been received, followed by
+        ("delta", full delta) once the delta has been saved.
         """
+        if stream:
+            return self._stream_delta(user_request)
+        response = self.client.chat.completions.create(**self._delta_request(user_request))
+        return self._save_delta(response.choices[0].message.content)
+
+    async def agenerate_calendar_delta(self, user_request: str, stream: bool = False):
+        """Async version of generate_calendar_delta (stream=True gives an async iterator)"""
+        if stream:
+            return self._astream_delta(user_request)
+        request = await asyncio.to_thread(self._delta_request, user_request)  # builds the context under the calendar lock
+        response = await self.async_client.chat.completions.create(**request)
+        return await asyncio.to_thread(self._save_delta, response.choices[0].message.content)
+
+    def _stream_delta(self, user_request: str):
+        parser = DeltaStreamParser()
+        for text in stream_text(self.client.chat.completions.create(**self._delta_request(user_request), stream=True)):
+            yield from parser.feed(text)
+        yield "delta", self._save_delta(parser.buffer)
+
+    async def _astream_delta(self, user_request: str):
+        parser = DeltaStreamParser()
+        request = await asyncio.to_thread(self._delta_request, user_request)
+        stream = await self.async_client.chat.completions.create(**request, stream=True)
+        async for text in astream_text(stream):
+            for pair in parser.feed(text):
+                yield pair
+        yield "delta", await asyncio.to_thread(self._save_delta, parser.buffer)
+
+    def _delta_request(self, user_request: str) -> dict:
         now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        response = self.client.chat.completions.create(
-            model="gpt-5-mini",
+        context = self.build_context(user_request)
+        return dict(
+            model=self.model,
             messages=[
                 {
                     "role": "system",
@@ -74,13 +328,19 @@ class CalendarAIClient:
                         "For add: create new events with summary, start, end (no id needed). "
                         "For update: include the existing 'id' field plus the fields to change. "
                         "For delete: use ONLY the 'id' field values from the calendar JSON. "
+                        "The calendar JSON only lists events inside its 'windows' date ranges, "
+                        "as 'rows' of values in the order given by 'columns' (id, summary, start, end, calendarId). "
+                        "For update: keep the event's 'calendarId'; for add, omit it unless the user names a calendar. "
+                        f"{SERIES_HINT}"
+                        "To delete or update one occurrence of a series, use the series id + '_' + the occurrence's "
+                        "start in UTC as YYYYMMDDTHHMMSSZ (YYYYMMDD for all-day); the series id alone means every occurrence. "
                         "Never include explanations or text. "
                         f"The current local date and time is {now}."
                     ),
                 },
                 {
                     "role": "user",
-                    "content": f"Here is my calendar JSON:\n```json\n{self.json_str}\n```\n\nUser request: {user_request}\n\nIMPORTANT: For deletions, use the exact 'id' values from the JSON above.",
+                    "content": f"Here is my calendar JSON:\n```json\n{context}\n```\n\nUser request: {user_request}\n\nIMPORTANT: For deletions, use the exact 'id' values from the JSON above.",
                 },
             ],
             response_format={
@@ -111,7 +371,8 @@ class CalendarAIClient:
                                             "required": ["dateTime"]
                                         },
                                         "description": {"type": "string"},
-                                        "location": {"type": "string"}
+                                        "location": {"type": "string"},
+                                        "calendarId": {"type": "string"}
                                     },
                                     "required": ["summary", "start", "end"]
                                 }
@@ -126,7 +387,8 @@ class CalendarAIClient:
                                         "start": {"type": "object"},
                                         "end": {"type": "object"},
                                         "description": {"type": "string"},
-                                        "location": {"type": "string"}
+                                        "location": {"type": "string"},
+                                        "calendarId": {"type": "string"}
                                     },
                                     "required": ["id"]
                                 }
@@ -143,13 +405,13 @@ class CalendarAIClient:
             },
         )
 
-        delta_json = json.loads(response.choices[0].message.content)
+    def _save_delta(self, content: str) -> dict:
+        delta_json = json.loads(content)
         print("Delta JSON received.")
         print(json.dumps(delta_json, indent=2, ensure_ascii=False))
 
         # Save to file for GoogleCalendarSync to apply
-        with open(self.delta_file, "w", encoding="utf-8") as f:
-            json.dump(delta_json, f, indent=2, ensure_ascii=False)
+        atomic_write_json(self.delta_file, delta_json, pretty=True)
 
         return delta_json
 
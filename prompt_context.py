@@ -0,0 +1,172 @@
+import json
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from oop_events import Calendar
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+MONTHS = ["january", "february", "march", "april", "may", "june", "july",
+          "august", "september", "october", "november", "december"]
+
+CONTEXT_COLUMNS = ["id", "summary", "start", "end", "calendarId"]
+SERIES_COLUMNS = ["id", "summary", "recurrence", "first_start", "first_end", "count", "skipped", "calendarId"]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for OpenAI models (about 4 characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def _week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _month_range(year: int, month: int) -> tuple[date, date]:
+    start = date(year, month, 1)
+    end = date(year + (month == 12), month % 12 + 1, 1)
+    return start, end
+
+
+def mentioned_ranges(text: str, today: date) -> list[tuple[date, date]]:
+    """
+    Date ranges [start, end) referred to in a user request, e.g. "tomorrow",
+    "next week", "friday", "march 5", "2025-10-01" or "last month".
+    """
+    t = text.lower()
+    ranges = []
+
+    for m in re.finditer(r"\b(\d{4})-(\d{2})-(\d{2})\b", t):
+        try:
+            day = date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+        except ValueError:
+            continue
+        ranges.append((day, day + timedelta(days=1)))
+
+    for word, offset in (("yesterday", -1), ("today", 0), ("tonight", 0), ("tomorrow", 1)):
+        if re.search(rf"\b{word}\b", t):
+            day = today + timedelta(days=offset)
+            ranges.append((day, day + timedelta(days=1)))
+
+    for prefix, offset in (("last", -1), ("this", 0), ("next", 1)):
+        if re.search(rf"\b{prefix} week\b", t):
+            start = _week_start(today) + timedelta(weeks=offset)
+            ranges.append((start, start + timedelta(weeks=1)))
+        if re.search(rf"\b{prefix} month\b", t):
+            month_index = today.year * 12 + today.month - 1 + offset
+            ranges.append(_month_range(month_index // 12, month_index % 12 + 1))
+        if re.search(rf"\b{prefix} year\b", t):
+            ranges.append((date(today.year + offset, 1, 1), date(today.year + offset + 1, 1, 1)))
+
+    for i, name in enumerate(WEEKDAYS):
+        m = re.search(rf"\b(last |next )?{name}s?\b", t)
+        if not m:
+            continue
+        if m.group(1) == "last ":
+            day = today - timedelta(days=(today.weekday() - i) % 7 or 7)
+        else:
+            day = today + timedelta(days=(i - today.weekday()) % 7)
+            if m.group(1) == "next " and day == today:
+                day += timedelta(weeks=1)
+        ranges.append((day, day + timedelta(days=1)))
+
+    for i, name in enumerate(MONTHS):
+        for m in re.finditer(rf"\b{name}(?: (\d{{1,2}})(?:st|nd|rd|th)?\b)?", t):
+            if name == "may" and not m.group(1):
+                continue  # "may" is far more often a verb than a month
+            if m.group(1):
+                try:
+                    day = date(today.year, i + 1, int(m.group(1)))
+                except ValueError:
+                    continue
+                ranges.append((day, day + timedelta(days=1)))
+            else:
+                ranges.append(_month_range(today.year, i + 1))
+
+    return ranges
+
+
+class CalendarContextBuilder:
+    """
+    Builds the calendar part of a prompt from only the events that matter for a
+    request: a default window around now, plus any dates the request mentions.
+    Events are encoded as minified columnar JSON (id/summary/start/end/calendarId); a
+    recurring series is one "series" row (its RRULE, first instance and count in
+    the windows) however many instances fall in them.
+    """
+
+    def __init__(self, calendar: Calendar, days_back: int = 7, days_ahead: int = 30, cache_size: int = 64):
+        self.calendar = calendar
+        self.days_back = days_back
+        self.days_ahead = days_ahead
+
+        # Serialized contexts keyed by (calendar version, windows); a new calendar
+        # version makes every old key unreachable, so nothing stale is served
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def windows(self, user_request: str, now: datetime) -> list[tuple[datetime, datetime]]:
+        today = now.date()
+        ranges = [(today - timedelta(days=self.days_back), today + timedelta(days=self.days_ahead + 1))]
+        ranges += mentioned_ranges(user_request, today)
+
+        # Merge overlapping ranges so no event is selected twice
+        ranges.sort()
+        merged = [list(ranges[0])]
+        for start, end in ranges[1:]:
+            if start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return [(datetime.combine(s, datetime.min.time()), datetime.combine(e, datetime.min.time()))
+                for s, e in merged]
+
+    def build(self, user_request: str, now: datetime = None) -> tuple[str, dict]:
+        """Return (context JSON, stats) for a request"""
+        now = now or datetime.now()
+        windows = self.windows(user_request, now)
+
+        with self.calendar.lock.read():
+            key = (self.calendar.version, tuple(windows))
+            with self._cache_lock:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    return self._cache[key]
+
+            rows = []
+            series = {}  # id -> row; windows are sorted, so the first one seen is the first instance
+            for start, end in windows:
+                for ev in self.calendar.events_between(start, end, recurring=False).to_dicts():
+                    rows.append([ev["id"], ev["summary"], ev["start"]["dateTime"], ev["end"]["dateTime"], ev["calendarId"]])
+                for s in self.calendar.series_between(start, end):
+                    if s["id"] in series:
+                        series[s["id"]][5] += s["count"]
+                        series[s["id"]][6] += s["skipped"]
+                    else:
+                        series[s["id"]] = [s["id"], s["summary"], s["recurrence"], s["start"], s["end"], s["count"], s["skipped"],
+                                           s["calendarId"]]
+            events_total = len(self.calendar)
+
+        payload = {
+            "windows": [[s.date().isoformat(), e.date().isoformat()] for s, e in windows],
+            "columns": CONTEXT_COLUMNS,
+            "rows": rows,
+        }
+        if series:
+            payload["series_columns"] = SERIES_COLUMNS
+            payload["series"] = list(series.values())
+        context = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+        stats = {
+            "events_sent": len(rows) + len(series),
+            "events_total": events_total,
+            "context_tokens": estimate_tokens(context),
+        }
+
+        with self._cache_lock:
+            self._cache[key] = (context, stats)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return context, stats
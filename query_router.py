@@ -0,0 +1,188 @@
+import re
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from answer_cache import normalize_query
+from oop_events import Calendar
+from prompt_context import MONTHS, WEEKDAYS, mentioned_ranges
+
+NOUNS = r"(?:events?|meetings?|sessions?|appointments?|classes|class|lectures?)"
+
+# Date phrases mentioned_ranges understands; a routed question may contain nothing else
+DATE_PHRASE = (
+    r"(?:(?:on|for|in|during) )?(?:"
+    r"today|tonight|tomorrow|yesterday"
+    r"|(?:this|next|last) (?:week|month|year)"
+    rf"|(?:(?:this|next|last) )?(?:{'|'.join(WEEKDAYS)})"
+    rf"|(?:{'|'.join(MONTHS)})(?: \d{{1,2}}(?:st|nd|rd|th)?)?"
+    r"|\d{4}-\d{2}-\d{2})"
+)
+TIME = r"(\d{1,2})(?::(\d{2}))?\s*(am|pm)?"
+TIME_RANGE = rf"(?:(?:at|from|between) )?{TIME}(?:\s*(?:-|–|to|and|until)\s*{TIME})?"
+
+AGENDA = re.compile(
+    r"(?:what do i have|what have i got|what's on|whats on|what is on|what's happening|what is happening"
+    r"|what's my schedule|what is my schedule|show(?: me)? my (?:schedule|agenda|calendar|events)"
+    rf"|list my {NOUNS})(?: planned| scheduled)? (?P<when>{DATE_PHRASE})"
+)
+FREE_BUSY = re.compile(r"(?:am i|are we) (?P<state>free|busy|available) (?P<rest>.+)")
+COUNT = re.compile(
+    rf"how many (?:(?P<term>.+?) )?{NOUNS}"
+    r"(?: do i have| have i had| did i have| are there| have i got| will i have)? (?P<when>" + DATE_PHRASE + ")"
+)
+# The noun is required, so "what's my next move" goes to the LLM
+NEXT = re.compile(rf"(?:what's|whats|what is|when is|when's) my next (?:(?P<term>.+?) )?{NOUNS}")
+
+MAX_LISTED = 50
+
+
+def _single_range(phrase: str, today: date) -> Optional[tuple[datetime, datetime]]:
+    """The one [start, end) range a date phrase refers to, as naive (wall-clock) datetimes"""
+    ranges = set(mentioned_ranges(phrase, today))
+    if len(ranges) != 1:
+        return None
+    start, end = ranges.pop()
+    return datetime.combine(start, datetime.min.time()), datetime.combine(end, datetime.min.time())
+
+
+def _clock(hour: str, minute: Optional[str], meridiem: Optional[str]) -> Optional[timedelta]:
+    h, m = int(hour), int(minute or 0)
+    if meridiem:
+        if not 1 <= h <= 12:
+            return None
+        h = h % 12 + (12 if meridiem == "pm" else 0)
+    if h > 24 or m > 59:
+        return None
+    return timedelta(hours=h, minutes=m)
+
+
+def _describe_range(start: datetime, end: datetime) -> str:
+    if end - start == timedelta(days=1):
+        return start.strftime("%a %d %b")
+    return f"{start:%a %d %b} – {end - timedelta(days=1):%a %d %b}"
+
+
+def _event_line(ev, with_day: bool) -> str:
+    when = f"{ev.start:%a %d %b} " if with_day else ""
+    return f"• {when}{ev.start:%H:%M}–{ev.end:%H:%M} {ev.title}"
+
+
+def _title_filter(term: Optional[str]):
+    """Case-insensitive title match on the subject of a question ("gym", "standup"); empty matches all"""
+    term = re.sub(rf"\b{NOUNS}$", "", term or "").strip()
+    if not term or term in ("my", "the"):
+        return lambda title: True
+    return lambda title: term in title.lower()
+
+
+class QueryRouter:
+    """
+    Answers common calendar questions straight from the Calendar indexes, so they
+    don't need an LLM round trip:
+
+      agenda     "what do I have tomorrow", "show my schedule next week"
+      free_busy  "am I free friday 14:00-15:00", "am I busy tomorrow at 9am"
+      count      "how many gym sessions this month"
+      next       "what's my next meeting", "when is my next gym session"
+
+    The whole (normalized) question has to match one of these, otherwise answer()
+    returns None and the caller falls back to the LLM.
+    """
+
+    def __init__(self, calendar: Calendar):
+        self.calendar = calendar
+
+    def answer(self, user_request: str, now: datetime = None) -> Optional[tuple[str, str]]:
+        """(intent, answer text), or None if the question isn't one the router knows"""
+        now = now or datetime.now()
+        text = normalize_query(user_request).replace("’", "'")
+        with self.calendar.lock.read():
+            for intent, handler in (("agenda", self._agenda), ("free_busy", self._free_busy),
+                                    ("count", self._count), ("next", self._next)):
+                answer = handler(text, now)
+                if answer is not None:
+                    return intent, answer
+        return None
+
+    # ------------------- INTENTS -------------------
+    def _agenda(self, text: str, now: datetime) -> Optional[str]:
+        m = AGENDA.fullmatch(text)
+        span = m and _single_range(m.group("when"), now.date())
+        if not span:
+            return None
+
+        events = self.calendar.events_between(*span)
+        label = _describe_range(*span)
+        if not events:
+            return f"You have nothing scheduled for {label}."
+
+        multi_day = span[1] - span[0] > timedelta(days=1)
+        lines = [_event_line(ev, multi_day) for ev in events[:MAX_LISTED]]
+        if len(events) > MAX_LISTED:
+            lines.append(f"…and {len(events) - MAX_LISTED} more")
+        return f"You have {len(events)} event(s) for {label}:\n" + "\n".join(lines)
+
+    def _free_busy(self, text: str, now: datetime) -> Optional[str]:
+        m = FREE_BUSY.fullmatch(text)
+        if not m:
+            return None
+
+        # Split the rest into an optional date phrase and a time (range)
+        rest = m.group("rest")
+        date_match = re.search(DATE_PHRASE, rest)
+        day = now.date()
+        if date_match:
+            span = _single_range(date_match.group(0), now.date())
+            if not span or span[1] - span[0] != timedelta(days=1):
+                return None
+            day = span[0].date()
+            rest = (rest[:date_match.start()] + rest[date_match.end():]).strip()
+
+        if not rest and date_match:
+            start_offset, end_offset = timedelta(0), timedelta(days=1)  # the whole day
+        else:
+            t = re.fullmatch(TIME_RANGE, rest)
+            if not t:
+                return None
+            h1, m1, ampm1, h2, m2, ampm2 = t.groups()
+            start_offset = _clock(h1, m1, ampm1 or ampm2)
+            if start_offset is None:
+                return None
+            # A single time means the hour starting then
+            end_offset = _clock(h2, m2, ampm2) if h2 else start_offset + timedelta(hours=1)
+            if end_offset is None or end_offset <= start_offset:
+                return None
+
+        midnight = datetime.combine(day, datetime.min.time())
+        start, end = midnight + start_offset, midnight + end_offset
+        busy = self.calendar.events_between(start, end)
+        if end - start == timedelta(days=1):
+            slot = f"on {start:%a %d %b}"
+        else:
+            slot = f"on {start:%a %d %b} {start:%H:%M}–{end:%H:%M}"
+        if not busy:
+            return f"Yes, you're free {slot}."
+        return f"No, you have {len(busy)} event(s) {slot}:\n" + "\n".join(_event_line(ev, False) for ev in busy)
+
+    def _count(self, text: str, now: datetime) -> Optional[str]:
+        m = COUNT.fullmatch(text)
+        span = m and _single_range(m.group("when"), now.date())
+        if not span:
+            return None
+
+        matches = _title_filter(m.group("term"))
+        count = sum(1 for ev in self.calendar.events_between(*span) if matches(ev.title.lower()))
+        term = re.sub(rf"\b{NOUNS}$", "", m.group("term") or "").strip()
+        what = f"\"{term}\" event(s)" if term else "event(s)"
+        return f"You have {count} {what} for {_describe_range(*span)}."
+
+    def _next(self, text: str, now: datetime) -> Optional[str]:
+        m = NEXT.fullmatch(text)
+        if not m:
+            return None
+
+        matches = _title_filter(m.group("term"))
+        for ev in self.calendar.events_between(now, now + timedelta(days=365)):
+            if ev.start.replace(tzinfo=None) >= now and matches(ev.title.lower()):
+                return f"Your next one is {ev.title} on {ev.start:%a %d %b} at {ev.start:%H:%M}–{ev.end:%H:%M}."
+        return "Nothing matching is scheduled in the next year."
@@ -0,0 +1,73 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import json_codec
+
+GZIP_MIN_BYTES = 1024  # smaller bodies aren't worth compressing
+
+
+class CachedBody:
+    """
+    One serialized JSON response: body, strong ETag (content hash) and its gzip
+    encoding, made on first use. There is no Last-Modified: HTTP dates have
+    1-second resolution, so two versions made in the same second would both
+    pass If-Modified-Since.
+    """
+
+    __slots__ = ("body", "etag", "_gzipped")
+
+    def __init__(self, data):
+        self.body = json_codec.dump_bytes(data)
+        self.etag = hashlib.blake2b(self.body, digest_size=16).hexdigest()
+        self._gzipped = None
+
+    @property
+    def compressible(self) -> bool:
+        return len(self.body) >= GZIP_MIN_BYTES
+
+    def gzipped(self) -> bytes:
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=6)
+        return self._gzipped
+
+
+class ResponseCache:
+    """
+    Bounded LRU of serialized responses keyed by (route key, calendar version).
+    The calendar version only moves forward, so an entry never goes stale; it is
+    simply not asked for again once the calendars change and ages out. Thread-safe.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, CachedBody] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version) -> Optional[CachedBody]:
+        with self._lock:
+            entry = self._entries.get((key, version))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((key, version))
+            self.hits += 1
+            return entry
+
+    def put(self, key, version, data) -> CachedBody:
+        """Serialize data (outside the lock) and keep it for this version"""
+        entry = CachedBody(data)
+        with self._lock:
+            self._entries[(key, version)] = entry
+            self._entries.move_to_end((key, version))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,308 @@
+import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from googleapiclient.errors import HttpError
+
+import json_codec
+from concurrency import atomic_write_json
+from event_store import JsonFileStore
+from GoogleCalendarSync import DEFAULT_WORKERS, RetryPolicy, TokenBucket, execute_with_retry, http_status, thread_http
+
+DEFAULT_TIME_MIN = "2019-01-01T00:00:00Z"
+
+
+def format_google_event(e: dict, calendar_id: str = "primary") -> dict:
+    """
+    Convert a Google Calendar API event into the format stored in calendar_export.json.
+    Recurring masters keep their recurrence lines; exceptions keep the series and
+    original start they replace (a cancelled instance is stored as just that).
+    """
+    original = e.get("originalStartTime")
+    if original:
+        original = {"dateTime": original.get("dateTime") or original.get("date")}
+    if e.get("status") == "cancelled":
+        return {
+            "id": e.get("id"),
+            "calendarId": calendar_id,
+            "recurringEventId": e.get("recurringEventId"),
+            "originalStartTime": original,
+            "status": "cancelled"
+        }
+
+    start = e["start"].get("dateTime") or e["start"].get("date")
+    end = e["end"].get("dateTime") or e["end"].get("date")
+
+    # IMPORTANT: Keep the Google Calendar event ID for deletion/updates
+    event = {
+        "id": e.get("id"),
+        "calendarId": calendar_id,
+        "summary": e.get("summary", "Untitled"),
+        "start": {"dateTime": start, "timeZone": e["start"].get("timeZone", "Europe/Madrid")},
+        "end": {"dateTime": end, "timeZone": e["end"].get("timeZone", "Europe/Madrid")},
+        "description": e.get("description", ""),
+        "location": e.get("location", ""),
+        "draft": False
+    }
+    if e.get("recurrence"):
+        event["recurrence"] = e["recurrence"]
+    if e.get("recurringEventId"):
+        event["recurringEventId"] = e["recurringEventId"]
+        event["originalStartTime"] = original
+    return event
+
+
+def is_cancelled_instance(e: dict) -> bool:
+    """A cancelled occurrence of a recurring series (kept, so the series skips it)"""
+    return e.get("status") == "cancelled" and bool(e.get("recurringEventId") and e.get("originalStartTime"))
+
+
+class FetchProgress:
+    """Running page/event counter with throughput for a Google listing"""
+
+    def __init__(self):
+        self.pages = 0
+        self.events = 0
+        self.started = time.perf_counter()
+
+    def add_page(self, event_count: int):
+        self.pages += 1
+        self.events += event_count
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self) -> float:
+        """Events fetched per second so far"""
+        return self.events / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return f"page {self.pages}: {self.events} events fetched ({self.rate:.0f} events/s)"
+
+
+class IncrementalSyncEngine:
+    """
+    Keeps a local store (the JSON export, or an event_store.SQLiteStore) in step
+    with one or more Google calendars.
+
+    Every calendar is listed on a bounded thread pool and merged into the one
+    store, each event tagged with its calendarId. Recurring events are stored
+    once, as their master with its RRULE plus exceptions, not per instance. The first run of a calendar
+    does a full fetch and stores its Calendar API nextSyncToken next to the
+    export. Later runs only ask Google for events that changed or were cancelled
+    since then. If Google answers 410 Gone for a calendar, its token is dropped
+    and that calendar alone is fetched in full again.
+    """
+
+    def __init__(
+        self,
+        export_file: str = "calendar_export.json",
+        calendar_ids: Optional[List[str]] = None,
+        time_min: str = DEFAULT_TIME_MIN,
+        page_size: int = 2500,
+        state_file: Optional[str] = None,
+        workers: int = DEFAULT_WORKERS,
+        bucket: Optional[TokenBucket] = None,
+        store=None,
+    ):
+        self.export_file = export_file
+        self.store = store or JsonFileStore(export_file)  # incremental changes are written row by row
+        self.calendar_ids = calendar_ids  # None means every calendar selected in the user's calendar list
+        self.time_min = time_min
+        self.page_size = page_size
+        self.state_file = state_file or os.path.splitext(export_file)[0] + ".sync.json"
+        self.workers = workers
+        self.bucket = bucket or TokenBucket()
+        self.retry_policy = RetryPolicy()
+
+        self.next_sync_tokens: Dict[str, Optional[str]] = {}
+        self.progress = FetchProgress()
+
+    # ------------------- STATE -------------------
+    def _load_state(self) -> dict:
+        try:
+            state = json_codec.load_file(self.state_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+        # A token is only valid for the query it was issued for
+        if state.get("time_min") != self.time_min:
+            return {}
+        return state
+
+    def _save_state(self, sync_tokens: Dict[str, Optional[str]]):
+        atomic_write_json(self.state_file, {
+            "time_min": self.time_min,
+            "sync_tokens": sync_tokens,
+        })
+
+    def reset(self):
+        """Forget the stored sync tokens so the next sync is a full one"""
+        if os.path.exists(self.state_file):
+            os.remove(self.state_file)
+
+    # ------------------- FETCHING -------------------
+    def list_calendars(self, service) -> List[str]:
+        """Ids of the calendars to sync: calendar_ids, or every calendar selected in the user's calendar list"""
+        if self.calendar_ids is not None:
+            return list(self.calendar_ids)
+
+        calendar_ids = []
+        params = {}
+        while True:
+            result = execute_with_retry(service.calendarList().list(**params), "list", self.retry_policy, self.bucket)
+            calendar_ids += [c["id"] for c in result.get("items", []) if c.get("selected") or c.get("primary")]
+            params["pageToken"] = result.get("nextPageToken")
+            if not params["pageToken"]:
+                return calendar_ids
+
+    def _list_calendar(self, service, calendar_id: str, sync_token: Optional[str], put) -> Optional[str]:
+        """
+        Page through one calendar's full or incremental listing, put()ting
+        (calendar_id, items) for every page, and return its nextSyncToken.
+        Recurring events come back once, as their master plus exceptions.
+        """
+        params = {
+            "calendarId": calendar_id,
+            "singleEvents": False,
+            "maxResults": self.page_size,
+        }
+        if sync_token:
+            params["syncToken"] = sync_token
+        else:
+            params["timeMin"] = self.time_min
+
+        http = None
+        while True:
+            request = service.events().list(**params)
+            http = http or thread_http(request.http)  # httplib2 connections can't be shared between threads
+            result = execute_with_retry(request, "list", self.retry_policy, self.bucket, http)
+            put((calendar_id, result.get("items", [])))
+
+            params["pageToken"] = result.get("nextPageToken")
+            if not params["pageToken"]:
+                return result.get("nextSyncToken")
+
+    def _iter_listings(self, service, sync_tokens: Dict[str, Optional[str]]) -> Iterator[tuple]:
+        """
+        List every calendar concurrently (incrementally where it has a sync token)
+        and yield (calendar_id, items) pages in arrival order. items is None when a
+        full listing of that calendar follows, so its stored events must be dropped.
+        The new tokens are left in self.next_sync_tokens.
+        """
+        pages = queue.Queue()
+        done = object()
+        self.next_sync_tokens = {}
+        self.progress = FetchProgress()
+
+        def sync_calendar(calendar_id):
+            try:
+                token = sync_tokens.get(calendar_id)
+                if token:
+                    try:
+                        self.next_sync_tokens[calendar_id] = self._list_calendar(service, calendar_id, token, pages.put)
+                        return
+                    except HttpError as e:
+                        if http_status(e) != 410:
+                            raise
+                        print(f"🔄 Sync token for {calendar_id} expired (410 Gone). Running full resync of it...")
+                pages.put((calendar_id, None))
+                self.next_sync_tokens[calendar_id] = self._list_calendar(service, calendar_id, None, pages.put)
+            finally:
+                pages.put(done)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(sync_tokens)))) as pool:
+            futures = [pool.submit(sync_calendar, calendar_id) for calendar_id in sync_tokens]
+            running = len(futures)
+            while running:
+                page = pages.get()
+                if page is done:
+                    running -= 1
+                    continue
+                if page[1] is not None:
+                    self.progress.add_page(len(page[1]))
+                    print(f"  ↳ {self.progress}")
+                yield page
+            for future in futures:
+                future.result()  # re-raise the first failed calendar
+
+    # ------------------- SYNC -------------------
+    def sync(self, service) -> int:
+        """Bring the local store up to date and return the number of events in it"""
+        calendar_ids, sync_tokens = self._plan(service)
+        if self._merge_changes(service, calendar_ids, sync_tokens):
+            return self.store.count()
+        return sum(1 for _ in self.iter_full_sync(service, calendar_ids))
+
+    def iter_sync(self, service) -> Iterator[dict]:
+        """Bring the local store up to date, yielding its events as they become available"""
+        calendar_ids, sync_tokens = self._plan(service)
+        if self._merge_changes(service, calendar_ids, sync_tokens):
+            yield from self.store.events()
+        else:
+            yield from self.iter_full_sync(service, calendar_ids)
+
+    def _plan(self, service) -> tuple[List[str], Dict[str, Optional[str]]]:
+        """The calendars to sync and their stored sync tokens (None: never synced)"""
+        calendar_ids = self.list_calendars(service)
+        sync_tokens = self._load_state().get("sync_tokens", {})
+        return calendar_ids, {calendar_id: sync_tokens.get(calendar_id) for calendar_id in calendar_ids}
+
+    def _merge_changes(self, service, calendar_ids: List[str], sync_tokens: Dict[str, Optional[str]]) -> bool:
+        """
+        Write the changes since the stored sync tokens into the store, row by row.
+        False if there is nothing to merge into, so a full sync is needed.
+        """
+        # Events without an id or calendar (e.g. written by an older version) can't be
+        # matched against changes from Google, so the store has to be rebuilt from scratch
+        if not any(sync_tokens.values()) or not self.store.mergeable():
+            return False
+
+        # Changes are few; fetch them all first so the store's write lock isn't held over the network
+        pages = list(self._iter_listings(service, sync_tokens))
+        changes = 0
+        with self.store.transaction() as txn:
+            for calendar_id, items in pages:
+                if items is None:
+                    txn.drop_calendar(calendar_id)
+                    continue
+                for e in items:
+                    if e.get("status") == "cancelled" and not is_cancelled_instance(e):
+                        removed = txn.pop(calendar_id, e["id"])
+                        if removed and removed.get("recurrence"):
+                            txn.drop_series(calendar_id, e["id"])  # a deleted series takes its exceptions with it
+                    else:
+                        txn.put(format_google_event(e, calendar_id))
+                changes += len(items)
+
+            # Drop calendars that are no longer synced
+            txn.keep_calendars(calendar_ids)
+        self._save_state(self.next_sync_tokens)
+
+        print(f"✅ Incremental sync of {len(calendar_ids)} calendar(s): {changes} change(s), "
+              f"{self.store.count()} events in {self.store}")
+        return True
+
+    def iter_full_sync(self, service, calendar_ids: Optional[List[str]] = None) -> Iterator[dict]:
+        """
+        Fetch everything from time_min onwards, streaming each event into the store
+        as it arrives so only one page per calendar is held in memory at a time.
+        """
+        calendar_ids = self.list_calendars(service) if calendar_ids is None else calendar_ids
+        count = 0
+        with self.store.rewrite() as add:
+            for calendar_id, items in self._iter_listings(service, dict.fromkeys(calendar_ids)):
+                for e in items or ():
+                    if e.get("status") == "cancelled" and not is_cancelled_instance(e):
+                        continue
+                    event = format_google_event(e, calendar_id)
+                    add(event)
+                    count += 1
+                    yield event
+        self._save_state(self.next_sync_tokens)
+
+        print(f"✅ Full sync of {len(calendar_ids)} calendar(s): {count} events saved to {self.store}")
@@ -0,0 +1,103 @@
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+
+class SyncScheduler:
+    """
+    Runs a sync function in a background thread, on an interval and on demand.
+
+    Syncs are single-flight: a caller asking for a sync while one is already
+    running waits for that one to finish instead of starting another, so any
+    number of concurrent requests cost one Google round trip.
+    """
+
+    def __init__(self, sync_fn: Callable[[], None], interval: float = 60.0):
+        self.sync_fn = sync_fn
+        self.interval = interval
+
+        self.last_synced_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self._last_synced_monotonic: Optional[float] = None
+
+        self._lock = threading.Lock()
+        self._finished = threading.Condition(self._lock)
+        self._running = False
+        self._completed = 0  # number of finished syncs, so waiters know theirs is done
+
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------- WORKER -------------------
+    def start(self):
+        """Start the background thread (no-op if it is already running)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="calendar-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self.sync_now()
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def request_sync(self):
+        """Ask the background thread to sync as soon as possible, without waiting for it"""
+        self._wakeup.set()
+
+    # ------------------- SYNC -------------------
+    def sync_now(self):
+        """Sync in the calling thread, or wait for the sync that is already in flight"""
+        with self._lock:
+            if self._running:
+                completed = self._completed
+                while self._completed == completed:
+                    self._finished.wait()
+                return
+            self._running = True
+
+        try:
+            self.sync_fn()
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"⚠️ Background sync failed: {self.last_error}")
+        else:
+            self.last_error = None
+            self.last_synced_at = datetime.now()
+            self._last_synced_monotonic = time.monotonic()
+        finally:
+            with self._lock:
+                self._running = False
+                self._completed += 1
+                self._finished.notify_all()
+
+    def staleness(self) -> float:
+        """Seconds since the last successful sync (infinite if there hasn't been one)"""
+        if self._last_synced_monotonic is None:
+            return float("inf")
+        return time.monotonic() - self._last_synced_monotonic
+
+    def ensure_fresh(self, max_staleness: float):
+        """Block on a sync only if the data is older than max_staleness seconds"""
+        if self.staleness() > max_staleness:
+            self.sync_now()
+
+    def status(self) -> dict:
+        return {
+            "last_synced_at": self.last_synced_at.isoformat() if self.last_synced_at else None,
+            "staleness_seconds": None if self._last_synced_monotonic is None else round(self.staleness(), 3),
+            "syncing": self._running,
+            "last_error": self.last_error,
+            "interval_seconds": self.interval,
+        }
@@ -0,0 +1,62 @@
+import json
+import time
+
+import answer_cache
+from answer_cache import AnswerCache, answer_key
+
+
+def test_key_changes_with_the_context_but_not_trivial_rewording():
+    key = answer_key("gpt-4o-mini", "Mon 09:00 Standup", "What do I have on Monday?")
+
+    assert answer_key("gpt-4o-mini", "Mon 09:00 Standup", "  what do I have   on monday ") == key
+    assert answer_key("gpt-4o-mini", "Mon 09:30 Standup", "What do I have on Monday?") != key
+    assert answer_key("gpt-4o", "Mon 09:00 Standup", "What do I have on Monday?") != key
+
+
+def test_expired_entries_miss_and_are_not_reloaded(tmp_path):
+    filename = str(tmp_path / "ai_answer_cache.json")
+    cache = AnswerCache(filename, ttl=0.05)
+    cache.put("old", "stale answer")
+    cache.flush()
+    time.sleep(0.06)
+    cache.put("new", "fresh answer")
+
+    assert cache.get("old") is None and cache.get("new") == "fresh answer"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    (tmp_path / "ai_answer_cache.json").write_text(json.dumps([["old", time.time() - 60, "stale answer"],
+                                                               ["new", time.time(), "fresh answer"]]))
+    reloaded = AnswerCache(filename, ttl=30)
+    assert reloaded.get("old") is None and reloaded.get("new") == "fresh answer"
+
+
+def test_puts_are_saved_in_the_background_in_one_write(tmp_path, monkeypatch):
+    writes = []
+    write = answer_cache.atomic_write_json
+    monkeypatch.setattr(answer_cache, "atomic_write_json", lambda filename, data: writes.append(len(data)) or write(filename, data))
+    filename = tmp_path / "ai_answer_cache.json"
+    cache = AnswerCache(str(filename), save_interval=0.1)
+
+    for n in range(20):
+        cache.put(f"key {n}", f"answer {n}")
+    assert not filename.exists()  # put() didn't touch the disk
+
+    deadline = time.monotonic() + 5
+    while not writes and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert writes == [20]
+    assert AnswerCache(str(filename)).get("key 19") == "answer 19"
+
+    cache.flush()  # nothing changed since: no second write
+    assert writes == [20]
+
+
+def test_flush_writes_pending_answers_at_once(tmp_path):
+    filename = str(tmp_path / "ai_answer_cache.json")
+    cache = AnswerCache(filename, save_interval=3600, max_entries=2)
+    for n in range(3):
+        cache.put(f"key {n}", f"answer {n}")
+    cache.flush()  # what atexit does at shutdown
+
+    reloaded = AnswerCache(filename)
+    assert [reloaded.get(f"key {n}") for n in range(3)] == [None, "answer 1", "answer 2"]
@@ -0,0 +1,87 @@
+import gzip
+import json
+import os
+from email.utils import formatdate
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    """app.py on JSON stores in a temporary directory, with background syncs doing nothing"""
+    here, database = os.getcwd(), os.environ.get("CALENDAR_DB")
+    os.chdir(tmp_path_factory.mktemp("app"))
+    os.environ["CALENDAR_DB"] = ""
+    try:
+        import app
+        app.sync_scheduler.sync_fn = lambda: None
+        yield app
+    finally:
+        os.chdir(here)
+        if database is None:
+            del os.environ["CALENDAR_DB"]
+        else:
+            os.environ["CALENDAR_DB"] = database
+
+
+@pytest.fixture
+def client(server):
+    server.calendar_manager.discard_drafts()
+    return server.app.test_client()
+
+
+def add_drafts(client, count: int, day: int = 2):
+    for n in range(count):
+        start = f"2026-03-{day:02d}T{8 + n % 10:02d}:00:00"
+        response = client.post("/draft/add", json={"title": f"Draft {n}", "start": start, "end": start[:-5] + "30:00"})
+        assert response.status_code == 200
+
+
+# ------------------- CACHED /events AND /preview -------------------
+@pytest.mark.parametrize("path", ["/events", "/preview"])
+def test_etag_revalidation_until_the_calendar_changes(client, path):
+    add_drafts(client, 1)
+    first = client.get(path)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and "no-cache" in first.headers["Cache-Control"]
+
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+
+    add_drafts(client, 1, day=3)  # a new calendar version, even within the same second
+    changed = client.get(path, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert len(changed.get_data()) > len(first.get_data())
+
+
+def test_if_modified_since_alone_never_gets_a_304(client):
+    add_drafts(client, 1)
+    response = client.get("/events")
+    assert "Last-Modified" not in response.headers
+
+    add_drafts(client, 1, day=3)
+    recent = formatdate(usegmt=True)
+    response = client.get("/events", headers={"If-Modified-Since": recent})
+    assert response.status_code == 200 and len(response.get_json()) == 2
+
+
+def test_gzip_is_negotiated_and_has_its_own_etag(client):
+    add_drafts(client, 20)  # well over GZIP_MIN_BYTES
+    plain = client.get("/events")
+    zipped = client.get("/events", headers={"Accept-Encoding": "gzip, deflate"})
+
+    assert "Content-Encoding" not in plain.headers
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in zipped.headers["Vary"]
+    assert json.loads(gzip.decompress(zipped.get_data())) == plain.get_json()
+    assert zipped.headers["ETag"] == plain.headers["ETag"][:-1] + '-gzip"'
+
+    assert client.get("/events", headers={"Accept-Encoding": "gzip", "If-None-Match": zipped.headers["ETag"]}).status_code == 304
+    # The identity ETag doesn't validate the gzipped representation
+    assert client.get("/events", headers={"Accept-Encoding": "gzip", "If-None-Match": plain.headers["ETag"]}).status_code == 200
+
+
+def test_small_bodies_are_sent_uncompressed(client):
+    add_drafts(client, 1)
+    response = client.get("/events", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert len(response.get_json()) == 1
@@ -0,0 +1,144 @@
+import threading
+import time
+
+import pytest
+
+from concurrency import ReadWriteLock
+
+TIMEOUT = 5.0
+
+
+def start(fn) -> threading.Thread:
+    thread = threading.Thread(target=fn, daemon=True)
+    thread.start()
+    return thread
+
+
+def blocked(thread: threading.Thread) -> bool:
+    """Whether the thread is still waiting a moment after it started"""
+    thread.join(0.1)
+    return thread.is_alive()
+
+
+def test_lock_is_reentrant_and_the_writer_may_read():
+    lock = ReadWriteLock()
+    done = []
+
+    def nested():
+        with lock.write():
+            with lock.read():
+                with lock.write():
+                    with lock.read():
+                        done.append("write")
+        with lock.read():
+            with lock.read():
+                done.append("read")
+
+    thread = start(nested)
+    thread.join(TIMEOUT)
+    assert done == ["write", "read"]
+
+
+def test_nested_read_does_not_queue_behind_a_waiting_writer():
+    lock = ReadWriteLock()
+    reading, release = threading.Event(), threading.Event()
+    done = []
+
+    def reader():
+        with lock.read():
+            reading.set()
+            release.wait(TIMEOUT)
+            with lock.read():  # a writer is waiting for the outer read to end
+                done.append("nested read")
+
+    def writer():
+        with lock.write():
+            done.append("write")
+
+    thread = start(reader)
+    reading.wait(TIMEOUT)
+    waiting = start(writer)
+    assert blocked(waiting)
+    release.set()
+    for t in (thread, waiting):
+        t.join(TIMEOUT)
+    assert done == ["nested read", "write"]
+
+
+def test_upgrading_a_read_lock_raises_and_releases_it():
+    lock = ReadWriteLock()
+    with pytest.raises(RuntimeError):
+        with lock.read():
+            with lock.write():
+                pass
+
+    # The failed upgrade left nothing held, so another thread can write
+    wrote = []
+
+    def writer():
+        with lock.write():
+            wrote.append(True)
+
+    start(writer).join(TIMEOUT)
+    assert wrote == [True]
+
+
+def test_writer_excludes_readers_and_other_writers():
+    lock = ReadWriteLock()
+    log = []
+    writing, release = threading.Event(), threading.Event()
+
+    def writer():
+        with lock.write():
+            writing.set()
+            release.wait(TIMEOUT)
+            log.append("write done")
+
+    def reader():
+        with lock.read():
+            log.append("read")
+
+    def second_writer():
+        with lock.write():
+            log.append("second write")
+
+    first = start(writer)
+    writing.wait(TIMEOUT)
+    threads = [start(reader), start(second_writer)]
+    assert all(blocked(thread) for thread in threads)
+    release.set()
+    for thread in [first, *threads]:
+        thread.join(TIMEOUT)
+    assert log[0] == "write done" and sorted(log[1:]) == ["read", "second write"]
+
+
+def test_waiting_writer_blocks_new_readers():
+    lock = ReadWriteLock()
+    log = []
+    reading, release = threading.Event(), threading.Event()
+
+    def first_reader():
+        with lock.read():
+            reading.set()
+            release.wait(TIMEOUT)
+            log.append("first read done")
+
+    def writer():
+        with lock.write():
+            log.append("write")
+            time.sleep(0.05)
+
+    def late_reader():
+        with lock.read():
+            log.append("late read")
+
+    first = start(first_reader)
+    reading.wait(TIMEOUT)
+    waiting = start(writer)
+    assert blocked(waiting)
+    late = start(late_reader)
+    assert blocked(late)  # queued behind the writer, not let in next to the first reader
+    release.set()
+    for thread in (first, waiting, late):
+        thread.join(TIMEOUT)
+    assert log == ["first read done", "write", "late read"]
@@ -0,0 +1,52 @@
+import json
+import random
+
+from delta_stream import DeltaStreamParser
+
+DELTA = json.dumps({
+    "add": [
+        {"summary": 'Say "hi" to {Ana} [maybe]', "start": {"dateTime": "2026-03-02T09:00:00"},
+         "end": {"dateTime": "2026-03-02T10:00:00"}, "description": "C:\\temp\\notes, a \\\" quote"},
+        {"summary": "Café ☕ with Zoë", "start": {"dateTime": "2026-03-03T09:00:00"}, "end": {"dateTime": "2026-03-03T09:30:00"},
+         "attendees": [{"email": "a@example.com"}, {"email": "b@example.com"}]},
+    ],
+    "update": [{"id": "abc123", "summary": "Ends in a backslash \\"}],
+    "delete": ["evt\"1", "evt}2", "evt\\3", "plain"],
+}, ensure_ascii=False)
+
+
+def expected_items() -> list:
+    delta = json.loads(DELTA)
+    return [(section, item) for section in ("add", "update", "delete") for item in delta[section]]
+
+
+def parse(chunks) -> tuple[list, dict]:
+    parser = DeltaStreamParser()
+    items = []
+    for chunk in chunks:
+        items += parser.feed(chunk)
+    return items, parser.result()
+
+
+def test_every_item_is_emitted_whatever_the_chunk_splits():
+    # Every two-chunk split, one character at a time, and random chunk sizes
+    chunkings = [[DELTA[:i], DELTA[i:]] for i in range(len(DELTA) + 1)]
+    chunkings.append(list(DELTA))
+    rng = random.Random(212)
+    for _ in range(200):
+        cuts = sorted(rng.sample(range(1, len(DELTA)), rng.randrange(1, 40)))
+        chunkings.append([DELTA[a:b] for a, b in zip([0] + cuts, cuts + [len(DELTA)])])
+
+    for chunks in chunkings:
+        items, result = parse(chunks)
+        assert items == expected_items()
+        assert result == json.loads(DELTA)
+
+
+def test_items_are_emitted_as_soon_as_they_close():
+    parser = DeltaStreamParser()
+    head = DELTA.index('"update"')
+    assert [section for section, _ in parser.feed(DELTA[:head])] == ["add", "add"]
+    assert parser.feed('"update": [{"id": "x"') == []
+    assert parser.feed('}], "delete": ["a", "b') == [("update", {"id": "x"}), ("delete", "a")]
+    assert parser.feed('"]}') == [("delete", "b")]
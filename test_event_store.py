@@ -0,0 +1,191 @@
+import json
+import threading
+from datetime import datetime
+
+from event_store import STAGING, STAGING_BATCH, DraftJournal, SQLiteStore
+from oop_events import CalendarManager, Event
+
+
+def draft(event_id: str, hour: int = 10) -> dict:
+    return {"id": event_id, "calendarId": "primary", "summary": f"Draft {event_id}",
+            "start": {"dateTime": f"2026-03-02T{hour:02d}:00:00"}, "end": {"dateTime": f"2026-03-02T{hour:02d}:30:00"}}
+
+
+def journal_lines(journal: DraftJournal) -> list[dict]:
+    with open(journal.filename, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def stored_ids(store) -> list[str]:
+    return sorted(e["id"] for e in store.events())
+
+
+# ------------------- DRAFT JOURNAL -------------------
+def test_journal_replays_puts_and_deletes(tmp_path):
+    journal = DraftJournal(str(tmp_path / "draft_calendar.jsonl"))
+    with journal.transaction() as txn:
+        txn.put(draft("a"))
+        txn.put(draft("b"))
+    with journal.transaction() as txn:
+        txn.delete("a")
+        txn.put(draft("b", hour=11))
+
+    assert len(journal_lines(journal)) == 4  # appended, not rewritten
+    reopened = DraftJournal(journal.filename)
+    assert stored_ids(reopened) == ["b"]
+    assert next(reopened.events())["start"]["dateTime"] == "2026-03-02T11:00:00"
+
+
+def test_journal_skips_a_torn_last_line_and_keeps_appending(tmp_path):
+    journal = DraftJournal(str(tmp_path / "draft_calendar.jsonl"))
+    with journal.transaction() as txn:
+        txn.put(draft("a"))
+    with open(journal.filename, "a", encoding="utf-8") as f:
+        f.write('{"put": {"id": "b", "summ')  # a crash in the middle of an append
+
+    reopened = DraftJournal(journal.filename)
+    assert stored_ids(reopened) == ["a"]
+    with reopened.transaction() as txn:
+        txn.put(draft("c"))
+    assert [line["put"]["id"] for line in journal_lines(reopened)] == ["a", "c"]
+    assert stored_ids(DraftJournal(journal.filename)) == ["a", "c"]
+
+
+def test_journal_compacts_once_dead_records_outnumber_drafts(tmp_path):
+    journal = DraftJournal(str(tmp_path / "draft_calendar.jsonl"))
+    with journal.transaction() as txn:
+        txn.put(draft("kept"))
+    for _ in range(DraftJournal.COMPACT_MIN_RECORDS // 2 - 1):
+        with journal.transaction() as txn:
+            txn.put(draft("churn"))
+        with journal.transaction() as txn:
+            txn.delete("churn")
+    # Below COMPACT_MIN_RECORDS every record is still there
+    assert len(journal_lines(journal)) == DraftJournal.COMPACT_MIN_RECORDS - 1
+
+    with journal.transaction() as txn:
+        txn.put(draft("churn"))
+    with journal.transaction() as txn:
+        txn.put(draft("new"))
+    assert [line["put"]["id"] for line in journal_lines(journal)] == ["kept", "churn", "new"]
+    assert stored_ids(DraftJournal(journal.filename)) == ["churn", "kept", "new"]
+
+
+def test_journal_is_truncated_when_the_last_draft_goes(tmp_path):
+    journal = DraftJournal(str(tmp_path / "draft_calendar.jsonl"))
+    with journal.transaction() as txn:
+        txn.put(draft("a"))
+        txn.put(draft("b"))
+    with journal.transaction() as txn:
+        txn.delete("a")
+        txn.delete("b")
+    assert journal_lines(journal) == []
+
+    with journal.transaction() as txn:
+        txn.put(draft("c"))
+    with journal.transaction() as txn:
+        txn.clear()
+    assert journal_lines(journal) == []
+
+
+def test_draft_calendar_json_is_imported_once(tmp_path):
+    draft_file = tmp_path / "draft_calendar.json"
+    draft_file.write_text(json.dumps([draft("old")]))
+    real_file = str(tmp_path / "calendar_export.json")
+
+    manager = CalendarManager(str(draft_file), real_file)
+    assert [e.id for e in manager.draft_calendar.events] == ["old"]
+    manager.save_draft_event(Event("New", datetime(2026, 3, 3, 9), datetime(2026, 3, 3, 10)))
+    manager.draft_calendar.remove_event("old")
+    manager.draft_calendar.save_to_store(manager.draft_store, ["old"])
+
+    # Drafts now live in the journal; the old file is left as it was and not read again
+    assert json.loads(draft_file.read_text()) == [draft("old")]
+    reopened = CalendarManager(str(draft_file), real_file)
+    assert [e.title for e in reopened.draft_calendar.events] == ["New"]
+
+
+# ------------------- SQLITE STORE -------------------
+EXPORT = [
+    {"id": "e1", "calendarId": "primary", "summary": "Standup",
+     "start": {"dateTime": "2026-03-02T09:00:00+01:00"}, "end": {"dateTime": "2026-03-02T09:15:00+01:00"}},
+    {"id": "e2", "calendarId": "work@example.com", "summary": "Offsite",
+     "start": {"date": "2026-03-05"}, "end": {"date": "2026-03-06"}},
+    {"id": "gym", "calendarId": "primary", "summary": "Gym",
+     "start": {"dateTime": "2026-03-02T18:00:00+01:00", "timeZone": "Europe/Madrid"},
+     "end": {"dateTime": "2026-03-02T19:00:00+01:00", "timeZone": "Europe/Madrid"},
+     "recurrence": ["RRULE:FREQ=WEEKLY;COUNT=4"]},
+    {"id": "gym_20260309T170000Z", "calendarId": "primary", "recurringEventId": "gym", "status": "cancelled",
+     "originalStartTime": {"dateTime": "2026-03-09T18:00:00+01:00"}},
+]
+
+
+def in_new_connection(fn):
+    """Run fn in another thread, which opens its own connection to the database"""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(fn()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_sqlite_store_round_trip(tmp_path):
+    real_file = tmp_path / "calendar_export.json"
+    real_file.write_text(json.dumps(EXPORT))
+    database = str(tmp_path / "calendar.db")
+    manager = CalendarManager(str(tmp_path / "draft_calendar.json"), str(real_file), database=database)
+    store = manager.real_store
+
+    # The import is one version; plain events come back as columns, the rest as dicts
+    assert store.signature() == 1
+    rows, records = store.read()
+    assert [row[0] for row in rows] == ["e1", "e2"]
+    assert sorted(e["id"] for e in records) == ["gym", "gym_20260309T170000Z"]
+
+    with store.transaction() as txn:
+        txn.put(EXPORT[0] | {"summary": "Standup (moved)", "start": {"dateTime": "2026-03-02T10:00:00+01:00"},
+                             "end": {"dateTime": "2026-03-02T10:15:00+01:00"}})
+        txn.delete("e2")
+    with store.transaction() as txn:
+        txn.delete("missing")  # changes nothing, so no new version
+    assert txn.signature == store.signature() == 2
+
+    reopened = SQLiteStore(database, "real")
+    rows, records = in_new_connection(reopened.read)
+    assert rows == [("e1", "primary", "Standup (moved)", 1772442000, 1772442900, 60, 60)]
+    assert sorted(e["id"] for e in records) == ["gym", "gym_20260309T170000Z"]
+    assert in_new_connection(reopened.signature) == 2
+    assert in_new_connection(SQLiteStore(database, "draft").count) == 0  # calendars share the file, not rows
+
+    # The database is only filled from the JSON file once
+    real_file.write_text("[]")
+    again = CalendarManager(str(tmp_path / "draft_calendar.json"), str(real_file), database=database)
+    assert sorted(e["id"] for e in again.real_calendar.to_dicts()) == ["e1", "gym", "gym_20260309T170000Z"]
+    assert again.real_store.signature() == 2
+
+
+def test_sqlite_rewrite_swaps_in_at_the_end(tmp_path):
+    database = str(tmp_path / "calendar.db")
+    store = SQLiteStore(database, "real")
+    with store.rewrite() as add:
+        for e in EXPORT:
+            add(e)
+    assert store.signature() == 1
+
+    try:
+        with store.rewrite() as add:
+            for i in range(STAGING_BATCH + 1):  # past one staging transaction
+                add(EXPORT[0] | {"id": f"new{i}"})
+            # Staged rows aren't visible before the swap
+            assert in_new_connection(store.count) == len(EXPORT)
+            raise RuntimeError("Google went away mid-sync")
+    except RuntimeError:
+        pass
+    assert store.signature() == 1
+    assert stored_ids(store) == sorted(e["id"] for e in EXPORT)
+    assert SQLiteStore(database, "real" + STAGING).count() == 0
+
+    with store.rewrite() as add:
+        add(EXPORT[1])
+    assert store.signature() == 2
+    assert stored_ids(store) == ["e2"]
@@ -0,0 +1,202 @@
+import json
+import time
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from GoogleCalendarSync import BATCH_LIMIT, GoogleCalendarSync, RetryPolicy, TokenBucket, execute_batch, execute_with_retry
+from oop_events import Calendar
+
+
+class RecordingEvents:
+    """Stands in for service.events(); each call returns what it was asked to do"""
+
+    def insert(self, **kwargs):
+        return ("insert", kwargs)
+
+    def update(self, **kwargs):
+        return ("update", kwargs)
+
+    def delete(self, **kwargs):
+        return ("delete", kwargs)
+
+
+class RecordingService:
+    def events(self):
+        return RecordingEvents()
+
+
+def synced_calendar(directory) -> Calendar:
+    export = directory / "calendar_export.json"
+    export.write_text(json.dumps([
+        {"id": "own1", "calendarId": "primary", "summary": "Standup",
+         "start": {"dateTime": "2026-03-02T09:00:00+01:00"}, "end": {"dateTime": "2026-03-02T09:15:00+01:00"}},
+        {"id": "work1", "calendarId": "work@example.com", "summary": "Review",
+         "start": {"dateTime": "2026-03-02T10:00:00+01:00"}, "end": {"dateTime": "2026-03-02T11:00:00+01:00"}},
+        {"id": "gym", "calendarId": "family@example.com", "summary": "Gym",
+         "start": {"dateTime": "2026-03-02T18:00:00+01:00"}, "end": {"dateTime": "2026-03-02T19:00:00+01:00"},
+         "recurrence": ["RRULE:FREQ=WEEKLY;COUNT=5"]},
+    ]))
+    calendar = Calendar("Real", source="real")
+    calendar.load_from_file(str(export))
+    return calendar
+
+
+def test_delta_operations_go_to_each_events_calendar(tmp_path):
+    sync = GoogleCalendarSync()
+    sync.service = RecordingService()
+    calendar = synced_calendar(tmp_path)
+    delta = sync.clean_delta_json({
+        "add": [{"summary": "Lunch", "start": {"dateTime": "2026-03-02T12:00:00"},
+                 "end": {"dateTime": "2026-03-02T13:00:00"}, "calendarId": "work@example.com"}],
+        "update": [{"id": "work1", "summary": "Design review"}],
+        "delete": ["own1", "gym_20260309T170000Z", "unknown"],
+    })
+
+    ops = sync.delta_operations(delta, auto_delete=True, calendar_of=calendar.calendar_of)
+    targets = [(kind, request[1]["calendarId"]) for kind, _, request in ops]
+
+    assert targets == [("add", "work@example.com"), ("update", "work@example.com"), ("delete", "primary"),
+                       ("delete", "family@example.com"), ("delete", "primary")]
+    # calendarId routes the request; it is not part of the event body
+    assert all("calendarId" not in request[1].get("body", {}) for _, _, request in ops)
+
+
+# ------------------- RETRY / THROTTLING -------------------
+def http_error(status: int, reason: str = "backendError") -> HttpError:
+    content = json.dumps({"error": {"code": status, "message": reason, "errors": [{"reason": reason}]}}).encode()
+    return HttpError(httplib2.Response({"status": status}), content)
+
+
+class FlakyRequest:
+    """A request that fails with the given errors first, then answers; counts its attempts"""
+
+    def __init__(self, *errors, result=None, body=None):
+        self.errors = list(errors)
+        self.result = result
+        self.body = body
+        self.attempts = 0
+
+    def execute(self, http=None):
+        self.attempts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.result
+
+
+class CountingBucket:
+    def __init__(self):
+        self.taken = 0
+
+    def take(self):
+        self.taken += 1
+
+
+NO_WAIT = RetryPolicy(max_retries=3, base_delay=0)
+
+
+def test_throttling_and_server_errors_are_retried():
+    request = FlakyRequest(http_error(429, "rateLimitExceeded"), http_error(503), http_error(403, "userRateLimitExceeded"),
+                           result={"id": "ok"})
+    bucket, retries = CountingBucket(), []
+
+    assert execute_with_retry(request, "update", NO_WAIT, bucket, on_retry=lambda: retries.append(1)) == {"id": "ok"}
+    assert request.attempts == bucket.taken == 4 and len(retries) == 3
+
+
+@pytest.mark.parametrize("error", [http_error(400, "badRequest"), http_error(403, "forbidden"), http_error(404, "notFound")])
+def test_client_errors_are_not_retried(error):
+    request = FlakyRequest(error)
+    with pytest.raises(HttpError):
+        execute_with_retry(request, "update", NO_WAIT)
+    assert request.attempts == 1
+
+
+def test_retries_stop_after_max_retries():
+    request = FlakyRequest(*[http_error(500)] * 10)
+    with pytest.raises(HttpError):
+        execute_with_retry(request, "update", NO_WAIT)
+    assert request.attempts == NO_WAIT.max_retries + 1
+
+
+def test_retried_insert_answering_409_already_went_through():
+    body = {"id": "abc123", "summary": "Lunch"}
+    request = FlakyRequest(http_error(503), http_error(409, "duplicate"), body=json.dumps(body))
+    assert execute_with_retry(request, "add", NO_WAIT) == body
+
+    # A 409 on the first attempt is a real conflict with someone else's event
+    with pytest.raises(HttpError):
+        execute_with_retry(FlakyRequest(http_error(409, "duplicate"), body=json.dumps(body)), "add", NO_WAIT)
+
+
+@pytest.mark.parametrize("status", [404, 410])
+def test_retried_delete_answering_gone_already_went_through(status):
+    assert execute_with_retry(FlakyRequest(http_error(502), http_error(status, "deleted")), "delete", NO_WAIT) is None
+    with pytest.raises(HttpError):
+        execute_with_retry(FlakyRequest(http_error(status, "deleted")), "delete", NO_WAIT)
+
+
+def test_token_bucket_spends_its_burst_then_paces_requests():
+    bucket = TokenBucket(rate=20, capacity=2)
+    started = time.monotonic()
+    for _ in range(2):
+        bucket.take()
+    assert time.monotonic() - started < 0.04
+    for _ in range(2):
+        bucket.take()
+    assert time.monotonic() - started >= 0.09  # two more tokens at 20 per second
+
+
+def test_retry_delay_is_capped_full_jitter():
+    policy = RetryPolicy(base_delay=0.5, max_delay=4.0)
+    delays = [policy.delay(attempt) for attempt in range(10) for _ in range(20)]
+    assert all(0 <= d <= 4.0 for d in delays) and max(delays) > 2.0
+    assert all(policy.delay(0) <= 0.5 for _ in range(50))
+
+
+# ------------------- BATCHES -------------------
+class RecordingBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.service.batch_sizes.append(len(self.requests))
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, request.execute(), None)
+            except HttpError as e:
+                self.callback(request_id, None, e)
+
+
+class BatchService:
+    def __init__(self):
+        self.batch_sizes = []
+
+    def new_batch_http_request(self, callback):
+        return RecordingBatch(self, callback)
+
+
+def test_execute_batch_splits_at_batch_limit_and_reports_each_item():
+    operations = []
+    for n in range(2 * BATCH_LIMIT + 20):
+        kind = ("add", "update", "delete")[n % 3]
+        failing = n in (7, BATCH_LIMIT + 3, 2 * BATCH_LIMIT + 17)
+        request = FlakyRequest(http_error(400 if kind == "add" else 404, "nope")) if failing else \
+            FlakyRequest(result={"id": f"e{n}"})
+        operations.append((kind, f"e{n}", request))
+    service = BatchService()
+
+    report = execute_batch(service, operations)
+
+    assert service.batch_sizes == [BATCH_LIMIT, BATCH_LIMIT, 20]
+    assert report["round_trips"] == 3
+    assert [(e["operation"], e["target"], e["status"]) for e in report["errors"]] == [
+        ("update", "e7", 404), ("delete", f"e{BATCH_LIMIT + 3}", 404), ("add", f"e{2 * BATCH_LIMIT + 17}", 400)]
+    assert len(report["added"]) + len(report["updated"]) + len(report["deleted"]) == len(operations) - 3
+    assert f"e{2 * BATCH_LIMIT + 19}" in report["deleted"] and {"id": "e0"} in report["added"]
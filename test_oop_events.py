@@ -0,0 +1,384 @@
+import json
+import random
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+from dateutil.rrule import rrulestr
+
+from oop_events import CHANGE_LOG_LENGTH, Calendar, CalendarManager, Event
+
+CET = timezone(timedelta(hours=1))    # Europe/Madrid in winter
+CEST = timezone(timedelta(hours=2))   # Europe/Madrid in summer
+
+
+def calendars(real_start: datetime, real_end: datetime):
+    real = Calendar("Real", source="real")
+    real.add_event(Event("Synced meeting", real_start, real_end, source="real"))
+    draft = Calendar("Draft", source="draft")
+    draft.add_event(Event("Draft", datetime(2026, 1, 15, 10), datetime(2026, 1, 15, 11), source="draft"))
+    return real, draft
+
+
+def test_naive_draft_conflicts_with_offset_aware_real_event():
+    real, draft = calendars(datetime(2026, 1, 15, 10, tzinfo=CET), datetime(2026, 1, 15, 11, tzinfo=CET))
+    draft_event = next(iter(draft.events))
+
+    assert [e.title for e in real.conflicts_for(draft_event)] == ["Synced meeting"]
+    assert len(Calendar.find_overlaps_between(real, draft)) == 1
+    assert len(real.find_overlaps_in(datetime(2026, 1, 15), datetime(2026, 1, 16))) == 0
+
+
+def test_naive_draft_is_local_time_not_utc():
+    # 10:00 UTC is 11:00 in Madrid, after the 10:00-11:00 local draft
+    real, draft = calendars(datetime(2026, 1, 15, 10, tzinfo=timezone.utc), datetime(2026, 1, 15, 11, tzinfo=timezone.utc))
+    draft_event = next(iter(draft.events))
+
+    assert list(real.conflicts_for(draft_event)) == []
+    assert Calendar.find_overlaps_between(real, draft) == []
+
+
+def test_naive_draft_follows_daylight_saving_time():
+    real = Calendar("Real", source="real")
+    real.add_event(Event("Summer meeting", datetime(2026, 7, 1, 10, tzinfo=CEST), datetime(2026, 7, 1, 11, tzinfo=CEST),
+                         source="real"))
+    draft_event = Event("Draft", datetime(2026, 7, 1, 10, 30), datetime(2026, 7, 1, 11, 30), source="draft")
+
+    assert [e.title for e in real.conflicts_for(draft_event)] == ["Summer meeting"]
+
+
+def weekly_series_export(directory, monday: date):
+    """A four-week 09:00 Madrid series with its second instance cancelled, as Google exports it"""
+    second = datetime.combine(monday + timedelta(days=7), datetime.min.time()).replace(hour=8)
+    export = directory / "calendar_export.json"
+    export.write_text(json.dumps([
+        {"id": "ser", "summary": "Standup",
+         "start": {"dateTime": f"{monday}T09:00:00+01:00", "timeZone": "Europe/Madrid"},
+         "end": {"dateTime": f"{monday}T09:30:00+01:00", "timeZone": "Europe/Madrid"},
+         "recurrence": ["RRULE:FREQ=WEEKLY;COUNT=4"]},
+        {"id": f"ser_{second:%Y%m%dT%H%M%SZ}", "recurringEventId": "ser", "status": "cancelled",
+         "originalStartTime": {"dateTime": f"{monday + timedelta(days=7)}T09:00:00+01:00"}},
+    ]))
+    return str(export)
+
+
+def test_api_dicts_expand_series_and_drop_cancelled_instances(tmp_path):
+    # A winter Monday near today, so the instances fall inside RECURRENCE_HORIZON
+    monday = date.today() + timedelta(days=7 - date.today().weekday())
+    while monday.month not in (12, 1):
+        monday += timedelta(days=7)
+    manager = CalendarManager(str(tmp_path / "draft_calendar.json"), weekly_series_export(tmp_path, monday))
+    third = datetime.combine(monday + timedelta(days=14), datetime.min.time())
+    manager.save_draft_event(Event("Clash", third.replace(hour=9, minute=15), third.replace(hour=10)))
+
+    real = manager.real_calendar.api_dicts()
+    assert [e["start"]["dateTime"][:10] for e in real] == [str(monday + timedelta(days=d)) for d in (0, 14, 21)]
+    assert all("recurrence" not in e and e["recurringEventId"] == "ser" for e in real)
+
+    # Conflict marking in /preview uses these ids, so the instance the draft hits is one of them
+    conflict_ids = manager.conflicting_ids()
+    assert [e["id"] for e in real if e["id"] in conflict_ids] == [f"ser_{third.replace(hour=8):%Y%m%dT%H%M%SZ}"]
+    # The stored form still keeps the master and the cancelled stub
+    second = datetime.combine(monday + timedelta(days=7), datetime.min.time()).replace(hour=8)
+    assert {e["id"] for e in manager.real_calendar.to_dicts()} == {"ser", f"ser_{second:%Y%m%dT%H%M%SZ}"}
+
+
+# ------------------- RECURRING SERIES -------------------
+MADRID = ZoneInfo("Europe/Madrid")
+
+
+def load_calendar(directory, events: list[dict]) -> Calendar:
+    export = directory / "calendar_export.json"
+    export.write_text(json.dumps(events))
+    calendar = Calendar("Real", source="real")
+    calendar.load_from_file(str(export))
+    return calendar
+
+
+def series(event_id: str, start: str, end: str, *recurrence: str) -> dict:
+    """A Madrid-time recurring master; start/end are local ISO datetimes"""
+    def when(local):
+        return {"dateTime": datetime.fromisoformat(local).replace(tzinfo=MADRID).isoformat(), "timeZone": "Europe/Madrid"}
+    return {"id": event_id, "summary": event_id, "start": when(start), "end": when(end), "recurrence": list(recurrence)}
+
+
+def starts_between(calendar: Calendar, start: datetime, end: datetime) -> list[str]:
+    return [e.start.isoformat() for e in calendar.events_between(start, end)]
+
+
+def reference_starts(rule: str, dtstart: datetime, start: datetime, end: datetime) -> list[str]:
+    """dateutil's expansion from the series' real DTSTART, in Madrid time"""
+    local = rrulestr(rule, dtstart=dtstart).between(start.replace(tzinfo=None) - timedelta(days=1), end.replace(tzinfo=None))
+    return [dt.replace(tzinfo=MADRID).isoformat() for dt in local if start <= dt.replace(tzinfo=MADRID) < end]
+
+
+def test_rebased_rules_expand_like_their_original_dtstart(tmp_path):
+    rules = {
+        "weekly": ("RRULE:FREQ=WEEKLY;BYDAY=MO,WE,FR", "2024-01-01T10:00"),
+        "fortnightly": ("RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=TU,TH", "2024-01-02T18:30"),
+        "monthly 31st": ("RRULE:FREQ=MONTHLY", "2024-01-31T08:00"),
+        "yearly leap day": ("RRULE:FREQ=YEARLY", "2024-02-29T12:00"),
+        "every 3 days": ("RRULE:FREQ=DAILY;INTERVAL=3", "2024-01-01T07:00"),
+    }
+    calendar = load_calendar(tmp_path, [series(name, start, start[:11] + "23:00", rule)
+                                        for name, (rule, start) in rules.items()])
+    for window in ((datetime(2026, 3, 9), 14), (datetime(2028, 1, 20), 50), (datetime(2025, 6, 1), 400)):
+        start = window[0].replace(tzinfo=MADRID)
+        end = start + timedelta(days=window[1])
+        expected = sorted(s for rule, dtstart in rules.values()
+                          for s in reference_starts(rule.partition(":")[2], datetime.fromisoformat(dtstart), start, end))
+        assert sorted(starts_between(calendar, start, end)) == expected
+
+
+def test_until_and_count_end_the_series(tmp_path):
+    calendar = load_calendar(tmp_path, [
+        # UNTIL is in UTC: 09:00 Madrid on 2026-03-16 is 08:00Z, so that instance is the last
+        series("until", "2026-03-02T09:00", "2026-03-02T10:00", "RRULE:FREQ=WEEKLY;UNTIL=20260316T080000Z"),
+        series("count", "2026-03-03T09:00", "2026-03-03T10:00", "RRULE:FREQ=WEEKLY;COUNT=3"),
+    ])
+    found = starts_between(calendar, datetime(2026, 3, 1, tzinfo=MADRID), datetime(2026, 5, 1, tzinfo=MADRID))
+
+    assert found == ["2026-03-02T09:00:00+01:00", "2026-03-03T09:00:00+01:00", "2026-03-09T09:00:00+01:00",
+                     "2026-03-10T09:00:00+01:00", "2026-03-16T09:00:00+01:00", "2026-03-17T09:00:00+01:00"]
+
+
+def test_cancelled_and_moved_instances(tmp_path):
+    calendar = load_calendar(tmp_path, [
+        series("gym", "2026-03-02T18:00", "2026-03-02T19:00", "RRULE:FREQ=WEEKLY;COUNT=4"),
+        {"id": "gym_20260309T170000Z", "recurringEventId": "gym", "status": "cancelled",
+         "originalStartTime": {"dateTime": "2026-03-09T18:00:00+01:00"}},
+        {"id": "gym_20260316T170000Z", "recurringEventId": "gym", "summary": "gym (moved)",
+         "originalStartTime": {"dateTime": "2026-03-16T18:00:00+01:00"},
+         "start": {"dateTime": "2026-03-17T07:00:00+01:00"}, "end": {"dateTime": "2026-03-17T08:00:00+01:00"}},
+    ])
+    events = calendar.events_between(datetime(2026, 3, 1, tzinfo=MADRID), datetime(2026, 4, 1, tzinfo=MADRID))
+
+    assert [(e.title, e.start.isoformat()) for e in events] == [
+        ("gym", "2026-03-02T18:00:00+01:00"),
+        ("gym (moved)", "2026-03-17T07:00:00+01:00"),
+        ("gym", "2026-03-23T18:00:00+01:00"),
+    ]
+    assert events.to_dicts()[1]["recurringEventId"] == "gym"
+    # Removing the exception brings back the instance it replaced
+    calendar.remove_event("gym_20260316T170000Z")
+    assert "2026-03-16T18:00:00+01:00" not in starts_between(calendar, datetime(2026, 3, 1, tzinfo=MADRID),
+                                                             datetime(2026, 4, 1, tzinfo=MADRID))
+
+
+def test_instances_keep_local_time_across_dst_and_cached_windows(tmp_path):
+    calendar = load_calendar(tmp_path, [series("mass", "2025-01-05T10:00", "2025-01-05T11:00", "RRULE:FREQ=WEEKLY;BYDAY=SU")])
+    dst = (datetime(2026, 3, 20, tzinfo=MADRID), datetime(2026, 4, 6, tzinfo=MADRID))  # clocks go forward on 2026-03-29
+
+    assert starts_between(calendar, *dst) == ["2026-03-22T10:00:00+01:00", "2026-03-29T10:00:00+02:00",
+                                              "2026-04-05T10:00:00+02:00"]
+    # Point queries elsewhere grow or replace the cached window; every answer matches a fresh calendar
+    windows = [(datetime(2026, 10, 20), 10), (datetime(2025, 2, 1), 3), (datetime(2031, 1, 1), 7), (datetime(2026, 3, 27), 4)]
+    for day, days in windows:
+        start = day.replace(tzinfo=MADRID)
+        fresh = load_calendar(tmp_path, [series("mass", "2025-01-05T10:00", "2025-01-05T11:00", "RRULE:FREQ=WEEKLY;BYDAY=SU")])
+        assert starts_between(calendar, start, start + timedelta(days=days)) == \
+            starts_between(fresh, start, start + timedelta(days=days))
+    assert starts_between(calendar, *dst)[1] == "2026-03-29T10:00:00+02:00"
+
+
+# ------------------- FREE / BUSY -------------------
+def busy_manager(directory) -> CalendarManager:
+    """Monday 2026-03-02: real 09:00-10:00 and 13:00-14:00 Madrid time, a naive draft 11:00-11:30"""
+    export = directory / "calendar_export.json"
+    export.write_text(json.dumps([
+        {"id": "r1", "summary": "Standup", "start": {"dateTime": "2026-03-02T09:00:00+01:00"},
+         "end": {"dateTime": "2026-03-02T10:00:00+01:00"}},
+        {"id": "r2", "summary": "Lunch", "start": {"dateTime": "2026-03-02T13:00:00+01:00"},
+         "end": {"dateTime": "2026-03-02T14:00:00+01:00"}},
+    ]))
+    manager = CalendarManager(str(directory / "draft_calendar.json"), str(export))
+    manager.save_draft_event(Event("Call", datetime(2026, 3, 2, 11), datetime(2026, 3, 2, 11, 30)))
+    return manager
+
+
+def hours(slots) -> list[tuple[str, str]]:
+    return [(s.strftime("%H:%M"), e.strftime("%H:%M")) for s, e in slots]
+
+
+def test_free_busy_in_naive_and_aware_time(tmp_path):
+    manager = busy_manager(tmp_path)
+
+    # Naive bounds: what the events look like on their own wall clocks
+    naive = manager.free_busy(datetime(2026, 3, 2), datetime(2026, 3, 3))
+    assert hours(naive) == [("09:00", "10:00"), ("11:00", "11:30"), ("13:00", "14:00")]
+    assert all(s.tzinfo is None for s, _ in naive)
+
+    # Aware bounds: absolute time, with the naive draft taken in Madrid time; clipped to the window
+    utc = manager.free_busy(datetime(2026, 3, 2, 9, 30, tzinfo=timezone.utc), datetime(2026, 3, 3, tzinfo=timezone.utc))
+    assert hours(utc) == [("10:00", "10:30"), ("12:00", "13:00")]
+    assert all(s.tzinfo is timezone.utc for s, _ in utc)
+
+
+def test_find_free_slots_with_working_hours_buffer_and_limit(tmp_path):
+    manager = busy_manager(tmp_path)
+    monday = (datetime(2026, 3, 2), datetime(2026, 3, 3))
+    office = (time(8), time(18))
+
+    assert hours(manager.find_free_slots(timedelta(hours=1), monday, office)) == [
+        ("08:00", "09:00"), ("10:00", "11:00"), ("11:30", "13:00"), ("14:00", "18:00")]
+    # 15 minutes either side of every event leaves no hour before 11:45
+    assert hours(manager.find_free_slots(timedelta(hours=1), monday, office, buffer=timedelta(minutes=15))) == [
+        ("11:45", "12:45"), ("14:15", "18:00")]
+    assert hours(manager.find_free_slots(timedelta(hours=1), monday, office, limit=2)) == [
+        ("08:00", "09:00"), ("10:00", "11:00")]
+    # Without working hours the whole window counts, across midnight into the next day
+    two_days = (datetime(2026, 3, 2, 14), datetime(2026, 3, 3, 9))
+    assert manager.find_free_slots(timedelta(hours=2), two_days) == [(two_days[0], two_days[1])]
+
+
+def test_find_free_slots_in_an_aware_window(tmp_path):
+    manager = busy_manager(tmp_path)
+    window = (datetime(2026, 3, 2, tzinfo=CET), datetime(2026, 3, 4, tzinfo=CET))
+
+    slots = manager.find_free_slots(timedelta(minutes=90), window, (time(9), time(13, 30)))
+    assert [(s.isoformat(), e.isoformat()) for s, e in slots] == [
+        ("2026-03-02T11:30:00+01:00", "2026-03-02T13:00:00+01:00"),
+        ("2026-03-03T09:00:00+01:00", "2026-03-03T13:30:00+01:00"),
+    ]
+    with pytest.raises(ValueError):
+        manager.find_free_slots(timedelta(hours=1), window, (time(18), time(8)))
+
+
+# ------------------- CHANGE LOG -------------------
+def meeting(n: int, **kwargs) -> Event:
+    return Event(f"Meeting {n}", datetime(2026, 3, 2, 9, tzinfo=CET) + timedelta(hours=n),
+                 datetime(2026, 3, 2, 10, tzinfo=CET) + timedelta(hours=n), source="real", id=f"m{n}", **kwargs)
+
+
+def test_changes_since_lists_added_and_removed_events():
+    calendar = Calendar("Real", source="real")
+    calendar.add_event(meeting(0))
+    start = calendar.version
+    calendar.add_event(meeting(1))
+    calendar.add_event(meeting(2))
+    calendar.remove_event("m0")
+    calendar.remove_event("m2")  # added and removed in the window: reported removed
+
+    upserted, removed = calendar.changes_since(start)
+    assert [e["id"] for e in upserted] == ["m1"]
+    assert sorted(removed) == ["m0", "m2"]
+    assert calendar.changes_since(calendar.version) == ([], [])
+    assert calendar.changes_since(calendar.version + 1) is None  # a version from another process
+
+
+def test_changes_since_only_reaches_back_over_the_log():
+    calendar = Calendar("Real", source="real")
+    start = calendar.version
+    for n in range(CHANGE_LOG_LENGTH + 1):
+        calendar.add_event(meeting(n))
+
+    assert calendar.changes_since(start) is None
+    assert calendar.changes_since(start + 1) is not None  # the oldest change still logged
+    upserted, _ = calendar.changes_since(calendar.version - 3)
+    assert sorted(e["id"] for e in upserted) == [f"m{n}" for n in range(CHANGE_LOG_LENGTH - 2, CHANGE_LOG_LENGTH + 1)]
+
+
+def test_changes_since_resets_when_series_change(tmp_path):
+    gym = series("gym", "2026-03-02T18:00", "2026-03-02T19:00", "RRULE:FREQ=WEEKLY;COUNT=4")
+    moved = {"id": "gym_20260309T170000Z", "recurringEventId": "gym", "summary": "gym",
+             "originalStartTime": {"dateTime": "2026-03-09T18:00:00+01:00"},
+             "start": {"dateTime": "2026-03-10T18:00:00+01:00"}, "end": {"dateTime": "2026-03-10T19:00:00+01:00"}}
+    plain = {"id": "p", "summary": "Plain", "start": {"dateTime": "2026-03-04T09:00:00+01:00"},
+             "end": {"dateTime": "2026-03-04T10:00:00+01:00"}}
+    calendar = load_calendar(tmp_path, [gym, moved, plain])
+    start = calendar.version
+
+    # Reloading the same series with one plain event changed lists just that event
+    (tmp_path / "calendar_export.json").write_text(json.dumps([gym, moved, plain | {"summary": "Plain (renamed)"}]))
+    calendar.load_from_file(str(tmp_path / "calendar_export.json"))
+    upserted, removed = calendar.changes_since(start)
+    assert [e["summary"] for e in upserted] == ["Plain (renamed)"] and removed == []
+
+    # A series whose rule changed can't be listed by event
+    before = calendar.version
+    (tmp_path / "calendar_export.json").write_text(json.dumps([gym | {"recurrence": ["RRULE:FREQ=WEEKLY;COUNT=2"]}, moved, plain]))
+    calendar.load_from_file(str(tmp_path / "calendar_export.json"))
+    assert calendar.changes_since(before) is None and calendar.changes_since(start) is None
+
+    # Neither can removing an exception, or clearing a calendar with series; later changes list again
+    before = calendar.version
+    calendar.remove_event("gym_20260309T170000Z")
+    assert calendar.changes_since(before) is None
+    before = calendar.version
+    calendar.clear()
+    assert calendar.changes_since(before) is None
+    before = calendar.version
+    calendar.add_event(meeting(1))
+    assert [e["id"] for e in calendar.changes_since(before)[0]] == ["m1"]
+
+
+def test_manager_changes_since_tags_removals_and_caps_the_list(tmp_path):
+    manager = CalendarManager(str(tmp_path / "draft_calendar.json"), str(tmp_path / "calendar_export.json"))
+    manager.real_calendar.add_event(meeting(0))
+    start = manager.version
+    drafts = [Event(f"Draft {n}", datetime(2026, 3, 3, 9 + n), datetime(2026, 3, 3, 10 + n)) for n in range(3)]
+    manager.save_draft_events(drafts)
+    manager.real_calendar.remove_event("m0")
+
+    changes = manager.changes_since(start)
+    assert changes["version"] == manager.version
+    assert sorted(e["summary"] for e in changes["upserted"]) == ["Draft 0", "Draft 1", "Draft 2"]
+    assert all(e["draft"] for e in changes["upserted"])
+    assert changes["removed"] == [{"id": "m0", "draft": False}]
+
+    assert manager.changes_since(start, max_changes=4) is not None
+    assert manager.changes_since(start, max_changes=3) is None  # cheaper to reload than to list them
+    manager.discard_drafts()  # clearing plain drafts is still listable
+    assert sorted(r["id"] for r in manager.changes_since(start)["removed"]) == sorted(["m0"] + [d.id for d in drafts])
+
+
+# ------------------- ROW REMOVAL -------------------
+def assert_indexes_match(calendar: Calendar, model: dict):
+    """contains/get against a plain {id: (title, start, end)} model, and the internal indexes against the rows"""
+    assert len(calendar) == len(model)
+    for event_id, (title, start, end) in model.items():
+        event = calendar.get(event_id)
+        assert (event.title, event.start, event.end) == (title, start, end)
+    keys = {(title, start) for title, start, _ in model.values()}
+    for title in ("Standup", "Review"):
+        for start in {start for _, start, _ in model.values()}:
+            assert calendar.contains(title, start) == ((title, start) in keys)
+    assert sorted(calendar._sorted_rows) == list(range(len(model)))
+    assert all(calendar._key_at(row) == key for key, row in calendar._by_key.items())
+    assert all(calendar._ids[row] == event_id for event_id, row in calendar._by_id.items())
+
+
+def test_removing_rows_that_share_a_title_and_start():
+    at_nine = datetime(2026, 3, 2, 9, tzinfo=CET)
+    calendar = Calendar("Real", source="real")
+    for event_id in ("b", "a1", "a2", "a3"):
+        title = "Review" if event_id == "b" else "Standup"
+        calendar.add_event(Event(title, at_nine, at_nine + timedelta(hours=1), source="real", id=event_id))
+
+    # a1 holds the dedup key and the last row (a3) moves into its place
+    calendar.remove_event("a1")
+    assert calendar.contains("Standup", at_nine) and calendar.get("a3").title == "Standup"
+    calendar.remove_event("a3")
+    assert calendar.contains("Standup", at_nine)
+    calendar.remove_event("a2")
+    assert not calendar.contains("Standup", at_nine) and calendar.contains("Review", at_nine)
+    # Same wall time without a timezone is a different key
+    calendar.upsert_event(Event("Review", datetime(2026, 3, 2, 9), datetime(2026, 3, 2, 10), id="b"))
+    assert not calendar.contains("Review", at_nine) and calendar.contains("Review", datetime(2026, 3, 2, 9))
+
+
+def test_random_removes_and_upserts_keep_the_indexes_consistent():
+    rng = random.Random(11)
+    starts = [datetime(2026, 3, 2, 9, tzinfo=CET) + timedelta(minutes=30 * k) for k in range(3)]
+    calendar, model = Calendar("Real", source="real"), {}
+    for step in range(600):
+        event_id = f"e{rng.randrange(12)}"
+        if event_id in model and rng.random() < 0.5:
+            calendar.remove_event(event_id)
+            del model[event_id]
+        else:
+            title, start = rng.choice(("Standup", "Review")), rng.choice(starts)
+            end = start + timedelta(minutes=rng.choice((15, 60)))
+            calendar.upsert_event(Event(title, start, end, source="real", id=event_id))
+            model[event_id] = (title, start, end)
+        assert_indexes_match(calendar, model)
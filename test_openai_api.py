@@ -0,0 +1,54 @@
+import asyncio
+import threading
+import time
+
+from openAIAPI import CalendarAIClient
+
+
+def ai_client(tmp_path) -> CalendarAIClient:
+    return CalendarAIClient(api_key="test", calendar_file=str(tmp_path / "calendar_export.json"),
+                            delta_file=str(tmp_path / "calendar_delta.json"),
+                            answer_cache_file=str(tmp_path / "ai_answer_cache.json"))
+
+
+def test_async_summary_lookups_run_off_the_event_loop(tmp_path):
+    ai = ai_client(tmp_path)
+    loop_thread = []
+
+    def slow_lookup(user_request):
+        loop_thread.append(threading.current_thread())
+        time.sleep(0.2)  # e.g. waiting for a calendar reload's write lock
+        return "context", "key", "From the cache", "cache"
+
+    ai._lookup_answer = slow_lookup
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.ensure_future(ticker())
+        answer = await ai.asummarize_calendar("What do I have tomorrow?")
+        task.cancel()
+        return answer, ticks, ai.last_route
+
+    answer, ticks, route = asyncio.run(main())
+    assert answer == "From the cache"
+    assert loop_thread[0] is not threading.main_thread()
+    assert ticks >= 5  # the loop kept running while the lookup blocked
+    assert route["path"] == "cache"  # recorded in the calling task, not the worker thread's context
+
+
+def test_async_summary_answers_locally_routed_questions(tmp_path):
+    ai = ai_client(tmp_path)
+
+    async def main():
+        answer = await ai.asummarize_calendar("What do I have today?")
+        return answer, ai.last_route
+
+    answer, route = asyncio.run(main())
+    assert isinstance(answer, str) and route["path"].startswith("local:")
@@ -0,0 +1,34 @@
+from datetime import datetime
+
+import pytest
+
+from oop_events import Calendar, Event
+from query_router import QueryRouter
+
+NOW = datetime(2026, 3, 2, 9)
+
+
+@pytest.fixture
+def router():
+    calendar = Calendar("Real", source="real")
+    calendar.add_event(Event("Team meeting", datetime(2026, 3, 2, 14), datetime(2026, 3, 2, 15), source="real"))
+    calendar.add_event(Event("Gym session", datetime(2026, 3, 3, 18), datetime(2026, 3, 3, 19), source="real"))
+    return QueryRouter(calendar)
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("What's my next meeting?", "Team meeting"),
+    ("when is my next gym session", "Gym session"),
+])
+def test_next_is_answered_locally(router, question, expected):
+    intent, answer = router.answer(question, NOW)
+    assert intent == "next" and expected in answer
+
+
+@pytest.mark.parametrize("question", [
+    "what is my next step to get promoted?",
+    "whats my next move",
+    "what's my next",
+])
+def test_next_without_an_event_noun_goes_to_the_llm(router, question):
+    assert router.answer(question, NOW) is None
@@ -0,0 +1,155 @@
+import json
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from event_store import JsonFileStore, SQLiteStore
+from sync_engine import IncrementalSyncEngine
+
+
+def event(event_id: str, summary: str, day: int, **extra) -> dict:
+    return {"id": event_id, "summary": summary, "status": "confirmed",
+            "start": {"dateTime": f"2026-03-{day:02d}T09:00:00+01:00", "timeZone": "Europe/Madrid"},
+            "end": {"dateTime": f"2026-03-{day:02d}T10:00:00+01:00", "timeZone": "Europe/Madrid"}} | extra
+
+
+class ListRequest:
+    def __init__(self, result: dict = None, error: HttpError = None):
+        self.result = result
+        self.error = error
+        self.http = None
+
+    def execute(self, http=None):
+        if self.error:
+            raise self.error
+        return self.result
+
+
+class FakeEvents:
+    def __init__(self, google):
+        self.google = google
+
+    def list(self, **params):
+        return self.google.listing(params)
+
+
+class FakeGoogle:
+    """
+    Just enough of the Calendar API for IncrementalSyncEngine: events.list pages
+    through a calendar's events, or through its changes when given a syncToken
+    (410 Gone for the calendars in expired). Tokens count each calendar's listings.
+    """
+
+    def __init__(self, events: dict):
+        self.events_by_calendar = events
+        self.changes = {calendar_id: [] for calendar_id in events}
+        self.expired = set()
+        self.calls = []
+        self.listings = dict.fromkeys(events, 0)
+
+    def events(self):
+        return FakeEvents(self)
+
+    def listing(self, params: dict) -> ListRequest:
+        calendar_id = params["calendarId"]
+        self.calls.append((calendar_id, "syncToken" in params))
+        if "syncToken" in params and calendar_id in self.expired:
+            return ListRequest(error=HttpError(httplib2.Response({"status": 410}), b"Sync token is no longer valid"))
+        items = self.changes[calendar_id] if "syncToken" in params else self.events_by_calendar[calendar_id]
+        start = int(params.get("pageToken") or 0)
+        page = {"items": items[start:start + params["maxResults"]]}
+        if start + params["maxResults"] < len(items):
+            page["nextPageToken"] = str(start + params["maxResults"])
+        else:
+            self.listings[calendar_id] += 1
+            page["nextSyncToken"] = f"{calendar_id}-{self.listings[calendar_id]}"
+        return ListRequest(page)
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def engine(request, tmp_path):
+    export_file = str(tmp_path / "calendar_export.json")
+    store = JsonFileStore(export_file) if request.param == "json" else SQLiteStore(str(tmp_path / "calendar.db"), "real")
+    return IncrementalSyncEngine(export_file, calendar_ids=["primary", "work"], page_size=2, store=store)
+
+
+def stored(engine) -> dict:
+    return {(e["calendarId"], e["id"]): e for e in engine.store.events()}
+
+
+def saved_tokens(engine) -> dict:
+    with open(engine.state_file) as f:
+        return json.load(f)["sync_tokens"]
+
+
+def test_incremental_sync_merges_changes_and_cancellations(engine):
+    google = FakeGoogle({
+        "primary": [event("a", "Standup", 2), event("b", "Lunch", 3), event("c", "Dentist", 4),
+                    event("gym", "Gym", 2, recurrence=["RRULE:FREQ=WEEKLY"]),
+                    event("gym_20260309T080000Z", "Gym (late)", 9, recurringEventId="gym",
+                          originalStartTime={"dateTime": "2026-03-09T09:00:00+01:00"})],
+        "work": [event("w", "Review", 5)],
+    })
+    assert engine.sync(google) == 6
+    assert saved_tokens(engine) == {"primary": "primary-1", "work": "work-1"}
+
+    google.changes["primary"] = [
+        event("a", "Standup (moved)", 6),
+        {"id": "b", "status": "cancelled"},
+        {"id": "gym", "status": "cancelled"},  # a deleted series takes its exception with it
+        {"id": "rd_20260316T080000Z", "status": "cancelled", "recurringEventId": "rd",
+         "originalStartTime": {"dateTime": "2026-03-16T09:00:00+01:00"}},
+    ]
+    google.calls.clear()
+    assert engine.sync(google) == 4
+
+    assert sorted(google.calls) == [("primary", True), ("primary", True), ("work", True)]  # two pages of changes
+    events = stored(engine)
+    assert sorted(events) == [("primary", "a"), ("primary", "c"), ("primary", "rd_20260316T080000Z"), ("work", "w")]
+    assert events[("primary", "a")]["summary"] == "Standup (moved)"
+    assert events[("primary", "rd_20260316T080000Z")]["status"] == "cancelled"  # kept so the series skips it
+    assert saved_tokens(engine) == {"primary": "primary-2", "work": "work-2"}
+
+
+def test_expired_sync_token_resyncs_that_calendar_in_full(engine):
+    google = FakeGoogle({"primary": [event("a", "Standup", 2)], "work": [event("w1", "Review", 5), event("w2", "1:1", 6)]})
+    engine.sync(google)
+
+    google.events_by_calendar["work"] = [event("w3", "Planning", 7)]
+    google.changes["primary"] = [event("p", "Gym", 8)]
+    google.expired.add("work")
+    google.calls.clear()
+    assert engine.sync(google) == 3
+
+    assert sorted(google.calls) == [("primary", True), ("work", False), ("work", True)]
+    assert sorted(stored(engine)) == [("primary", "a"), ("primary", "p"), ("work", "w3")]
+    assert saved_tokens(engine) == {"primary": "primary-2", "work": "work-2"}
+
+
+def test_sync_tokens_are_kept_per_calendar_and_query(engine, tmp_path):
+    google = FakeGoogle({"primary": [event("a", "Standup", 2)], "work": []})
+    engine.sync(google)
+    with open(engine.state_file) as f:
+        state = json.load(f)
+    assert engine.state_file == str(tmp_path / "calendar_export.sync.json")
+    assert state["time_min"] == engine.time_min and set(state["sync_tokens"]) == {"primary", "work"}
+
+    # A new engine (e.g. after a restart) picks the tokens up again
+    restarted = IncrementalSyncEngine(engine.export_file, calendar_ids=["primary", "work"], page_size=2, store=engine.store)
+    google.calls.clear()
+    restarted.sync(google)
+    assert sorted(google.calls) == [("primary", True), ("work", True)]
+
+    # Tokens only hold for the timeMin they were issued for
+    other_window = IncrementalSyncEngine(engine.export_file, calendar_ids=["primary", "work"], page_size=2,
+                                         store=engine.store, time_min="2026-01-01T00:00:00Z")
+    google.calls.clear()
+    other_window.sync(google)
+    assert sorted(google.calls) == [("primary", False), ("work", False)]
+
+    # Calendars dropped from the list lose their events and their token
+    only_primary = IncrementalSyncEngine(engine.export_file, calendar_ids=["primary"], page_size=2, store=engine.store,
+                                         time_min="2026-01-01T00:00:00Z")
+    only_primary.sync(google)
+    assert list(saved_tokens(only_primary)) == ["primary"]